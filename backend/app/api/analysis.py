@@ -0,0 +1,169 @@
+import os
+import asyncio
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
+from MDAnalysis.exceptions import SelectionError
+
+from app.services.analysis_service import AnalysisService
+from app.services.distributed_service import RMS_TASK
+from app.worker import distributed
+
+router = APIRouter(prefix="/api/projects/{project_id}/analysis", tags=["analysis"])
+
+analysis_service = AnalysisService()
+
+
+def _project_dir(project_id: str) -> str:
+    project_dir = f"projects/{project_id}"
+    if not os.path.isdir(project_dir):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project_dir
+
+
+def _downsample_info(sampled: Dict, method: str) -> Dict:
+    return {"method": method, "level": sampled["level"], "window_points": sampled["window_points"]}
+
+
+@router.get("/rms")
+async def get_rms(
+    project_id: str,
+    selection: str = "backbone",
+    reference_frame: int = Query(0, ge=0),
+    mass_weighted: bool = False,
+    stride: int = Query(1, ge=1),
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    points: Optional[int] = Query(None, ge=2),
+    view_start: Optional[float] = None,
+    view_end: Optional[float] = None,
+    method: str = "minmax"
+):
+    """
+    RMSD over time and per-atom RMSF after fitting to a reference frame.
+    With `points`, the RMSD series is downsampled to at most that many
+    points between `view_start` and `view_end` (ps) for plotting;
+    `start_time` and `end_time` select the frames analysed.
+    """
+    project_dir = _project_dir(project_id)
+
+    params = dict(
+        selection=selection,
+        reference_frame=reference_frame,
+        mass_weighted=mass_weighted,
+        stride=stride,
+        start_time=start_time,
+        end_time=end_time
+    )
+    loop = asyncio.get_running_loop()
+    try:
+        if distributed.enabled:
+            response = await distributed.run_analysis(RMS_TASK, project_dir, **params)
+            key = None
+            times = np.asarray(response["rmsd"]["time_ps"], dtype=np.float64)
+            rmsd = np.asarray(response["rmsd"]["rmsd_nm"], dtype=np.float64)
+        else:
+            # Run off the event loop; the engine releases the GIL in its NumPy kernels
+            result = await loop.run_in_executor(None, partial(analysis_service.compute_rms, project_dir, **params))
+            response = None
+            key, times, rmsd = result["key"], result["time_ps"], result["rmsd_nm"]
+
+        sampled = None
+        if points:
+            sampled = await loop.run_in_executor(None, partial(
+                analysis_service.downsample, key and f"{key}:rmsd", times, rmsd, points, view_start, view_end, method
+            ))
+            times, rmsd = sampled["time_ps"], sampled["values"]
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, IndexError, SelectionError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if response is None:
+        # Downsample before converting, so only the plotted points become JSON
+        response = analysis_service.rms_to_dict({**result, "time_ps": times, "rmsd_nm": rmsd})
+    elif sampled is not None:
+        response["rmsd"] = {"time_ps": times.tolist(), "rmsd_nm": rmsd.tolist()}
+    if sampled is not None:
+        response["rmsd"]["downsampled"] = _downsample_info(sampled, method)
+    return response
+
+
+@router.get("/energy")
+async def get_energy(
+    project_id: str,
+    prefix: str = "md",
+    terms: Optional[List[str]] = Query(None),
+    since: int = Query(0, ge=0),
+    points: Optional[int] = Query(None, ge=2),
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    method: str = "minmax"
+):
+    """
+    Energy terms from a phase's .edr file. Pass the previous response's
+    `next_since` to receive only frames written since then.
+
+    With `points`, every term is instead downsampled to at most that many
+    points between `start_time` and `end_time` (ps), as min/max envelopes
+    (`method=minmax`) or by largest-triangle-three-buckets (`method=lttb`).
+    """
+    project_dir = _project_dir(project_id)
+
+    loop = asyncio.get_running_loop()
+    if points:
+        try:
+            result = await loop.run_in_executor(None, partial(
+                analysis_service.get_energy_series,
+                project_dir,
+                prefix=prefix,
+                terms=terms,
+                points=points,
+                start_time=start_time,
+                end_time=end_time,
+                method=method
+            ))
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return {
+            "prefix": prefix,
+            "terms": result["terms"],
+            "n_frames": result["n_frames"],
+            "series": {
+                term: {
+                    "time_ps": sampled["time_ps"].tolist(),
+                    "values": sampled["values"].tolist(),
+                    "downsampled": _downsample_info(sampled, method)
+                }
+                for term, sampled in result["series"].items()
+            }
+        }
+
+    try:
+        result = await loop.run_in_executor(None, partial(
+            analysis_service.get_energies,
+            project_dir,
+            prefix=prefix,
+            terms=terms,
+            since=since
+        ))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    columns = result["columns"]
+    return {
+        "prefix": prefix,
+        "terms": result["terms"],
+        "since": since,
+        "next_since": result["n_frames"],
+        "time_ps": columns.pop("time").tolist(),
+        "step": columns.pop("step").tolist(),
+        "energies": {term: values.tolist() for term, values in columns.items()}
+    }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, JSON, Boolean, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, JSON, Boolean, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -7,6 +7,7 @@ import enum
 class ProjectStatus(str, enum.Enum):
     CREATED = "created"
     CONFIGURED = "configured"
+    QUEUED = "queued"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
@@ -51,6 +52,12 @@ class Project(Base):
     files = relationship("ProjectFile", back_populates="project", cascade="all, delete-orphan")
     simulations = relationship("Simulation", back_populates="project", cascade="all, delete-orphan")
     
+    # Keyset pagination of the project list, newest first, optionally by status
+    __table_args__ = (
+        Index("ix_projects_created_at_id", "created_at", "id"),
+        Index("ix_projects_status_created_at_id", "status", "created_at", "id"),
+    )
+    
     def __repr__(self):
         return f"<Project(id='{self.id}', name='{self.name}', status='{self.status}')>"
 
@@ -61,13 +68,13 @@ class ProjectFile(Base):
     __tablename__ = "project_files"
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(String, nullable=False, index=True)
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
     filename = Column(String(255), nullable=False)
     original_filename = Column(String(255), nullable=False)
     file_type = Column(String(10), nullable=False)  # .pdb, .gro, etc.
     file_path = Column(String(512), nullable=False)
     file_size = Column(Integer, nullable=False)
-    checksum = Column(String(64), nullable=True)  # MD5 hash
+    checksum = Column(String(64), nullable=True)  # SHA-256 hash
     
     # File metadata
     is_primary = Column(Boolean, default=False)  # Primary structure file
@@ -84,6 +91,10 @@ class ProjectFile(Base):
     # Relationships
     project = relationship("Project", back_populates="files")
     
+    __table_args__ = (
+        Index("ix_project_files_project_id_filename", "project_id", "filename"),
+    )
+    
     def __repr__(self):
         return f"<ProjectFile(id={self.id}, filename='{self.filename}', type='{self.file_type}')>"
 
@@ -94,7 +105,7 @@ class Simulation(Base):
     __tablename__ = "simulations"
 
     id = Column(String, primary_key=True, index=True)
-    project_id = Column(String, nullable=False, index=True)
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
     name = Column(String(255), nullable=False)
     simulation_type = Column(String(50), nullable=False)  # minimization, nvt, npt, production
     
@@ -134,5 +145,9 @@ class Simulation(Base):
     # Relationships
     project = relationship("Project", back_populates="simulations")
     
+    __table_args__ = (
+        Index("ix_simulations_project_id_created_at", "project_id", "created_at"),
+    )
+    
     def __repr__(self):
         return f"<Simulation(id='{self.id}', type='{self.simulation_type}', status='{self.status}')>"
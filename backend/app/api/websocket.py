@@ -0,0 +1,407 @@
+import os
+import json
+import uuid
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+
+import msgpack
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Frames buffered per connection before the oldest are dropped
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "1000"))
+
+# A single send taking longer than this evicts the client (seconds)
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+# A client whose queue stays full for this long is evicted (seconds)
+STALL_TIMEOUT = float(os.getenv("WS_STALL_TIMEOUT", "30"))
+
+# Log lines broadcast within this window are sent as one frame (seconds)
+BATCH_INTERVAL = float(os.getenv("WS_BATCH_INTERVAL", "0.1"))
+
+# Minimum seconds between progress frames of a project
+PROGRESS_INTERVAL = float(os.getenv("WS_PROGRESS_INTERVAL", "1"))
+
+# Recent log lines kept per project for clients resuming after a reconnect
+REPLAY_LINES = int(os.getenv("WS_REPLAY_LINES", "5000"))
+
+# Seconds the stream of a project without a running job or subscribers is kept
+STREAM_RETENTION = float(os.getenv("WS_STREAM_RETENTION", "300"))
+
+# "text" sends the plain log text of each batch; "json" and "msgpack" send
+# typed messages (hello, logs, progress, dropped) with sequence numbers
+FORMATS = ("text", "json", "msgpack")
+
+# Identifies this server process, so clients can tell restarted sequences apart
+EPOCH = uuid.uuid4().hex
+
+Frame = Union[str, bytes]
+
+
+def encode(message: Dict[str, Any], fmt: str) -> Optional[Frame]:
+    """Wire frame of a message in a client format; None if the format does not carry it"""
+    if fmt == "msgpack":
+        return msgpack.packb(message)
+    if fmt == "json":
+        return json.dumps(message, separators=(",", ":"))
+    if message["type"] == "logs":
+        return "".join(message["lines"])
+    if message["type"] == "dropped":
+        return f"[{message['count']} messages dropped: connection too slow]\n"
+    return None
+
+
+class ProjectStream:
+    """
+    Log lines and latest progress of one project. Every line gets the next
+    sequence number; the last `replay` lines are kept for resuming clients.
+    """
+
+    def __init__(self, replay: int = REPLAY_LINES):
+        self.seq = 0
+        self.recent: Deque[Tuple[int, str]] = deque(maxlen=replay)
+        self.pending: List[str] = []
+        self.flush_task: Optional[asyncio.Task] = None
+        self.progress: Optional[Dict] = None
+        self.progress_version = 0
+        self.progress_sent = 0.0
+        self.progress_task: Optional[asyncio.Task] = None
+        # Jobs of the project currently running, and the pending removal of the stream
+        self.runs = 0
+        self.expiry_task: Optional[asyncio.Task] = None
+
+    def append(self, line: str) -> None:
+        self.seq += 1
+        self.recent.append((self.seq, line))
+        self.pending.append(line)
+
+    def since(self, seq: int) -> Tuple[int, List[str], int]:
+        """First sequence number and lines after `seq` still held, and how many were lost"""
+        if seq > self.seq:
+            # Sequence of an earlier server process
+            seq = 0
+        oldest = self.recent[0][0] if self.recent else self.seq + 1
+        lines = [line for number, line in self.recent if number > seq]
+        return max(seq + 1, oldest), lines, max(0, oldest - seq - 1)
+
+
+class ClientConnection:
+    """
+    A WebSocket client with its own bounded send queue and sender task,
+    so a slow client never delays delivery to anyone else. Progress has a
+    separate slot holding only the latest frame, which is never dropped
+    and never waits behind queued log batches.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        project_id: str,
+        fmt: str = "text",
+        max_queue: int = SEND_QUEUE_SIZE
+    ):
+        self.websocket = websocket
+        self.project_id = project_id
+        self.format = fmt
+        self.queue: Deque[Frame] = deque()
+        self.max_queue = max_queue
+        self.progress: Optional[Frame] = None
+        self.dropped = 0
+        self.full_since: Optional[float] = None
+        self.closed = False
+        self.frames_sent = 0
+        self._ready = asyncio.Event()
+        self.sender: Optional[asyncio.Task] = None
+
+    def enqueue(self, frame: Optional[Frame]) -> bool:
+        """
+        Queue a frame without blocking. When the queue is full the oldest
+        frame is dropped; drops are coalesced into a single notice. Returns
+        False once the client has been stalled for longer than STALL_TIMEOUT.
+        """
+        if self.closed:
+            return False
+        if frame is None:
+            return True
+
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self.dropped += 1
+            now = time.monotonic()
+            if self.full_since is None:
+                self.full_since = now
+            elif now - self.full_since > STALL_TIMEOUT:
+                return False
+        else:
+            self.full_since = None
+
+        self.queue.append(frame)
+        self._ready.set()
+        return True
+
+    def set_progress(self, frame: Optional[Frame]) -> None:
+        """Replace the pending progress frame with a newer one"""
+        if frame is not None and not self.closed:
+            self.progress = frame
+            self._ready.set()
+
+    async def _send(self, frame: Frame) -> None:
+        if isinstance(frame, bytes):
+            await asyncio.wait_for(self.websocket.send_bytes(frame), SEND_TIMEOUT)
+        else:
+            await asyncio.wait_for(self.websocket.send_text(frame), SEND_TIMEOUT)
+        self.frames_sent += 1
+
+    async def run_sender(self, on_failure) -> None:
+        """Drain the progress slot and the queue, sending one frame at a time"""
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+
+                while self.queue or self.progress is not None:
+                    if self.progress is not None:
+                        frame, self.progress = self.progress, None
+                        await self._send(frame)
+
+                    if self.dropped:
+                        notice = encode({"type": "dropped", "count": self.dropped}, self.format)
+                        self.dropped = 0
+                        await self._send(notice)
+
+                    if self.queue:
+                        await self._send(self.queue.popleft())
+                    if len(self.queue) < self.max_queue:
+                        self.full_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Evicting WebSocket client of project {self.project_id}: {e!r}")
+            await on_failure(self)
+
+
+class ConnectionManager:
+    """
+    WebSocket fan-out keyed by project.
+
+    Broadcast lines are only appended to the project's stream; every
+    BATCH_INTERVAL the lines gathered are encoded once per client format
+    and queued as a single frame per client, so the frame rate and the
+    encoding work stay flat however fast a job prints. Progress is
+    published at most every PROGRESS_INTERVAL and only its latest value is
+    delivered. Every connection drains its own queue concurrently, and
+    stalled or failing clients are evicted. A stream is dropped once its
+    project has had no running job and no subscribers for `retention`
+    seconds.
+    """
+
+    def __init__(
+        self,
+        batch_interval: float = BATCH_INTERVAL,
+        progress_interval: float = PROGRESS_INTERVAL,
+        retention: float = STREAM_RETENTION
+    ):
+        self.batch_interval = batch_interval
+        self.progress_interval = progress_interval
+        self.retention = retention
+        self.subscriptions: Dict[str, Set[ClientConnection]] = {}
+        self.streams: Dict[str, ProjectStream] = {}
+        self._clients: Dict[WebSocket, ClientConnection] = {}
+        self.lines_received = 0
+        self.batches_sent = 0
+        # Frames sent to clients that have since disconnected
+        self._frames_sent_closed = 0
+
+    @property
+    def active_connections(self):
+        return list(self._clients)
+
+    def _stream(self, project_id: str) -> ProjectStream:
+        stream = self.streams.get(project_id)
+        if stream is None:
+            stream = self.streams[project_id] = ProjectStream()
+        return stream
+
+    def _schedule_expiry(self, project_id: str, stream: ProjectStream) -> None:
+        """(Re)start the removal countdown of an idle stream, or stop it while the stream is in use"""
+        if stream.expiry_task is not None:
+            stream.expiry_task.cancel()
+            stream.expiry_task = None
+        if not stream.runs and not self.subscriptions.get(project_id):
+            stream.expiry_task = asyncio.create_task(self._expire_later(project_id, stream))
+
+    async def _expire_later(self, project_id: str, stream: ProjectStream) -> None:
+        await asyncio.sleep(self.retention)
+        stream.expiry_task = None
+        if self.streams.get(project_id) is stream and not stream.runs and not self.subscriptions.get(project_id):
+            del self.streams[project_id]
+
+    def run_started(self, project_id: str) -> None:
+        """Keep the stream of a project while one of its jobs runs"""
+        stream = self._stream(project_id)
+        stream.runs += 1
+        self._schedule_expiry(project_id, stream)
+
+    def run_finished(self, project_id: str) -> None:
+        stream = self._stream(project_id)
+        stream.runs = max(0, stream.runs - 1)
+        self._schedule_expiry(project_id, stream)
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        project_id: str,
+        fmt: str = "text",
+        since: Optional[int] = None
+    ) -> ClientConnection:
+        """Accept a client; with `since`, the lines it missed after that sequence number are sent first"""
+        await websocket.accept()
+        client = ClientConnection(websocket, project_id, fmt)
+        stream = self._stream(project_id)
+
+        client.enqueue(encode({
+            "type": "hello", "project_id": project_id, "epoch": EPOCH, "seq": stream.seq
+        }, fmt))
+        if since is not None:
+            first, lines, missed = stream.since(since)
+            if missed:
+                client.enqueue(encode({"type": "dropped", "count": missed}, fmt))
+            if lines:
+                client.enqueue(encode({"type": "logs", "seq": first, "lines": lines}, fmt))
+        if stream.progress is not None:
+            client.enqueue(encode(self._progress_message(stream), fmt))
+
+        self.subscriptions.setdefault(project_id, set()).add(client)
+        self._clients[websocket] = client
+        self._schedule_expiry(project_id, stream)
+        client.sender = asyncio.create_task(client.run_sender(self._evict))
+        return client
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return
+
+        client.closed = True
+        self._frames_sent_closed += client.frames_sent
+        subscribers = self.subscriptions.get(client.project_id)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self.subscriptions[client.project_id]
+                stream = self.streams.get(client.project_id)
+                if stream is not None:
+                    self._schedule_expiry(client.project_id, stream)
+        if client.sender is not None and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+
+    async def _evict(self, client: ClientConnection) -> None:
+        self.disconnect(client.websocket)
+        try:
+            await asyncio.wait_for(client.websocket.close(code=1008), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        client = self._clients.get(websocket)
+        if client is not None and not client.enqueue(message):
+            await self._evict(client)
+
+    async def broadcast(self, message: str, project_id: Optional[str] = None):
+        """Add a log line to the stream of a project, or of every subscribed project"""
+        project_ids = [project_id] if project_id is not None else list(self.subscriptions)
+        for project_id in project_ids:
+            stream = self._stream(project_id)
+            stream.append(message)
+            self.lines_received += 1
+            if stream.flush_task is None:
+                stream.flush_task = asyncio.create_task(self._flush_later(project_id, stream))
+            if stream.expiry_task is None:
+                self._schedule_expiry(project_id, stream)
+
+    async def _flush_later(self, project_id: str, stream: ProjectStream) -> None:
+        await asyncio.sleep(self.batch_interval)
+        stream.flush_task = None
+        lines, stream.pending = stream.pending, []
+        clients = list(self.subscriptions.get(project_id, ()))
+        if not lines or not clients:
+            return
+
+        message = {"type": "logs", "seq": stream.seq - len(lines) + 1, "lines": lines}
+        frames: Dict[str, Optional[Frame]] = {}
+        for client in clients:
+            if client.format not in frames:
+                frames[client.format] = encode(message, client.format)
+            if not client.enqueue(frames[client.format]):
+                await self._evict(client)
+        self.batches_sent += 1
+
+    @staticmethod
+    def _progress_message(stream: ProjectStream) -> Dict:
+        return {"type": "progress", "version": stream.progress_version, "progress": stream.progress}
+
+    def publish_progress(self, project_id: str, progress: Dict) -> None:
+        """Set the latest progress of a project; subscribers receive it at most every progress_interval"""
+        stream = self._stream(project_id)
+        if stream.expiry_task is None:
+            self._schedule_expiry(project_id, stream)
+        stream.progress = progress
+        stream.progress_version += 1
+        if stream.progress_task is None:
+            delay = max(0.0, stream.progress_sent + self.progress_interval - time.monotonic())
+            stream.progress_task = asyncio.create_task(self._send_progress_later(project_id, stream, delay))
+
+    async def _send_progress_later(self, project_id: str, stream: ProjectStream, delay: float) -> None:
+        await asyncio.sleep(delay)
+        stream.progress_task = None
+        stream.progress_sent = time.monotonic()
+        message = self._progress_message(stream)
+        frames: Dict[str, Optional[Frame]] = {}
+        for client in list(self.subscriptions.get(project_id, ())):
+            if client.format not in frames:
+                frames[client.format] = encode(message, client.format)
+            client.set_progress(frames[client.format])
+
+    def subscriber_count(self, project_id: str) -> int:
+        return len(self.subscriptions.get(project_id, ()))
+
+    def stats(self) -> Dict:
+        return {
+            "clients": len(self._clients),
+            "lines_received": self.lines_received,
+            "batches_sent": self.batches_sent,
+            "frames_sent": self._frames_sent_closed + sum(client.frames_sent for client in self._clients.values())
+        }
+
+
+manager = ConnectionManager()
+
+
+@router.websocket("/ws/{project_id}")
+async def websocket_endpoint(websocket: WebSocket, project_id: str, format: str = "text", since: Optional[int] = None):
+    """
+    WebSocket for real-time logging of a project. `format` selects plain
+    text batches or typed json/msgpack messages; pass the last sequence
+    number received as `since` to resume after reconnecting.
+    """
+    if format not in FORMATS:
+        await websocket.close(code=1008)
+        return
+
+    await manager.connect(websocket, project_id, format, since)
+    try:
+        while True:
+            data = await websocket.receive_text()
+            # Echo back for now
+            await manager.send_personal_message(f"Echo: {data}", websocket)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket)
@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, MetaData
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 # Database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./gromacs_gui.db")
@@ -23,6 +25,55 @@ else:
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Connection pool of the async engine used by the API
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+def _async_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+def _create_async_engine(url: str):
+    echo = os.getenv("SQL_ECHO", "false").lower() == "true"
+    if url.startswith("sqlite") and ":memory:" in url:
+        # In-memory SQLite uses a single static connection; pool options do not apply
+        return create_async_engine(url, echo=echo)
+    
+    # aiosqlite defaults to opening a connection per checkout; pool file databases too
+    return create_async_engine(
+        url,
+        echo=echo,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a writer commits; NORMAL sync is safe with WAL
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -47,8 +98,25 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency to get an async database session
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
 def init_db():
     """
     Initialize database tables
     """
     Base.metadata.create_all(bind=engine)
+
+async def init_async_db():
+    """
+    Initialize database tables through the async engine
+    """
+    # Importing the models registers their tables with Base.metadata
+    from app.api import projects  # noqa: F401
+    
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
@@ -1,17 +1,50 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import os
-import shutil
 import subprocess
 import json
 import asyncio
+import re
+import time
+import random
+from functools import partial
+from pathlib import Path
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 
+from app.api import analysis, websocket
+from app.api.projects import ProjectStatus
+from app.database import async_engine, init_async_db
+from app.api.websocket import manager
+from app.services.cache_service import StructureCache
+from app.services.file_service import FileService
+from app.services.gromacs_service import GromacsService, SEGMENT_END_MESSAGE
+from app.services.log_service import LogService, DEFAULT_PAGE_BYTES
+from app.services.project_service import ProjectRepository, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.pipeline_service import Pipeline, read_pipeline
+from app.services.preview_service import (
+    FRAMES as PREVIEW_FRAMES,
+    PREVIEW_DIR,
+    PREVIEW_SELECTION,
+    STRUCTURE as PREVIEW_STRUCTURE,
+    PreviewBuilder,
+    planned_time_ps,
+    read_manifest
+)
+from app.services.progress_service import ProgressWriter
+from app.services.telemetry_service import ResourceSampler
+from app.services.tuning_service import LaunchTuner, describe_system
+from app.services.validation_service import ValidationService
+from app.services.storage_service import BlobStore
+from app.services.scheduler_service import SimulationScheduler, SimulationJob
+from app.utils.file_utils import parse_byte_range
+from app.worker import distributed
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,6 +60,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(analysis.router)
+app.include_router(websocket.router)
+
 # Create necessary directories
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("projects", exist_ok=True)
@@ -36,6 +72,11 @@ os.makedirs("logs", exist_ok=True)
 class ProjectCreate(BaseModel):
     name: str
     description: Optional[str] = ""
+    source_project_id: Optional[str] = None  # reuse this project's input files
+
+class FileLink(BaseModel):
+    checksum: str
+    filename: str
 
 class SimulationConfig(BaseModel):
     project_id: str
@@ -47,37 +88,107 @@ class SimulationConfig(BaseModel):
     gpu_enabled: bool = True
     ntomp: int = 4
     ntmpi: int = 1
+    water_model: str = "tip3p"
+    box_distance: float = 1.0  # nm
+    box_type: str = "cubic"
+    maxh: Optional[float] = None  # wall-clock hours per mdrun segment; defaults to MDRUN_MAXH
+    autotune: bool = False  # benchmark ntmpi/ntomp/npme layouts after minimization and use the fastest
 
-class FileInfo(BaseModel):
+class EnsembleCreate(BaseModel):
+    replicas: int
+    mode: str = "packed"  # packed: one scheduler job per replica; multidir: one mdrun -multidir
+    seed: Optional[int] = None  # gen_seed of the first replica; the others count up from it
+
+class UploadSessionCreate(BaseModel):
     filename: str
-    file_type: str
     size: int
-    upload_time: datetime
+    chunk_size: Optional[int] = None
+
+# Projects, their files and simulations live in the database
+project_repository = ProjectRepository()
+progress_writer = ProgressWriter()
+telemetry = ResourceSampler()
+
+gromacs_service = GromacsService()
+scheduler = SimulationScheduler()
+log_service = LogService("logs")
+file_service = FileService()
+blob_store = BlobStore()
+launch_tuner = LaunchTuner()
+structure_cache = StructureCache()
+validation_service = ValidationService(gromacs_service.force_fields_path)
 
-# In-memory storage (replace with database in production)
-projects: Dict[str, Dict] = {}
-active_connections: List[WebSocket] = []
+ALLOWED_EXTENSIONS = ['.pdb', '.gro', '.mol2', '.sdf', '.itp', '.top', '.mdp']
 
-# WebSocket manager for real-time logging
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+SIMULATION_PHASES = ["minimization", "nvt", "npt", "production"]
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+MAX_ENSEMBLE_REPLICAS = 64
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# Bytes per read when streaming a range of a preview trajectory
+PREVIEW_READ_SIZE = 1024 * 1024
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+# One preview update at a time per project; each continues where the last stopped
+preview_locks: Dict[str, asyncio.Lock] = {}
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+@app.on_event("startup")
+async def startup():
+    await init_async_db()
+    # Chunked uploads interrupted by the restart can be resumed
+    await asyncio.get_running_loop().run_in_executor(None, file_service.load_sessions, "projects")
+    progress_writer.start()
+    telemetry.start()
+    await recover_simulations()
 
-manager = ConnectionManager()
+@app.on_event("shutdown")
+async def shutdown():
+    # Running mdrun processes outlive the backend and are picked up on the next start
+    gromacs_service.detach()
+    await validation_service.shutdown()
+    await telemetry.stop()
+    await progress_writer.stop()
+    await async_engine.dispose()
+
+async def recover_simulations():
+    """
+    Requeue the jobs of projects left queued or running by the previous
+    backend process. Their runs resume: finished phases are skipped, a
+    still-running mdrun is reattached and anything else continues from its
+    last checkpoint.
+    """
+    active = await project_repository.list_active()
+    statuses = {project["id"]: project["status"] for project in active}
+    for project in active:
+        project_id = project["id"]
+        config = project["config"] or {}
+        ensemble = config.get("ensemble") or {}
+        
+        if "parent_id" in ensemble and statuses.get(ensemble["parent_id"]) is not None:
+            # Still being prepared or run by its ensemble's job, which is requeued itself
+            continue
+        
+        await project_repository.interrupt_simulations(project_id, "Interrupted by a backend restart")
+        if "replica_ids" in ensemble:
+            job_config = dict(config)
+            if ensemble["mode"] == "multidir":
+                job_config["ntmpi"] = len(ensemble["replica_ids"])
+            runner = run_ensemble
+        else:
+            job_config = dict(config)
+            runner = run_gromacs_simulation
+        
+        await project_repository.set_status(project_id, ProjectStatus.QUEUED)
+        scheduler.submit(project_id, {**job_config, "resume": True}, runner)
+        logger.info(f"Requeued interrupted simulation of project {project_id}")
+
+async def _get_project(project_id: str) -> Dict:
+    project = await project_repository.get(project_id)
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
+async def _require_project(project_id: str) -> None:
+    if not await project_repository.exists(project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
 
 @app.get("/")
 async def root():
@@ -86,166 +197,960 @@ async def root():
 @app.post("/api/projects/create")
 async def create_project(project: ProjectCreate):
     """Create a new simulation project"""
+    source = None
+    if project.source_project_id:
+        source = await project_repository.get(project.source_project_id)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Source project not found")
+    
     project_id = str(uuid.uuid4())
     project_dir = f"projects/{project_id}"
     os.makedirs(project_dir, exist_ok=True)
     
-    projects[project_id] = {
-        "id": project_id,
-        "name": project.name,
-        "description": project.description,
-        "created_at": datetime.now().isoformat(),
-        "status": "created",
-        "files": [],
-        "config": None
-    }
+    await project_repository.create(project_id, project.name, project.description)
+    
+    # Link the source project's inputs from the blob store; no data is copied
+    if source is not None:
+        for source_file in source["files"]:
+            checksum = source_file.get("checksum")
+            if checksum and blob_store.has_blob(checksum):
+                blob_store.link(checksum, os.path.join(project_dir, source_file["filename"]))
+                await _record_file(project_id, source_file["filename"], source_file["size"], checksum)
     
     return {"project_id": project_id, "status": "created"}
 
 @app.get("/api/projects")
-async def list_projects():
-    """List all projects"""
-    return list(projects.values())
+async def list_projects(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[ProjectStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+):
+    """
+    List projects, newest first. Pass the returned `next_cursor` as
+    `cursor` to get the next page.
+    """
+    try:
+        return await project_repository.list(limit, cursor, status, created_after, created_before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/projects/{project_id}")
 async def get_project(project_id: str):
     """Get project details"""
-    if project_id not in projects:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return projects[project_id]
+    return await _get_project(project_id)
+
+def _check_upload_filename(filename: str) -> str:
+    """Strip directory components and validate the extension of an uploaded file"""
+    filename = os.path.basename(filename or "")
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"File type {file_ext} not allowed")
+    return filename
+
+async def _record_file(project_id: str, filename: str, size: int, checksum: str) -> Dict:
+    # A re-upload replaces the previous file of the same name
+    file_path = os.path.join(f"projects/{project_id}", filename)
+    file_info, replaced = await project_repository.record_file(project_id, filename, file_path, size, checksum)
+    for previous in replaced:
+        if previous != checksum:
+            blob_store.release(previous, file_path)
+    await _validate_files(project_id, [file_info])
+    return file_info
+
+async def _validate_files(project_id: str, files: List[Dict]) -> None:
+    """Queue files for validation on the process pool; results arrive over the WebSocket"""
+    project = await project_repository.get(project_id)
+    forcefield = (project.get("config") or {}).get("forcefield") if project else None
+    validation_service.submit(project_id, files, forcefield, _record_validation)
+
+async def _record_validation(project_id: str, project_file: Dict, result: Dict, progress: Dict) -> None:
+    issues = result["issues"]
+    current = await project_repository.set_file_validation(
+        project_id, project_file["filename"], project_file.get("checksum"), issues
+    )
+    if not current:
+        return  # replaced by a newer upload, which is validated on its own
+    errors = sum(1 for issue in issues if issue["severity"] == "error")
+    await manager.broadcast(
+        f"Validated {project_file['filename']} ({progress['done']}/{progress['total']}): "
+        f"{errors} errors, {len(issues) - errors} warnings",
+        project_id
+    )
 
 @app.post("/api/projects/{project_id}/upload")
 async def upload_file(project_id: str, file: UploadFile = File(...)):
     """Upload files to a project"""
-    if project_id not in projects:
-        raise HTTPException(status_code=404, detail="Project not found")
+    await _require_project(project_id)
     
     # Validate file type
-    allowed_extensions = ['.pdb', '.gro', '.mol2', '.sdf', '.itp', '.top', '.mdp']
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    
-    if file_ext not in allowed_extensions:
-        raise HTTPException(status_code=400, detail=f"File type {file_ext} not allowed")
+    filename = _check_upload_filename(file.filename)
     
-    # Save file
+    # Stream file to disk, computing the checksum on the way
     project_dir = f"projects/{project_id}"
-    file_path = os.path.join(project_dir, file.filename)
+    file_path = os.path.join(project_dir, filename)
+    size, checksum = await file_service.save_upload(file, file_path)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Deduplicate against identical files in other projects
+    await asyncio.get_running_loop().run_in_executor(None, blob_store.ingest, file_path, checksum)
     
     # Update project info
-    file_info = FileInfo(
-        filename=file.filename,
-        file_type=file_ext,
-        size=os.path.getsize(file_path),
-        upload_time=datetime.now()
-    )
+    file_info = await _record_file(project_id, filename, size, checksum)
     
-    projects[project_id]["files"].append(file_info.dict())
+    return {"message": "File uploaded successfully", "file_info": file_info}
+
+@app.post("/api/projects/{project_id}/uploads")
+async def create_upload_session(project_id: str, upload: UploadSessionCreate):
+    """Start a chunked, resumable upload for a large file"""
+    await _require_project(project_id)
+    if upload.size < 0 or (upload.chunk_size is not None and upload.chunk_size <= 0):
+        raise HTTPException(status_code=400, detail="Invalid size or chunk size")
     
+    filename = _check_upload_filename(upload.filename)
+    session = await file_service.create_session(
+        project_id, f"projects/{project_id}", filename, upload.size, upload.chunk_size
+    )
+    return session.to_dict()
+
+def _get_upload_session(project_id: str, session_id: str):
+    session = file_service.get_session(project_id, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+@app.get("/api/projects/{project_id}/uploads/{session_id}")
+async def get_upload_session(project_id: str, session_id: str):
+    """Get received and missing chunks, to resume an interrupted upload"""
+    return _get_upload_session(project_id, session_id).to_dict()
+
+@app.put("/api/projects/{project_id}/uploads/{session_id}/chunks/{index}")
+async def upload_chunk(project_id: str, session_id: str, index: int, request: Request):
+    """Upload one chunk as the raw request body; chunks may be sent in parallel"""
+    session = _get_upload_session(project_id, session_id)
+    try:
+        await file_service.write_chunk(session, index, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"index": index, "received_chunks": len(session.received), "total_chunks": session.total_chunks}
+
+@app.post("/api/projects/{project_id}/uploads/{session_id}/complete")
+async def complete_upload_session(project_id: str, session_id: str):
+    """Finish a chunked upload and register the file with the project"""
+    session = _get_upload_session(project_id, session_id)
+    try:
+        size, checksum = await file_service.complete_session(session)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    await asyncio.get_running_loop().run_in_executor(None, blob_store.ingest, session.final_path, checksum)
+    file_info = await _record_file(project_id, session.filename, size, checksum)
     return {"message": "File uploaded successfully", "file_info": file_info}
 
+@app.delete("/api/projects/{project_id}/uploads/{session_id}")
+async def abort_upload_session(project_id: str, session_id: str):
+    """Abort a chunked upload and discard received chunks"""
+    session = _get_upload_session(project_id, session_id)
+    file_service.abort_session(session)
+    return {"message": "Upload aborted"}
+
+@app.post("/api/projects/{project_id}/files/link")
+async def link_file(project_id: str, link: FileLink):
+    """Add an already stored file to a project by checksum, without uploading it again"""
+    await _require_project(project_id)
+    
+    filename = _check_upload_filename(link.filename)
+    file_path = os.path.join(f"projects/{project_id}", filename)
+    try:
+        method = blob_store.link(link.checksum, file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    file_info = await _record_file(project_id, filename, os.path.getsize(file_path), link.checksum.lower())
+    return {"message": "File linked successfully", "method": method, "file_info": file_info}
+
+@app.get("/api/storage")
+async def get_storage_stats():
+    """Get blob store usage and deduplication savings"""
+    return await asyncio.get_running_loop().run_in_executor(None, blob_store.stats)
+
+@app.post("/api/storage/gc")
+async def collect_garbage():
+    """Delete stored files no project references any more"""
+    return await asyncio.get_running_loop().run_in_executor(None, blob_store.gc)
+
+@app.get("/api/cache")
+async def get_stage_cache_stats():
+    """Get system-preparation cache hits, misses and size, and those of parsed structures and analyses"""
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(None, gromacs_service.stage_cache.stats)
+    stats["structures"] = await loop.run_in_executor(None, structure_cache.stats)
+    stats["analyses"] = await loop.run_in_executor(None, analysis.analysis_service.results.stats)
+    return stats
+
 @app.get("/api/forcefields")
 async def get_forcefields():
     """Get available GROMACS force fields"""
-    # This would normally check GROMACS installation
-    forcefields = [
-        {"name": "amber99sb-ildn", "description": "AMBER99SB-ILDN protein force field"},
-        {"name": "charmm36-jul2022", "description": "CHARMM36 all-atom force field"},
-        {"name": "gromos54a7", "description": "GROMOS 54A7 united-atom force field"},
-        {"name": "oplsaa", "description": "OPLS-AA all-atom force field"},
-        {"name": "amber14sb", "description": "AMBER14SB protein force field"}
-    ]
-    return forcefields
+    return await gromacs_service.get_available_forcefields()
+
+@app.get("/api/projects/{project_id}/forcefields/compatibility")
+async def check_forcefield_compatibility(
+    project_id: str,
+    filename: Optional[str] = None,
+    forcefield: Optional[List[str]] = Query(None)
+):
+    """Check the residues of a project PDB against the residue databases of each force field"""
+    await _require_project(project_id)
+
+    filename, structure = await _load_structure(project_id, filename, (".pdb",))
+    residues = structure.residues()
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(
+        None, partial(gromacs_service.forcefields.check_compatibility, residues, forcefield)
+    )
+    return {"filename": filename, "residue_count": len(residues), "forcefields": results}
+
+async def _load_structure(project_id: str, filename: Optional[str], suffixes=(".pdb", ".gro")):
+    """Name and parsed contents of a project structure file (the first one if no filename is given)"""
+    files = await project_repository.list_files(project_id)
+    # Uploaded PDBs before GRO files
+    structures = sorted(
+        (f for f in files if f["filename"].lower().endswith(suffixes)),
+        key=lambda f: (suffixes.index(os.path.splitext(f["filename"].lower())[1]), f["filename"])
+    )
+    if filename is None:
+        if not structures:
+            raise HTTPException(status_code=404, detail="No structure file in project")
+        project_file = structures[0]
+    else:
+        project_file = next((f for f in structures if f["filename"] == filename), None)
+        if project_file is None:
+            raise HTTPException(status_code=404, detail="Structure file not found")
+    
+    path = os.path.join("projects", project_id, project_file["filename"])
+    try:
+        structure = await asyncio.get_running_loop().run_in_executor(
+            None, structure_cache.load, path, project_file["checksum"]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"{project_file['filename']}: {e}")
+    return project_file["filename"], structure
+
+@app.post("/api/projects/{project_id}/validate")
+async def validate_project_files(project_id: str):
+    """Validate all files of a project again; results are pushed over the WebSocket"""
+    project = await _get_project(project_id)
+    await _validate_files(project_id, project["files"])
+    return {"message": "Validation queued", "progress": validation_service.progress(project_id)}
+
+@app.get("/api/projects/{project_id}/validation")
+async def get_validation(project_id: str):
+    """Validation state and issues of each project file"""
+    project = await _get_project(project_id)
+    return {
+        "progress": validation_service.progress(project_id),
+        "files": [
+            {
+                "filename": f["filename"],
+                "is_validated": f["is_validated"],
+                # None until the file's validation has finished
+                "issues": f["validation_errors"]
+            }
+            for f in project["files"]
+        ]
+    }
+
+@app.get("/api/projects/{project_id}/structure")
+async def get_structure_summary(project_id: str, filename: Optional[str] = None):
+    """Atom and residue counts, chains, extent and box of a project structure file"""
+    await _require_project(project_id)
+    filename, structure = await _load_structure(project_id, filename)
+    return {"filename": filename, **structure.summary()}
 
 @app.post("/api/projects/{project_id}/configure")
 async def configure_simulation(project_id: str, config: SimulationConfig):
     """Configure simulation parameters"""
-    if project_id not in projects:
-        raise HTTPException(status_code=404, detail="Project not found")
+    await _require_project(project_id)
+    
+    project = await _get_project(project_id)
+    await project_repository.set_config(project_id, config.dict())
     
-    projects[project_id]["config"] = config.dict()
-    projects[project_id]["status"] = "configured"
+    # Residue checks depend on the force field
+    if (project.get("config") or {}).get("forcefield") != config.forcefield:
+        pdb_files = [f for f in project["files"] if f["filename"].lower().endswith(".pdb")]
+        if pdb_files:
+            await _validate_files(project_id, pdb_files)
     
     return {"message": "Simulation configured successfully"}
 
 @app.post("/api/projects/{project_id}/start")
 async def start_simulation(project_id: str):
-    """Start GROMACS simulation"""
-    if project_id not in projects:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    project = projects[project_id]
+    """Queue GROMACS simulation on the core-aware scheduler"""
+    project = await _get_project(project_id)
     if not project.get("config"):
         raise HTTPException(status_code=400, detail="Project not configured")
+    if project["status"] in ("queued", "running"):
+        raise HTTPException(status_code=400, detail="Simulation already queued or running")
     
     # Update status
-    projects[project_id]["status"] = "running"
+    await project_repository.set_status(project_id, ProjectStatus.QUEUED)
     
-    # Start simulation in background
-    asyncio.create_task(run_gromacs_simulation(project_id))
+    # Queue simulation; it starts once enough cores are free
+    job = scheduler.submit(project_id, project["config"], run_gromacs_simulation)
     
-    return {"message": "Simulation started", "project_id": project_id}
+    return {
+        "message": "Simulation queued",
+        "project_id": project_id,
+        "job": scheduler.job_info(job)
+    }
 
-async def run_gromacs_simulation(project_id: str):
-    """Run GROMACS simulation asynchronously"""
+@app.post("/api/projects/{project_id}/resume")
+async def resume_simulation(project_id: str):
+    """Queue a failed or cancelled simulation to continue from its last checkpoint"""
+    project = await _get_project(project_id)
+    if project["status"] not in ("failed", "cancelled"):
+        raise HTTPException(status_code=400, detail="Only failed or cancelled simulations can be resumed")
+    if "replica_ids" in (project["config"].get("ensemble") or {}):
+        raise HTTPException(status_code=400, detail="Resume the replicas of an ensemble individually")
+    
+    await project_repository.set_status(project_id, ProjectStatus.QUEUED)
+    job = scheduler.submit(project_id, {**project["config"], "resume": True}, run_gromacs_simulation)
+    
+    return {
+        "message": "Simulation queued to resume",
+        "project_id": project_id,
+        "job": scheduler.job_info(job)
+    }
+
+@app.get("/api/projects/{project_id}/queue")
+async def get_queue_position(project_id: str):
+    """Get queue position and estimated start time of the project's simulation"""
+    await _require_project(project_id)
+    
+    job = scheduler.job_for_project(project_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No simulation submitted for this project")
+    
+    return scheduler.job_info(job)
+
+@app.get("/api/scheduler")
+async def get_scheduler_status():
+    """Get core usage, running jobs and queue depth"""
+    return scheduler.status()
+
+async def run_gromacs_simulation(job: SimulationJob):
+    """
+    Run GROMACS simulation on the cores allotted by the scheduler. With
+    `resume` in the job config, preparation and phases that already finished
+    are skipped and the interrupted phase continues from its checkpoint.
+
+    The run is a pipeline: the phases form a chain, and the equilibration
+    check of each phase (and of each finished production segment) runs
+    alongside the next phase. With `autotune`, a tuning stage between
+    minimization and NVT picks the mdrun layout of the remaining phases.
+    Production segments and the finished production also update the
+    preview trajectory of the 3D viewer.
+    """
+    project_id = job.project_id
+    manager.run_started(project_id)
     try:
-        project = projects[project_id]
         project_dir = f"projects/{project_id}"
-        config = project["config"]
+        config = dict(job.config)
+        config["pinoffset"] = job.pin_offset
+        resume = config.pop("resume", False)
+        if not resume:
+            gromacs_service.reset_run_state(project_dir)
+        await project_repository.set_status(project_id, ProjectStatus.RUNNING)
         
         # Broadcast status updates
-        await manager.broadcast(f"Starting simulation for project {project_id}")
-        
-        # Step 1: Generate topology (simplified example)
-        cmd = ["echo", "Generating topology..."]  # Replace with actual GROMACS commands
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=project_dir
+        await manager.broadcast(
+            f"Starting simulation for project {project_id} "
+            f"on cores {job.cores[0]}-{job.cores[-1]}",
+            project_id
         )
         
-        stdout, stderr = await process.communicate()
+        # Resource usage accumulates over the phases of all runs of the project
+        project = await project_repository.get(project_id)
+        usage = {"cpu_hours": project["cpu_hours"] or 0.0, "memory_peak_mb": project["memory_peak_mb"] or 0.0}
+        
+        pipeline = Pipeline(project_dir)
+        previous = None
+        # Ensemble replicas arrive with the system already prepared
+        if not config.get("prepared") and not (resume and gromacs_service.is_completed(project_dir, "prepare")):
+            previous = pipeline.add("prepare", partial(gromacs_service.prepare_system, project_dir, config)).name
         
-        if stdout:
-            await manager.broadcast(f"STDOUT: {stdout.decode()}")
-        if stderr:
-            await manager.broadcast(f"STDERR: {stderr.decode()}")
+        # Persist output so it can be paged through /logs
+        with open(log_service.log_path(project_id), "a") as log_file:
+            for index, phase in enumerate(SIMULATION_PHASES):
+                if resume and gromacs_service.is_completed(project_dir, phase):
+                    continue
+                # Benchmarks need the minimized structure and the cores of this node
+                if phase != "minimization" and config.get("autotune") and "tune" not in pipeline.stages:
+                    if distributed.enabled:
+                        await manager.broadcast("Skipping launch tuning: phases run on worker nodes", project_id)
+                    else:
+                        previous = pipeline.add("tune", partial(
+                            _tune_launch, project_id, project_dir, config, len(job.cores)
+                        ), after=[previous]).name
+                pipeline.add(phase, partial(
+                    _run_phase, project_id, project_dir, index, phase, config, log_file, len(job.cores), usage, pipeline
+                ), after=[previous])
+                pipeline.add(
+                    f"{phase}.check", partial(_check_phase, project_id, project_dir, phase, config),
+                    after=[phase], required=False
+                )
+                previous = phase
+            if previous == "production":
+                pipeline.add(
+                    "production.preview", partial(_update_preview, project_id, project_dir),
+                    after=["production"], required=False
+                )
+            await pipeline.run()
         
         # Update project status
-        projects[project_id]["status"] = "completed"
-        await manager.broadcast(f"Simulation completed for project {project_id}")
+        await progress_writer.finish("project", project_id, progress_percentage=100.0)
+        await project_repository.set_status(project_id, ProjectStatus.COMPLETED)
+        await manager.broadcast(f"Simulation completed for project {project_id}", project_id)
         
+    except asyncio.CancelledError:
+        await progress_writer.flush()
+        # On shutdown the project stays running so the next start resumes it
+        if not gromacs_service.detached:
+            await project_repository.set_status(project_id, ProjectStatus.CANCELLED)
+        raise
+    except Exception as e:
+        await progress_writer.flush()
+        await project_repository.set_status(project_id, ProjectStatus.FAILED)
+        await manager.broadcast(f"Simulation failed: {str(e)}", project_id)
+        raise
+    finally:
+        manager.run_finished(project_id)
+
+def _record_progress(project_id: str, simulation_id: str, index: int, phase: str, update: Dict) -> None:
+    """Buffer an MdrunProgressParser update for the simulation and its project, and publish it to subscribers"""
+    progress = update.get("progress")
+    simulation = {}
+    if progress is not None:
+        simulation["progress_percentage"] = progress
+    if update.get("time_ps") is not None:
+        simulation["current_time_ps"] = update["time_ps"]
+    if update.get("total_time_ps") is not None:
+        simulation["total_time_ps"] = update["total_time_ps"]
+    if update.get("ns_per_day") is not None:
+        simulation["performance_ns_per_day"] = update["ns_per_day"]
+    if simulation:
+        progress_writer.record("simulation", simulation_id, **simulation)
+    
+    project = {
+        "current_step": update.get("step") or 0,
+        "total_steps": update.get("nsteps"),
+        "metadata_info": {"progress": {"phase": phase, **update}}
+    }
+    if progress is not None:
+        project["progress_percentage"] = (index + progress / 100) / len(SIMULATION_PHASES) * 100
+    progress_writer.record("project", project_id, **project)
+    manager.publish_progress(project_id, {
+        "phase": phase,
+        "simulation_id": simulation_id,
+        "project_progress": project.get("progress_percentage"),
+        **update
+    })
+
+async def _run_phase(
+    project_id: str,
+    project_dir: str,
+    index: int,
+    phase: str,
+    config: Dict,
+    log_file,
+    cores: int,
+    usage: Dict,
+    pipeline: Optional[Pipeline] = None
+) -> None:
+    """
+    Run one phase as a Simulation row; progress goes through the
+    write-behind buffer. Each finished -maxh segment adds a check of the
+    energies so far to the pipeline.
+    """
+    simulation_id = str(uuid.uuid4())
+    await project_repository.create_simulation(simulation_id, project_id, phase, config)
+    started = time.monotonic()
+    
+    async def on_progress(update: Dict):
+        _record_progress(project_id, simulation_id, index, phase, update)
+    
+    def on_process(pid: int):
+        telemetry.register(simulation_id, project_id, pid, cores)
+    
+    def final(status: ProjectStatus, **values) -> Dict:
+        summary = telemetry.unregister(simulation_id)
+        if summary is not None:
+            values["cpu_usage_percent"] = summary["average_cpu_percent"]
+            values["memory_usage_mb"] = summary["peak_rss_mb"]
+            usage["cpu_hours"] += summary["cpu_seconds"] / 3600
+            usage["memory_peak_mb"] = max(usage["memory_peak_mb"], summary["peak_rss_mb"])
+            progress_writer.record("project", project_id, **usage)
+        return dict(
+            status=status,
+            completed_at=datetime.now(timezone.utc),
+            duration_seconds=time.monotonic() - started,
+            **values
+        )
+    
+    # Phases run on a worker node when distributed execution is enabled
+    run = distributed.run_phase if distributed.enabled else gromacs_service.run_simulation_phase
+    segment_end = SEGMENT_END_MESSAGE.format(phase=phase)
+    segments = 0
+    try:
+        async for line in run(project_dir, phase, config, on_progress, on_process):
+            log_file.write(line)
+            log_file.flush()
+            await manager.broadcast(line, project_id)
+            if line == segment_end and pipeline is not None:
+                segments += 1
+                pipeline.add(
+                    f"{phase}.segment{segments}.check", partial(_check_phase, project_id, project_dir, phase, config),
+                    required=False
+                )
+                if phase == "production":
+                    pipeline.add(
+                        f"{phase}.segment{segments}.preview", partial(_update_preview, project_id, project_dir),
+                        required=False
+                    )
+    except asyncio.CancelledError:
+        await progress_writer.finish("simulation", simulation_id, **final(ProjectStatus.CANCELLED))
+        raise
     except Exception as e:
-        projects[project_id]["status"] = "failed"
-        await manager.broadcast(f"Simulation failed: {str(e)}")
+        await progress_writer.finish(
+            "simulation", simulation_id, **final(ProjectStatus.FAILED, error_message=str(e))
+        )
+        raise
+    
+    await progress_writer.finish(
+        "simulation", simulation_id, **final(ProjectStatus.COMPLETED, progress_percentage=100.0)
+    )
+
+async def _check_phase(project_id: str, project_dir: str, phase: str, config: Dict) -> Dict:
+    """Equilibration report of the energies a phase has written so far"""
+    prefix = gromacs_service.output_prefix(phase)
+    try:
+        report = await asyncio.get_running_loop().run_in_executor(None, partial(
+            analysis.analysis_service.check_equilibration, project_dir, prefix, config.get("temperature")
+        ))
+    except FileNotFoundError:
+        return {"prefix": prefix, "passed": None, "skipped": "no energy file"}
+    
+    if report["passed"] is False:
+        failed = [name for name, ok in report["checks"].items() if not ok]
+        await manager.broadcast(f"Warning: {phase} failed equilibration checks: {', '.join(failed)}", project_id)
+    return report
+
+async def _tune_launch(project_id: str, project_dir: str, config: Dict, cores: int) -> Dict:
+    """
+    Pick ntmpi/ntomp/npme for the cores allotted to the run, from the tuning
+    cache or by benchmarking, and apply them to the config of the later phases
+    """
+    loop = asyncio.get_running_loop()
+    system = await loop.run_in_executor(None, describe_system, project_dir)
+    engine = await loop.run_in_executor(None, gromacs_service.engine_version)
+    
+    async def report(layout: Dict, ns_per_day: Optional[float]):
+        result = f"{ns_per_day} ns/day" if ns_per_day is not None else "failed"
+        await manager.broadcast(
+            f"Benchmark ntmpi={layout['ntmpi']} ntomp={layout['ntomp']} npme={layout['npme']}: {result}",
+            project_id
+        )
+    
+    await manager.broadcast(f"Tuning mdrun launch layout for {system['atoms']} atoms on {cores} cores", project_id)
+    result = await launch_tuner.tune(
+        system,
+        cores,
+        config.get("gpu_enabled", True),
+        engine,
+        partial(gromacs_service.benchmark_layout, project_dir, config=config, system=system),
+        prepare=partial(gromacs_service.prepare_benchmark, project_dir),
+        report=report
+    )
+    
+    # Phases after this stage read the shared config when they start
+    config.update(result["layout"])
+    source = "cached" if result["cached"] else "benchmarked"
+    await manager.broadcast(
+        f"Using {source} layout ntmpi={config['ntmpi']} ntomp={config['ntomp']} npme={config['npme']} "
+        f"({result['ns_per_day']} ns/day)",
+        project_id
+    )
+    return {"key": result["key"], "cached": result["cached"], "layout": result["layout"], "ns_per_day": result["ns_per_day"]}
+
+@app.get("/api/tuning")
+async def get_tuning_cache():
+    """Tuned mdrun launch layouts with their benchmarks"""
+    return await asyncio.get_running_loop().run_in_executor(None, launch_tuner.entries)
+
+async def _update_preview(project_id: str, project_dir: str) -> Dict:
+    """Append the production frames written so far to the viewer's preview trajectory"""
+    def update() -> Dict:
+        # A missing or still empty trajectory (MDAnalysis fails to open an
+        # XTC without a complete frame) or a system with no atoms to show
+        # leaves the preview as it is
+        try:
+            reader = analysis.analysis_service.open_trajectory(project_dir, PREVIEW_SELECTION, trajectory="md.xtc")
+            builder = PreviewBuilder(project_dir)
+            planned_ps = planned_time_ps(Path(project_dir) / "production.mdp")
+        except (OSError, ValueError) as e:
+            return {"skipped": str(e)}
+        try:
+            return builder.update(reader, planned_ps)
+        except ValueError as e:
+            return {"skipped": str(e)}
+    
+    async with preview_locks.setdefault(project_id, asyncio.Lock()):
+        manifest = await asyncio.get_running_loop().run_in_executor(None, update)
+    if "skipped" in manifest:
+        return manifest
+    
+    await manager.broadcast(
+        f"Preview updated: {len(manifest['frames'])} frames of {manifest['n_atoms']} atoms", project_id
+    )
+    return {"frames": len(manifest["frames"]), "stride_ps": manifest["stride_ps"], "size": manifest["size"]}
+
+@app.get("/api/projects/{project_id}/preview")
+async def get_preview(project_id: str):
+    """
+    Manifest of the preview trajectory: atom count, quantization and the
+    time, byte offset and length of each frame record in /preview/frames
+    """
+    await _require_project(project_id)
+    manifest = read_manifest(f"projects/{project_id}")
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="No preview trajectory yet")
+    return manifest
+
+@app.get("/api/projects/{project_id}/preview/structure")
+async def get_preview_structure(project_id: str):
+    """PDB of the preview atoms, the topology the frames apply to"""
+    await _require_project(project_id)
+    path = os.path.join("projects", project_id, PREVIEW_DIR, PREVIEW_STRUCTURE)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No preview trajectory yet")
+    return FileResponse(path, media_type="chemical/x-pdb")
 
-@app.websocket("/ws/{project_id}")
-async def websocket_endpoint(websocket: WebSocket, project_id: str):
-    """WebSocket for real-time logging"""
-    await manager.connect(websocket)
+@app.get("/api/projects/{project_id}/preview/frames")
+async def get_preview_frames(project_id: str, request: Request):
+    """Frame records of the preview trajectory; supports single HTTP byte ranges"""
+    await _require_project(project_id)
+    manifest = read_manifest(f"projects/{project_id}")
+    path = os.path.join("projects", project_id, PREVIEW_DIR, PREVIEW_FRAMES)
+    if manifest is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No preview trajectory yet")
+    
+    f = open(path, "rb")
+    size = os.fstat(f.fileno()).st_size
+    # Offsets are only valid for the manifest version they were listed in
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{manifest["version"]}-{size}"'}
+    range_header = request.headers.get("range")
+    if range_header is None:
+        f.close()
+        return FileResponse(path, media_type="application/octet-stream", headers=headers)
+    try:
+        start, end = parse_byte_range(range_header, size)
+    except ValueError:
+        f.close()
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    
+    def read_range():
+        with f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(PREVIEW_READ_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+    
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read_range(), status_code=206, media_type="application/octet-stream", headers=headers)
+
+@app.get("/api/projects/{project_id}/pipeline")
+async def get_pipeline(project_id: str):
+    """Stage timings, check results and critical path of the project's last run"""
+    await _require_project(project_id)
+    pipeline = read_pipeline(f"projects/{project_id}")
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail="Project has not run yet")
+    return pipeline
+
+@app.post("/api/projects/{project_id}/ensemble")
+async def create_ensemble(project_id: str, ensemble: EnsembleCreate):
+    """
+    Fan a configured project out into replicas that differ only in their
+    random seeds. The system is prepared once in this project and cloned
+    into every replica.
+    """
+    parent = await _get_project(project_id)
+    if not parent.get("config"):
+        raise HTTPException(status_code=400, detail="Project not configured")
+    if parent["status"] in ("queued", "running"):
+        raise HTTPException(status_code=400, detail="Simulation already queued or running")
+    if not 2 <= ensemble.replicas <= MAX_ENSEMBLE_REPLICAS:
+        raise HTTPException(status_code=400, detail=f"Replicas must be between 2 and {MAX_ENSEMBLE_REPLICAS}")
+    if ensemble.mode not in ("packed", "multidir"):
+        raise HTTPException(status_code=400, detail="Mode must be packed or multidir")
+    
+    base_seed = ensemble.seed if ensemble.seed is not None else random.randrange(1, 2**31 - ensemble.replicas)
+    base_config = {k: v for k, v in parent["config"].items() if k not in ("ensemble", "prepared", "gen_seed")}
+    
+    replica_ids = []
+    for replica in range(ensemble.replicas):
+        replica_id = str(uuid.uuid4())
+        os.makedirs(f"projects/{replica_id}", exist_ok=True)
+        await project_repository.create(replica_id, f"{parent['name']} replica {replica + 1}", parent["description"])
+        await project_repository.set_config(replica_id, {
+            **base_config,
+            "gen_seed": base_seed + replica,
+            "prepared": True,
+            "ensemble": {"parent_id": project_id, "replica": replica, "seed": base_seed + replica}
+        })
+        await project_repository.set_status(replica_id, ProjectStatus.QUEUED)
+        replica_ids.append(replica_id)
+    
+    parent_config = {
+        **base_config,
+        "ensemble": {"replica_ids": replica_ids, "mode": ensemble.mode, "base_seed": base_seed}
+    }
+    await project_repository.set_config(project_id, parent_config)
+    await project_repository.set_status(project_id, ProjectStatus.QUEUED)
+    
+    # A -multidir run holds one rank of ntomp cores per replica
+    job_config = dict(parent_config)
+    if ensemble.mode == "multidir":
+        job_config["ntmpi"] = ensemble.replicas
+    job = scheduler.submit(project_id, job_config, run_ensemble)
+    
+    return {
+        "message": "Ensemble queued",
+        "project_id": project_id,
+        "replica_ids": replica_ids,
+        "base_seed": base_seed,
+        "job": scheduler.job_info(job)
+    }
+
+@app.get("/api/projects/{project_id}/ensemble")
+async def get_ensemble(project_id: str):
+    """Per-replica and aggregate status and progress of an ensemble"""
+    parent = await _get_project(project_id)
+    ensemble = (parent.get("config") or {}).get("ensemble") or {}
+    if "replica_ids" not in ensemble:
+        raise HTTPException(status_code=404, detail="Project has no ensemble")
+    
+    replicas = []
+    for replica in await project_repository.get_many(ensemble["replica_ids"]):
+        progress = replica.get("progress") or {}
+        replicas.append({
+            "project_id": replica["id"],
+            "replica": replica["config"]["ensemble"]["replica"],
+            "seed": replica["config"]["ensemble"]["seed"],
+            "status": replica["status"],
+            "progress_percentage": replica["progress_percentage"] or 0.0,
+            "phase": progress.get("phase"),
+            "ns_per_day": progress.get("ns_per_day"),
+            "eta_seconds": progress.get("eta_seconds")
+        })
+    
+    statuses: Dict[str, int] = {}
+    for replica in replicas:
+        statuses[replica["status"]] = statuses.get(replica["status"], 0) + 1
+    rates = [r["ns_per_day"] for r in replicas if r["ns_per_day"] and r["status"] == "running"]
+    etas = [r["eta_seconds"] for r in replicas if r["eta_seconds"] is not None and r["status"] == "running"]
+    
+    return {
+        "project_id": project_id,
+        "mode": ensemble["mode"],
+        "base_seed": ensemble["base_seed"],
+        "preparation_status": parent["status"],
+        "replicas": replicas,
+        "aggregate": {
+            "replicas": len(replicas),
+            "statuses": statuses,
+            "progress_percentage": sum(r["progress_percentage"] for r in replicas) / max(len(replicas), 1),
+            "ns_per_day": sum(rates) if rates else None,
+            "eta_seconds": max(etas) if etas else None,
+            "finished": all(r["status"] in ("completed", "failed", "cancelled") for r in replicas)
+        }
+    }
+
+async def run_ensemble(job: SimulationJob):
+    """Prepare the system once, set up the replicas and run them packed or with -multidir"""
+    project_id = job.project_id
+    project_dir = f"projects/{project_id}"
+    ensemble = job.config["ensemble"]
+    replica_ids = ensemble["replica_ids"]
+    manager.run_started(project_id)
     try:
-        while True:
-            data = await websocket.receive_text()
-            # Echo back for now
-            await manager.send_personal_message(f"Echo: {data}", websocket)
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        config = dict(job.config)
+        config["pinoffset"] = job.pin_offset
+        resume = config.pop("resume", False)
+        await project_repository.set_status(project_id, ProjectStatus.RUNNING)
+        replicas = await project_repository.get_many(replica_ids)
+        
+        # A resumed -multidir ensemble keeps its prepared replicas and their checkpoints
+        if not (resume and all(gromacs_service.is_completed(f"projects/{r['id']}", "prepare") for r in replicas)):
+            await manager.broadcast(f"Preparing ensemble of {len(replica_ids)} replicas", project_id)
+            await gromacs_service.prepare_system(project_dir, config)
+            for replica in replicas:
+                replica_dir = f"projects/{replica['id']}"
+                gromacs_service.reset_run_state(replica_dir)
+                await gromacs_service.prepare_replica(project_dir, replica_dir, replica["config"])
+        
+        if ensemble["mode"] == "packed":
+            # Each replica is its own job; the scheduler packs them onto free cores
+            for replica in replicas:
+                scheduler.submit(replica["id"], replica["config"], run_gromacs_simulation)
+            await project_repository.set_status(project_id, ProjectStatus.COMPLETED)
+            await manager.broadcast(f"Ensemble prepared, {len(replicas)} replicas queued", project_id)
+        else:
+            await _run_multidir(job, project_dir, config, replica_ids)
+            await project_repository.set_status(project_id, ProjectStatus.COMPLETED)
+            await manager.broadcast(f"Ensemble completed for project {project_id}", project_id)
+    
+    except asyncio.CancelledError:
+        await progress_writer.flush()
+        if gromacs_service.detached:
+            raise
+        await project_repository.set_status(project_id, ProjectStatus.CANCELLED)
+        for replica_id in replica_ids:
+            if scheduler.job_for_project(replica_id) is None:
+                await project_repository.set_status(replica_id, ProjectStatus.CANCELLED)
+        raise
+    except Exception as e:
+        await progress_writer.flush()
+        await project_repository.set_status(project_id, ProjectStatus.FAILED)
+        for replica_id in replica_ids:
+            await project_repository.set_status(replica_id, ProjectStatus.FAILED)
+        await manager.broadcast(f"Ensemble failed: {str(e)}", project_id)
+        raise
+    finally:
+        manager.run_finished(project_id)
+
+async def _run_multidir(job: SimulationJob, project_dir: str, config: Dict, replica_ids: List[str]) -> None:
+    """Run all replicas phase by phase, each phase as one mdrun -multidir"""
+    replica_dirs = [f"projects/{replica_id}" for replica_id in replica_ids]
+    for replica_id in replica_ids:
+        await project_repository.set_status(replica_id, ProjectStatus.RUNNING)
+    
+    with open(log_service.log_path(job.project_id), "a") as log_file:
+        for index, phase in enumerate(SIMULATION_PHASES):
+            if all(gromacs_service.is_completed(d, phase) for d in replica_dirs):
+                continue
+            simulation_ids = [str(uuid.uuid4()) for _ in replica_ids]
+            for replica_id, simulation_id in zip(replica_ids, simulation_ids):
+                await project_repository.create_simulation(simulation_id, replica_id, phase, config)
+            started = time.monotonic()
+            telemetry_id = f"{job.project_id}:{phase}"
+            
+            async def on_progress(replica: int, update: Dict):
+                _record_progress(replica_ids[replica], simulation_ids[replica], index, phase, update)
+            
+            def on_process(pid: int):
+                telemetry.register(telemetry_id, job.project_id, pid, len(job.cores))
+            
+            status = ProjectStatus.FAILED
+            try:
+                async for line in gromacs_service.run_multidir_phase(
+                    replica_dirs, phase, config, on_progress, on_process
+                ):
+                    log_file.write(line)
+                    log_file.flush()
+                    await manager.broadcast(line, job.project_id)
+                status = ProjectStatus.COMPLETED
+            except asyncio.CancelledError:
+                status = ProjectStatus.CANCELLED
+                raise
+            finally:
+                summary = telemetry.unregister(telemetry_id)
+                for simulation_id in simulation_ids:
+                    values = {
+                        "status": status,
+                        "completed_at": datetime.now(timezone.utc),
+                        "duration_seconds": time.monotonic() - started
+                    }
+                    if status == ProjectStatus.COMPLETED:
+                        values["progress_percentage"] = 100.0
+                    if summary is not None:
+                        # One process tree serves all replicas; split its usage evenly
+                        values["cpu_usage_percent"] = summary["average_cpu_percent"] / len(replica_ids)
+                        values["memory_usage_mb"] = summary["peak_rss_mb"] / len(replica_ids)
+                    progress_writer.record("simulation", simulation_id, **values)
+                await progress_writer.flush()
+    
+    for replica_id in replica_ids:
+        await progress_writer.finish("project", replica_id, progress_percentage=100.0)
+        await project_repository.set_status(replica_id, ProjectStatus.COMPLETED)
+
+@app.get("/api/nodes")
+async def get_nodes():
+    """Worker nodes with their cores and busy slots, when phases run distributed"""
+    return await asyncio.get_running_loop().run_in_executor(None, distributed.status)
+
+@app.get("/api/projects/{project_id}/telemetry")
+async def get_project_telemetry(project_id: str):
+    """Resource usage of the project's running and recently finished simulations"""
+    await _require_project(project_id)
+    return {
+        "simulations": telemetry.for_project(project_id),
+        "sampler": telemetry.stats(),
+        "streaming": manager.stats()
+    }
+
+@app.get("/api/projects/{project_id}/simulations/{simulation_id}/telemetry")
+async def get_simulation_telemetry(project_id: str, simulation_id: str, since: Optional[float] = None):
+    """CPU, memory and thread series of one simulation; `since` returns only newer samples"""
+    result = telemetry.series(simulation_id, since)
+    if result is None or result["summary"]["project_id"] != project_id:
+        raise HTTPException(status_code=404, detail="No telemetry for this simulation")
+    return result
 
 @app.get("/api/projects/{project_id}/logs")
-async def get_logs(project_id: str):
-    """Get simulation logs"""
-    if project_id not in projects:
-        raise HTTPException(status_code=404, detail="Project not found")
+async def get_logs(
+    project_id: str,
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_BYTES, ge=1, le=16 * 1024 * 1024),
+    tail: Optional[int] = Query(None, ge=0, le=100000),
+    grep: Optional[str] = None,
+    ignore_case: bool = False,
+    regex: bool = False
+):
+    """
+    Get simulation logs by byte range. Poll with `since` set to the previous
+    `next_offset` to receive only new lines; use `tail` for the last N lines
+    and `grep` to filter lines containing a string (a regular expression
+    with `regex`).
+    """
+    await _require_project(project_id)
+    
+    log_file = log_service.log_path(project_id)
+    if not os.path.exists(log_file):
+        return {"logs": "", "offset": 0, "next_offset": 0, "size": 0}
     
-    log_file = f"logs/{project_id}.log"
-    if os.path.exists(log_file):
-        with open(log_file, 'r') as f:
-            return {"logs": f.read()}
-    return {"logs": "No logs available"}
+    if grep is not None:
+        read = partial(log_service.grep, log_file, grep, since, limit, ignore_case=ignore_case, regex=regex)
+    elif tail is not None:
+        read = partial(log_service.tail, log_file, tail)
+    else:
+        read = partial(log_service.read_range, log_file, since, limit)
+    
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, read)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Log batches compress well; clients negotiating permessage-deflate get them compressed
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True)
@@ -0,0 +1,704 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import MDAnalysis as mda
+
+from app.services.cache_service import AnalysisCache, trajectory_fingerprint
+from app.utils.downsample_utils import SeriesPyramid
+from app.utils.gromacs_utils import EnergyFileReader
+
+logger = logging.getLogger(__name__)
+
+# Frames per block handed to analyses; bounds memory to chunk_size * n_atoms * 12 bytes
+DEFAULT_CHUNK_SIZE = int(os.getenv("ANALYSIS_CHUNK_SIZE", "256"))
+
+# Target size of the coordinate blocks handed to the RMS engine; small enough
+# to stay cache-resident for the elementwise passes
+ANALYSIS_BLOCK_BYTES = int(os.getenv("ANALYSIS_BLOCK_BYTES", str(16 * 1024 * 1024)))
+
+# Threads used to process blocks concurrently (NumPy releases the GIL)
+ANALYSIS_THREADS = int(os.getenv("ANALYSIS_THREADS") or 0) or os.cpu_count() or 1
+
+# Downsampling pyramids kept in memory between plot requests
+MAX_PYRAMIDS = 64
+
+# Incremental .edr readers kept in memory between energy requests
+MAX_ENERGY_READERS = 32
+
+# MDAnalysis works in Angstrom, GROMACS (and our API) in nm
+ANGSTROM_TO_NM = 0.1
+
+
+class TrajectoryChunk:
+    """
+    A block of consecutive (strided) trajectory frames.
+
+    `positions` has shape (n_frames, n_atoms, 3) in nm, `boxes` has shape
+    (n_frames, 6) holding box lengths (nm) and angles (degrees).
+    """
+
+    def __init__(self, frames: np.ndarray, times: np.ndarray, positions: np.ndarray, boxes: np.ndarray):
+        self.frames = frames
+        self.times = times
+        self.positions = positions
+        self.boxes = boxes
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.frames)
+
+
+class TrajectoryReader:
+    """
+    Chunked, memory-bounded reader for XTC/TRR trajectories.
+
+    Frames are read lazily and copied into a fixed-size coordinate buffer, so
+    memory use depends on the chunk size and atom selection only, never on
+    trajectory length.
+    """
+
+    SUPPORTED_FORMATS = {".xtc", ".trr"}
+
+    def __init__(self, topology: str, trajectory: str, selection: str = "all"):
+        ext = Path(trajectory).suffix.lower()
+        if ext not in self.SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported trajectory format: {ext}")
+
+        self.topology = str(topology)
+        self.trajectory = str(trajectory)
+        self.selection = selection
+        self.universe = mda.Universe(self.topology, self.trajectory)
+        self.atoms = self.universe.select_atoms(selection)
+
+        if self.atoms.n_atoms == 0:
+            raise ValueError(f"Selection '{selection}' matched no atoms")
+
+    @property
+    def n_atoms(self) -> int:
+        return self.atoms.n_atoms
+
+    @property
+    def n_frames(self) -> int:
+        return self.universe.trajectory.n_frames
+
+    @property
+    def dt(self) -> float:
+        """Time between stored frames in ps"""
+        return self.universe.trajectory.dt
+
+    @property
+    def start_time(self) -> float:
+        """Time of the first frame in ps"""
+        return self.universe.trajectory[0].time
+
+    def frame_range(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        stride: int = 1
+    ) -> range:
+        """Frame indices covering the time window [start_time, end_time] (ps)"""
+        if stride < 1:
+            raise ValueError("stride must be a positive integer")
+
+        t0 = self.start_time
+        first = 0
+        last = self.n_frames - 1
+        if start_time is not None:
+            first = max(first, int(np.ceil((start_time - t0) / self.dt - 1e-6)))
+        if end_time is not None:
+            last = min(last, int(np.floor((end_time - t0) / self.dt + 1e-6)))
+
+        return range(first, max(first, last + 1), stride)
+
+    def iter_chunks(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        stride: int = 1,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        copy: bool = False
+    ) -> Iterator[TrajectoryChunk]:
+        """
+        Yield blocks of up to `chunk_size` frames.
+
+        Blocks are views into a buffer that is reused for the next chunk; pass
+        `copy=True` if the caller keeps them past the next iteration.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+
+        frames = self.frame_range(start_time, end_time, stride)
+        buffer_size = min(chunk_size, len(frames)) or 1
+
+        positions = np.empty((buffer_size, self.n_atoms, 3), dtype=np.float32)
+        boxes = np.zeros((buffer_size, 6), dtype=np.float32)
+        times = np.empty(buffer_size, dtype=np.float64)
+        indices = np.empty(buffer_size, dtype=np.int64)
+
+        n = 0
+        for ts in self.universe.trajectory[frames.start:frames.stop:frames.step]:
+            positions[n] = self.atoms.positions
+            if ts.dimensions is not None:
+                boxes[n] = ts.dimensions
+            times[n] = ts.time
+            indices[n] = ts.frame
+            n += 1
+
+            if n == buffer_size:
+                yield self._make_chunk(indices, times, positions, boxes, n, copy)
+                n = 0
+
+        if n:
+            yield self._make_chunk(indices, times, positions, boxes, n, copy)
+
+    @staticmethod
+    def _make_chunk(
+        indices: np.ndarray,
+        times: np.ndarray,
+        positions: np.ndarray,
+        boxes: np.ndarray,
+        n: int,
+        copy: bool
+    ) -> TrajectoryChunk:
+        block = positions[:n]
+        block *= ANGSTROM_TO_NM
+        box_block = boxes[:n]
+        box_block[:, :3] *= ANGSTROM_TO_NM
+
+        chunk = TrajectoryChunk(indices[:n], times[:n], block, box_block)
+        if copy:
+            chunk = TrajectoryChunk(
+                chunk.frames.copy(), chunk.times.copy(),
+                chunk.positions.copy(), chunk.boxes.copy()
+            )
+        return chunk
+
+
+def superpose_block(
+    positions: np.ndarray,
+    reference: np.ndarray,
+    weights: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Optimally superpose a block of frames onto a reference (Kabsch).
+
+    `positions` (n_frames, n_atoms, 3) is centered in place. `reference`
+    (n_atoms, 3) must already be centered on its (weighted) centroid. Returns
+    the per-atom displacements from the reference after fitting, shape
+    (n_frames, n_atoms, 3), and the RMSD of every frame.
+    """
+    if weights is None:
+        weights = np.ones(reference.shape[0], dtype=np.float32)
+    weights = weights.astype(np.float32)
+    total_weight = float(weights.sum())
+
+    # Center every frame on its weighted centroid in one operation
+    centers = np.matmul(weights, positions) / total_weight
+    positions -= centers[:, None, :]
+
+    # Batched 3x3 covariance matrices and their SVDs
+    covariance = np.matmul(positions.transpose(0, 2, 1), reference * weights[:, None])
+    u, _, vt = np.linalg.svd(covariance.astype(np.float64))
+
+    # Correct improper rotations (reflections)
+    d = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    u[:, :, 2] *= d[:, None]
+    rotations = np.matmul(u, vt).astype(positions.dtype)
+
+    displacements = np.matmul(positions, rotations)
+    displacements -= reference
+
+    squared = np.einsum("fni,fni->fn", displacements, displacements)
+    rmsd = np.sqrt(np.matmul(squared, weights) / total_weight)
+    return displacements, rmsd
+
+
+def block_moments(block: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Frame count, per-atom mean and per-atom sum of squared deviations
+    (summed over x, y and z) of a (n_frames, n_atoms, 3) block. The block is
+    modified in place.
+    """
+    block_mean = block.mean(axis=0, dtype=np.float64)
+    block -= block_mean.astype(block.dtype)
+    block_m2 = np.einsum("fni,fni->n", block, block).astype(np.float64)
+    return block.shape[0], block_mean, block_m2
+
+
+class RunningMoments:
+    """
+    Per-atom running mean and variance, merged block-by-block (Chan et al.)
+    """
+
+    def __init__(self, n_atoms: int):
+        self.count = 0
+        self.mean = np.zeros((n_atoms, 3), dtype=np.float64)
+        # Sum of squared deviations, summed over x, y and z
+        self.m2 = np.zeros(n_atoms, dtype=np.float64)
+
+    def update(self, block: np.ndarray) -> None:
+        """Merge a (n_frames, n_atoms, 3) block; the block is modified in place"""
+        if block.shape[0]:
+            self.merge(*block_moments(block))
+
+    def merge(self, n_block: int, block_mean: np.ndarray, block_m2: np.ndarray) -> None:
+        """Merge the moments of another block of frames"""
+        total = self.count + n_block
+        delta = block_mean - self.mean
+        self.mean += delta * (n_block / total)
+        self.m2 += block_m2 + np.einsum("ni,ni->n", delta, delta) * (self.count * n_block / total)
+        self.count = total
+
+    def rmsf(self) -> np.ndarray:
+        """Root mean square fluctuation of every atom"""
+        if self.count == 0:
+            return np.zeros_like(self.m2)
+        return np.sqrt(self.m2 / self.count)
+
+
+class RMSEngine:
+    """
+    Block-vectorized RMSD / RMSF calculation over a chunked trajectory.
+
+    Every chunk of frames is fitted to the reference with a single batched
+    covariance + SVD, and RMSF is accumulated with running moments, so no
+    Python-level loop runs per frame.
+    """
+
+    def __init__(self, reader: TrajectoryReader, reference_frame: int = 0, mass_weighted: bool = False):
+        self.reader = reader
+        self.weights = None
+        if mass_weighted:
+            self.weights = reader.atoms.masses.astype(np.float32)
+
+        reader.universe.trajectory[reference_frame]
+        reference = reader.atoms.positions.astype(np.float32) * ANGSTROM_TO_NM
+        w = self.weights if self.weights is not None else np.ones(len(reference), dtype=np.float32)
+        self.reference = reference - (w[:, None] * reference).sum(axis=0) / w.sum()
+        self.reference_frame = reference_frame
+
+    def block_size(self, chunk_size: Optional[int] = None) -> int:
+        """Frames per block: ANALYSIS_BLOCK_BYTES worth of coordinates, capped at chunk_size"""
+        frames = max(1, ANALYSIS_BLOCK_BYTES // (self.reader.n_atoms * 3 * 4))
+        return min(frames, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    def _process_block(self, positions: np.ndarray):
+        displacements, rmsd = superpose_block(positions, self.reference, self.weights)
+        return rmsd, block_moments(displacements)
+
+    def run(
+        self,
+        chunk_size: Optional[int] = None,
+        stride: int = 1,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        threads: int = ANALYSIS_THREADS,
+        moments: Optional[RunningMoments] = None
+    ) -> Dict:
+        """
+        Compute RMSD per frame and RMSF per atom. Pass the moments of an
+        earlier run to fold its frames into the RMSF.
+        """
+        started = time.perf_counter()
+        n_frames = len(self.reader.frame_range(start_time, end_time, stride))
+        times = np.empty(n_frames, dtype=np.float64)
+        rmsd = np.empty(n_frames, dtype=np.float64)
+        if moments is None:
+            moments = RunningMoments(self.reader.n_atoms)
+
+        def collect(offset, block_times, future):
+            block_rmsd, block_stats = future.result()
+            times[offset:offset + len(block_times)] = block_times
+            rmsd[offset:offset + len(block_times)] = block_rmsd
+            moments.merge(*block_stats)
+
+        # Blocks are read sequentially and fitted on a thread pool; at most
+        # threads + 1 blocks are in flight, which keeps memory bounded
+        n = 0
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            chunks = self.reader.iter_chunks(
+                self.block_size(chunk_size), stride, start_time, end_time, copy=threads > 1
+            )
+            for chunk in chunks:
+                block_times = chunk.times.copy()
+                pending.append((n, block_times, pool.submit(self._process_block, chunk.positions)))
+                n += chunk.n_frames
+                if threads == 1 or len(pending) > threads:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+
+        elapsed = time.perf_counter() - started
+        atoms = self.reader.atoms
+        return {
+            "selection": self.reader.selection,
+            "reference_frame": self.reference_frame,
+            "mass_weighted": self.weights is not None,
+            "n_frames": n,
+            "n_atoms": self.reader.n_atoms,
+            "time_ps": times[:n],
+            "rmsd_nm": rmsd[:n],
+            "rmsf_nm": moments.rmsf(),
+            "moments": moments,
+            "resids": atoms.resids,
+            "resnames": atoms.resnames,
+            "atom_names": atoms.names,
+            "elapsed_seconds": elapsed,
+            "frames_per_second": n / elapsed if elapsed > 0 else None
+        }
+
+
+class AnalysisService:
+    """
+    Service for running trajectory analyses on simulation output
+    """
+
+    # Preferred topology / trajectory files, in order of preference
+    TOPOLOGY_CANDIDATES = ["md.tpr", "md.gro", "npt.gro", "nvt.gro", "em.gro", "ions.gro", "conf.gro"]
+    TRAJECTORY_CANDIDATES = ["md.xtc", "md.trr"]
+
+    # Output prefixes of the simulation phases (see GromacsService.run_simulation_phase)
+    ENERGY_PREFIXES = ["em", "nvt", "npt", "md"]
+
+    # Energy terms summarised after each phase, by output prefix
+    EQUILIBRATION_TERMS = {
+        "em": ["Potential"],
+        "nvt": ["Temperature", "Potential"],
+        "npt": ["Temperature", "Pressure", "Density"],
+        "md": ["Temperature", "Pressure", "Density", "Potential"]
+    }
+
+    # Largest deviation (K) of the mean temperature from the thermostat target
+    TEMPERATURE_TOLERANCE = 5.0
+
+    # Largest relative density change over the second half of a phase
+    DENSITY_DRIFT_TOLERANCE = 0.01
+
+    def __init__(self, results: Optional[AnalysisCache] = None):
+        # Energy readers are kept between requests so live plots only decode
+        # new frames, least recently used first
+        self._energy_readers: "OrderedDict[str, EnergyFileReader]" = OrderedDict()
+        self._energy_reader_lock = threading.Lock()
+        self.results = results or AnalysisCache()
+        # Pyramids of plotted series, least recently used first
+        self._pyramids: "OrderedDict[str, SeriesPyramid]" = OrderedDict()
+        self._pyramid_lock = threading.Lock()
+
+    def find_inputs(self, project_dir: str) -> Tuple[Path, Path]:
+        """Locate the topology and trajectory files of a project"""
+        project_path = Path(project_dir)
+        topology = self._find_first(project_path, self.TOPOLOGY_CANDIDATES)
+        if topology is None:
+            raise FileNotFoundError("No topology or structure file found in project directory")
+
+        trajectory = self._find_first(project_path, self.TRAJECTORY_CANDIDATES)
+        if trajectory is None:
+            raise FileNotFoundError("No trajectory file found in project directory")
+
+        return topology, trajectory
+
+    def open_trajectory(
+        self,
+        project_dir: str,
+        selection: str = "all",
+        trajectory: Optional[str] = None
+    ) -> TrajectoryReader:
+        """Open a chunked reader on a project's trajectory"""
+        if trajectory:
+            topology = self._find_first(Path(project_dir), self.TOPOLOGY_CANDIDATES)
+            if topology is None:
+                raise FileNotFoundError("No topology or structure file found in project directory")
+            trajectory_path = Path(project_dir) / trajectory
+            if not trajectory_path.exists():
+                raise FileNotFoundError(f"Trajectory {trajectory} not found")
+        else:
+            topology, trajectory_path = self.find_inputs(project_dir)
+
+        logger.info(f"Opening trajectory {trajectory_path} with topology {topology}")
+        return TrajectoryReader(str(topology), str(trajectory_path), selection)
+
+    def compute_rms(
+        self,
+        project_dir: str,
+        selection: str = "backbone",
+        reference_frame: int = 0,
+        mass_weighted: bool = False,
+        chunk_size: Optional[int] = None,
+        stride: int = 1,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None
+    ) -> Dict:
+        """
+        RMSD and RMSF of a selection after fitting to a reference frame.
+
+        Results are cached; while the trajectory grows, only the frames
+        appended since the cached result are read and fitted.
+        """
+        started = time.perf_counter()
+        topology, trajectory = self.find_inputs(project_dir)
+        params = {
+            "selection": selection,
+            "reference_frame": reference_frame,
+            "mass_weighted": mass_weighted,
+            "stride": stride,
+            "start_time": start_time,
+            "end_time": end_time
+        }
+        key = self.results.key("rms", params, topology, trajectory)
+        status, meta, arrays = self.results.lookup("rms", key, trajectory)
+        if status == "hit":
+            return self._cached_rms(key, meta, arrays, status, 0, started)
+
+        # Fingerprint first: frames appended while reading are picked up next time
+        fingerprint = trajectory_fingerprint(trajectory)
+        reader = TrajectoryReader(str(topology), str(trajectory), selection)
+        frames = reader.frame_range(start_time, end_time, stride)
+        if status != "extend" or meta["dt"] != reader.dt or meta["start"] != frames.start:
+            status, arrays = "miss", None
+
+        if status == "extend" and meta["next_frame"] >= frames.stop:
+            # Grown, but past end_time
+            computed = 0
+        else:
+            moments = None
+            first = frames.start
+            if status == "extend":
+                moments = RunningMoments(reader.n_atoms)
+                moments.count = int(arrays["moments_count"])
+                moments.mean = arrays["moments_mean"]
+                moments.m2 = arrays["moments_m2"]
+                first = meta["next_frame"]
+
+            engine = RMSEngine(reader, reference_frame=reference_frame, mass_weighted=mass_weighted)
+            result = engine.run(
+                chunk_size, stride, reader.start_time + first * reader.dt, end_time, moments=moments
+            )
+            computed = result["n_frames"]
+            atoms = reader.atoms
+            previous = arrays or {"time_ps": np.empty(0), "rmsd_nm": np.empty(0)}
+            arrays = {
+                "time_ps": np.concatenate([previous["time_ps"], result["time_ps"]]),
+                "rmsd_nm": np.concatenate([previous["rmsd_nm"], result["rmsd_nm"]]),
+                "rmsf_nm": result["rmsf_nm"],
+                "moments_count": np.array(result["moments"].count),
+                "moments_mean": result["moments"].mean,
+                "moments_m2": result["moments"].m2,
+                "resids": atoms.resids,
+                "resnames": atoms.resnames.astype(str),
+                "atom_names": atoms.names.astype(str)
+            }
+            meta = {
+                **params,
+                "n_atoms": reader.n_atoms,
+                "dt": reader.dt,
+                "start": frames.start,
+                "next_frame": first + computed * stride
+            }
+
+        meta["trajectory"] = fingerprint
+        self.results.store("rms", key, meta, arrays)
+        result = self._cached_rms(key, meta, arrays, status, computed, started)
+        logger.info(
+            f"RMS analysis of {result['n_frames']} frames x {result['n_atoms']} atoms "
+            f"({status}, {computed} frames computed) in {result['elapsed_seconds']:.2f} s"
+        )
+        return result
+
+    @staticmethod
+    def _cached_rms(
+        key: str,
+        meta: Dict,
+        arrays: Dict[str, np.ndarray],
+        status: str,
+        computed: int,
+        started: float
+    ) -> Dict:
+        """compute_rms result from cached arrays"""
+        elapsed = time.perf_counter() - started
+        return {
+            "key": key,
+            "selection": meta["selection"],
+            "reference_frame": meta["reference_frame"],
+            "mass_weighted": meta["mass_weighted"],
+            "n_frames": len(arrays["time_ps"]),
+            "n_atoms": meta["n_atoms"],
+            "time_ps": arrays["time_ps"],
+            "rmsd_nm": arrays["rmsd_nm"],
+            "rmsf_nm": arrays["rmsf_nm"],
+            "resids": arrays["resids"],
+            "resnames": arrays["resnames"],
+            "atom_names": arrays["atom_names"],
+            "cache": status,
+            "frames_computed": computed,
+            "elapsed_seconds": elapsed,
+            "frames_per_second": computed / elapsed if computed and elapsed > 0 else None
+        }
+
+    def check_equilibration(self, project_dir: str, prefix: str, temperature: Optional[float] = None) -> Dict:
+        """
+        Mean, fluctuation and drift of the key energy terms over the second
+        half of a phase, and whether the phase looks equilibrated: negative
+        potential after minimization, mean temperature near the target and
+        no density drift under pressure coupling
+        """
+        columns = self.get_energies(project_dir, prefix=prefix)["columns"]
+        time_ps = columns["time"]
+        report = {"prefix": prefix, "n_frames": len(time_ps), "terms": {}, "checks": {}, "passed": None}
+        if len(time_ps) < 2:
+            return report
+
+        second_half = time_ps >= (time_ps[0] + time_ps[-1]) / 2
+        t = time_ps[second_half]
+        for term in self.EQUILIBRATION_TERMS[prefix]:
+            if term not in columns:
+                continue
+            values = columns[term]
+            tail = values[second_half]
+            slope = np.polyfit(t, tail, 1)[0] if len(tail) > 1 and np.ptp(t) > 0 else 0.0
+            report["terms"][term] = {
+                "final": float(values[-1]),
+                "mean": float(tail.mean()),
+                "std": float(tail.std()),
+                "drift_per_ns": float(slope * 1000)
+            }
+
+        terms = report["terms"]
+        checks = report["checks"]
+        if prefix == "em" and "Potential" in terms:
+            checks["negative_potential"] = terms["Potential"]["final"] < 0
+        if prefix != "em" and "Temperature" in terms and temperature is not None:
+            checks["temperature"] = abs(terms["Temperature"]["mean"] - temperature) <= self.TEMPERATURE_TOLERANCE
+        if "Density" in terms and terms["Density"]["mean"]:
+            change = abs(terms["Density"]["drift_per_ns"] * np.ptp(t) / 1000) / terms["Density"]["mean"]
+            checks["density_stable"] = bool(change <= self.DENSITY_DRIFT_TOLERANCE)
+        if checks:
+            report["passed"] = all(checks.values())
+        return report
+
+    @staticmethod
+    def rms_to_dict(result: Dict) -> Dict:
+        """JSON form of a compute_rms result"""
+        return {
+            "selection": result["selection"],
+            "reference_frame": result["reference_frame"],
+            "mass_weighted": result["mass_weighted"],
+            "n_frames": result["n_frames"],
+            "n_atoms": result["n_atoms"],
+            "rmsd": {
+                "time_ps": result["time_ps"].tolist(),
+                "rmsd_nm": result["rmsd_nm"].tolist()
+            },
+            "rmsf": {
+                "resids": result["resids"].tolist(),
+                "resnames": result["resnames"].tolist(),
+                "atom_names": result["atom_names"].tolist(),
+                "rmsf_nm": result["rmsf_nm"].tolist()
+            },
+            "performance": {
+                "elapsed_seconds": round(result["elapsed_seconds"], 3),
+                "frames_per_second": result["frames_per_second"],
+                "cache": result.get("cache"),
+                "frames_computed": result.get("frames_computed", result["n_frames"])
+            }
+        }
+
+    @staticmethod
+    def _find_first(project_path: Path, candidates) -> Optional[Path]:
+        for name in candidates:
+            if (project_path / name).exists():
+                return project_path / name
+        return None
+
+    def get_energies(
+        self,
+        project_dir: str,
+        prefix: str = "md",
+        terms: Optional[List[str]] = None,
+        since: int = 0
+    ) -> Dict:
+        """Energy terms of a phase from frame index `since` on, read incrementally from its .edr file"""
+        if prefix not in self.ENERGY_PREFIXES:
+            raise ValueError(f"Unknown energy file prefix: {prefix}")
+
+        edr_path = Path(project_dir) / f"{prefix}.edr"
+        if not edr_path.exists():
+            raise FileNotFoundError(f"Energy file {prefix}.edr not found")
+
+        key = str(edr_path.resolve())
+        with self._energy_reader_lock:
+            reader = self._energy_readers.get(key)
+            if reader is None:
+                reader = self._energy_readers[key] = EnergyFileReader(str(edr_path))
+            self._energy_readers.move_to_end(key)
+            while len(self._energy_readers) > MAX_ENERGY_READERS:
+                self._energy_readers.popitem(last=False)
+
+        # Decoding takes the reader's own lock, so other files are not held up
+        reader.update()
+        return {
+            "terms": [{"name": name, "unit": unit} for name, unit in reader.terms],
+            "n_frames": reader.n_frames,
+            "columns": reader.columns(terms, since)
+        }
+
+    def get_energy_series(
+        self,
+        project_dir: str,
+        prefix: str = "md",
+        terms: Optional[List[str]] = None,
+        points: int = 1000,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        method: str = "minmax"
+    ) -> Dict:
+        """Energy terms of a phase over a time window (ps), each downsampled to at most `points` samples"""
+        energies = self.get_energies(project_dir, prefix=prefix, terms=terms)
+        columns = energies["columns"]
+        times = columns.pop("time")
+        columns.pop("step")
+        edr_key = str((Path(project_dir) / f"{prefix}.edr").resolve())
+        return {
+            "terms": energies["terms"],
+            "n_frames": energies["n_frames"],
+            "series": {
+                term: self.downsample(f"{edr_key}:{term}", times, values, points, start_time, end_time, method)
+                for term, values in columns.items()
+            }
+        }
+
+    def downsample(
+        self,
+        key: Optional[str],
+        times: np.ndarray,
+        values: np.ndarray,
+        points: int,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        method: str = "minmax"
+    ) -> Dict:
+        """
+        At most `points` samples of a series over a time window (see
+        SeriesPyramid.query). The series' pyramid is kept under `key` and
+        extended as the series grows, so zooming and live refreshes only
+        touch the visible samples and the new ones.
+        """
+        with self._pyramid_lock:
+            pyramid = self._pyramids.get(key) if key else None
+            if pyramid is None or not pyramid.extends(times, values):
+                pyramid = SeriesPyramid()
+            pyramid.extend(times[pyramid.n:], values[pyramid.n:])
+            if key:
+                self._pyramids[key] = pyramid
+                self._pyramids.move_to_end(key)
+                while len(self._pyramids) > MAX_PYRAMIDS:
+                    self._pyramids.popitem(last=False)
+            return pyramid.query(points, start_time, end_time, method)
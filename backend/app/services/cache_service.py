@@ -0,0 +1,345 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.storage_service import clone_file
+from app.utils.file_utils import Structure, read_structure
+
+logger = logging.getLogger(__name__)
+
+# Shared across projects so identical inputs are prepared once
+STAGE_CACHE_DIR = os.getenv("STAGE_CACHE_DIR", os.path.join("projects", ".stage_cache"))
+
+MANIFEST = "manifest.json"
+
+# Parsed structure files (.npz), keyed by the checksum of the file contents
+STRUCTURE_CACHE_DIR = os.getenv("STRUCTURE_CACHE_DIR", os.path.join("projects", ".structure_cache"))
+
+# Bumped when the layout of Structure changes, so old parses are not loaded
+STRUCTURE_FORMAT = 1
+
+# Trajectory analysis results (.npz), evicted least recently used beyond ANALYSIS_CACHE_BYTES
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", os.path.join("projects", ".analysis_cache"))
+ANALYSIS_CACHE_BYTES = int(os.getenv("ANALYSIS_CACHE_BYTES", str(512 * 1024 * 1024)))
+
+# Bumped when the arrays stored for an analysis change
+ANALYSIS_FORMAT = 1
+
+# Bytes hashed at the start and at the end of the part of a trajectory a result covers
+FINGERPRINT_SAMPLE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_dir(path: Path) -> Dict[str, Tuple[int, int]]:
+    """(mtime, size) of the regular files in a directory, used to spot stage outputs"""
+    snapshot = {}
+    for entry in os.scandir(path):
+        if entry.is_file() and not entry.name.startswith(("#", ".")):
+            stat = entry.stat()
+            snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+class StageCache:
+    """
+    Memoizes system-preparation stages (pdb2gmx, editconf/solvate, genion).
+
+    A stage's key hashes its name, its parameters, the contents of its
+    input files and the key of the stage before it, so changing anything
+    upstream invalidates every stage downstream. The files a stage writes
+    are stored under the key and restored on a hit, in any project.
+    """
+
+    def __init__(self, root: str = STAGE_CACHE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def key(
+        self,
+        stage: str,
+        params: Dict,
+        input_files: List[Path],
+        upstream_key: Optional[str] = None
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps({
+            "stage": stage,
+            "params": params,
+            "upstream": upstream_key
+        }, sort_keys=True).encode())
+        for path in input_files:
+            digest.update(path.name.encode())
+            digest.update(file_digest(path).encode())
+        return digest.hexdigest()
+
+    def _entry(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    def lookup(self, stage: str, key: str) -> Optional[Dict]:
+        manifest = self._entry(stage, key) / MANIFEST
+        if not manifest.exists():
+            return None
+        with open(manifest) as f:
+            return json.load(f)
+
+    def restore(self, stage: str, key: str, project_path: Path) -> Optional[Dict[str, str]]:
+        """Copy a cached stage's outputs into a project; returns the stage result or None on a miss"""
+        manifest = self.lookup(stage, key)
+        if manifest is None:
+            self.misses += 1
+            return None
+
+        entry = self._entry(stage, key)
+        for name in manifest["files"]:
+            clone_file(str(entry / name), str(project_path / name))
+
+        self.hits += 1
+        logger.info(f"Stage cache hit for {stage} ({key[:12]})")
+        return {label: str(project_path / name) for label, name in manifest["result"].items()}
+
+    def store(
+        self,
+        stage: str,
+        key: str,
+        project_path: Path,
+        before: Dict[str, Tuple[int, int]],
+        result: Dict[str, str]
+    ) -> None:
+        """Save the files a stage created or modified, judged against a snapshot taken before it ran"""
+        after = snapshot_dir(project_path)
+        outputs = sorted(name for name, stat in after.items() if before.get(name) != stat)
+
+        entry = self._entry(stage, key)
+        if entry.exists():
+            return
+
+        # Assemble in a temporary directory and rename, so concurrent
+        # preparations of the same system never see a partial entry
+        tmp = entry.parent / f".{key}.{os.getpid()}.tmp"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        for name in outputs:
+            clone_file(str(project_path / name), str(tmp / name))
+
+        with open(tmp / MANIFEST, "w") as f:
+            json.dump({
+                "stage": stage,
+                "files": outputs,
+                "result": {label: Path(path).name for label, path in result.items()}
+            }, f)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another preparation stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        entries = {}
+        size = 0
+        if self.root.exists():
+            for stage_dir in self.root.iterdir():
+                if not stage_dir.is_dir():
+                    continue
+                keys = [d for d in stage_dir.iterdir() if (d / MANIFEST).exists()]
+                entries[stage_dir.name] = len(keys)
+                size += sum(f.stat().st_size for d in keys for f in d.iterdir())
+
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "size_bytes": size}
+
+
+class StructureCache:
+    """
+    Parsed PDB/GRO files, stored as compressed .npz under the checksum of
+    their contents. Every project uploading the same file, and every
+    consumer (validation, viewer, index groups, box sizing), shares one
+    parse.
+    """
+
+    def __init__(self, root: str = STRUCTURE_CACHE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, checksum: str) -> Path:
+        return self.root / checksum[:2] / f"{checksum}.v{STRUCTURE_FORMAT}.npz"
+
+    def load(self, path: str, checksum: Optional[str] = None) -> Structure:
+        """Structure of a file, parsed at most once per distinct contents"""
+        checksum = checksum or file_digest(Path(path))
+        entry = self._entry(checksum)
+        if entry.exists():
+            try:
+                structure = Structure.load(str(entry))
+                self.hits += 1
+                return structure
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Discarding unreadable structure cache entry {entry.name}: {e}")
+
+        self.misses += 1
+        structure = read_structure(Path(path))
+        entry.parent.mkdir(exist_ok=True)
+        tmp = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+        structure.save(str(tmp))
+        os.replace(tmp, entry)
+        return structure
+
+    def stats(self) -> Dict:
+        entries = list(self.root.glob("*/*.npz"))
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size_bytes": sum(entry.stat().st_size for entry in entries)
+        }
+
+
+def trajectory_fingerprint(path: Path, size: Optional[int] = None) -> Dict:
+    """
+    Size, mtime and digests of the first and last FINGERPRINT_SAMPLE bytes
+    of the first `size` bytes (default: all) of a trajectory. Trajectories
+    only grow by appending, so a matching fingerprint at an earlier size
+    means the frames read then are still there.
+    """
+    stat = path.stat()
+    size = stat.st_size if size is None else size
+    with open(path, "rb") as f:
+        head = hashlib.sha256(f.read(min(size, FINGERPRINT_SAMPLE))).hexdigest()
+        f.seek(max(0, size - FINGERPRINT_SAMPLE))
+        tail = hashlib.sha256(f.read(min(size, FINGERPRINT_SAMPLE))).hexdigest()
+    return {"size": size, "mtime_ns": stat.st_mtime_ns, "head": head, "tail": tail}
+
+
+class AnalysisCache:
+    """
+    Trajectory analysis results, stored as columnar arrays (.npz) under a
+    key of the analysis, its parameters and the trajectory and topology
+    files. Each entry records the fingerprint of the trajectory it covers:
+    an unchanged trajectory is a hit, a trajectory that has grown since
+    (a running simulation) is extended from where the entry ends. Entries
+    are evicted least recently used once the cache outgrows `max_bytes`.
+    """
+
+    def __init__(self, root: str = ANALYSIS_CACHE_DIR, max_bytes: int = ANALYSIS_CACHE_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.extensions = 0
+        self.misses = 0
+
+    def key(self, analysis: str, params: Dict, topology: Path, trajectory: Path) -> str:
+        stat = topology.stat()
+        return hashlib.sha256(json.dumps({
+            "analysis": analysis,
+            "params": params,
+            "trajectory": str(trajectory.resolve()),
+            "topology": [str(topology.resolve()), stat.st_size, stat.st_mtime_ns]
+        }, sort_keys=True).encode()).hexdigest()
+
+    def _entry(self, analysis: str, key: str) -> Path:
+        return self.root / analysis / f"{key}.v{ANALYSIS_FORMAT}.npz"
+
+    def lookup(
+        self,
+        analysis: str,
+        key: str,
+        trajectory: Path
+    ) -> Tuple[str, Optional[Dict], Optional[Dict[str, np.ndarray]]]:
+        """
+        ("hit", meta, arrays) if the trajectory is unchanged since the entry
+        was stored, ("extend", meta, arrays) if it has grown by appending
+        and ("miss", None, None) otherwise
+        """
+        entry = self._entry(analysis, key)
+        try:
+            with np.load(entry, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                arrays = {name: data[name] for name in data.files if name != "meta"}
+        except FileNotFoundError:
+            self.misses += 1
+            return "miss", None, None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable analysis cache entry {entry.name}: {e}")
+            self.misses += 1
+            return "miss", None, None
+
+        # Loading counts as use; eviction goes by mtime
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+        covered = meta["trajectory"]
+        stat = trajectory.stat()
+        if stat.st_size == covered["size"] and stat.st_mtime_ns == covered["mtime_ns"]:
+            self.hits += 1
+            return "hit", meta, arrays
+        if stat.st_size >= covered["size"]:
+            current = trajectory_fingerprint(trajectory, covered["size"])
+            if current["head"] == covered["head"] and current["tail"] == covered["tail"]:
+                self.extensions += 1
+                return "extend", meta, arrays
+
+        self.misses += 1
+        return "miss", None, None
+
+    def store(self, analysis: str, key: str, meta: Dict, arrays: Dict[str, np.ndarray]) -> None:
+        """Save a result; `meta` must hold the "trajectory" fingerprint it covers"""
+        entry = self._entry(analysis, key)
+        entry.parent.mkdir(exist_ok=True)
+        tmp = entry.with_name(f".{entry.name}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, entry)
+        self._evict()
+
+    def _entries(self) -> List[Tuple[Path, os.stat_result]]:
+        entries = []
+        for path in self.root.glob(f"*/*.v{ANALYSIS_FORMAT}.npz"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                pass  # evicted by another process
+        return entries
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime_ns)
+        size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+            logger.info(f"Evicted analysis cache entry {path.parent.name}/{path.name[:12]}")
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "extensions": self.extensions,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size_bytes": sum(stat.st_size for _, stat in entries),
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+from functools import partial
+from pathlib import Path
+from typing import AsyncGenerator, Dict, List, Optional
+
+import redis
+
+from app.services.gromacs_service import follow_output
+from app.utils.gromacs_utils import MdrunProgressParser
+
+logger = logging.getLogger(__name__)
+
+# Run simulation phases and heavy analyses on Celery workers instead of in the API process
+DISTRIBUTED_EXECUTION = os.getenv("DISTRIBUTED_EXECUTION", "false").lower() == "true"
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", REDIS_URL)
+
+# Run tasks inside the API process (testing on one machine without a broker)
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() == "true"
+
+# Seconds between worker heartbeats; a node missing three is no longer routed to
+NODE_HEARTBEAT_INTERVAL = float(os.getenv("NODE_HEARTBEAT_INTERVAL", "10"))
+
+# Seconds a phase task may stay unacknowledged before Redis delivers it again.
+# Phases are acknowledged when they finish, so this must exceed the longest phase
+CELERY_VISIBILITY_TIMEOUT = float(os.getenv("CELERY_VISIBILITY_TIMEOUT", str(7 * 86400)))
+
+# Seconds between checks whether a dispatched task has finished
+TASK_POLL_INTERVAL = 1.0
+
+# Heavy analyses go to whichever worker is free; phases to the queue of one node
+ANALYSIS_QUEUE = "analysis"
+
+RUN_PHASE_TASK = "gromacs.run_phase"
+RMS_TASK = "gromacs.analysis.rms"
+
+
+def node_queue(name: str) -> str:
+    return f"node.{name}"
+
+
+def phase_stream_path(project_dir: Path, phase: str) -> Path:
+    """File a worker appends the output of a phase to; projects are on shared storage"""
+    return Path(project_dir) / f".{phase}.stream"
+
+
+def phase_task_path(project_dir: Path, phase: str) -> Path:
+    """Id of the task running a phase, so a restarted API follows it instead of sending another"""
+    return Path(project_dir) / f".{phase}.task"
+
+
+class NodeRegistry:
+    """
+    Capabilities and load of the worker nodes.
+
+    Each worker publishes its cores and phase slots under a key that
+    expires after three missed heartbeats. Busy slots are a separate
+    counter the tasks themselves increment and decrement, so the load is
+    exact between heartbeats. Without a Redis URL (eager mode) the registry
+    lives in process memory.
+    """
+
+    PREFIX = "gromacs:node:"
+
+    def __init__(self, url: Optional[str] = None):
+        self.redis = redis.Redis.from_url(url, decode_responses=True) if url else None
+        self._nodes: Dict[str, Dict] = {}
+        self._busy: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, node: Dict, ttl: Optional[float] = None) -> None:
+        node = {**node, "updated": time.time()}
+        if self.redis is None:
+            with self._lock:
+                self._nodes[node["name"]] = node
+            return
+        self.redis.set(self.PREFIX + node["name"], json.dumps(node), ex=int(ttl) if ttl else None)
+
+    def remove(self, name: str) -> None:
+        if self.redis is None:
+            with self._lock:
+                self._nodes.pop(name, None)
+                self._busy.pop(name, None)
+            return
+        self.redis.delete(self.PREFIX + name, self.PREFIX + name + ":busy")
+
+    def adjust_busy(self, name: str, delta: int) -> None:
+        if self.redis is None:
+            with self._lock:
+                self._busy[name] = max(0, self._busy.get(name, 0) + delta)
+            return
+        self.redis.incrby(self.PREFIX + name + ":busy", delta)
+
+    def nodes(self) -> List[Dict]:
+        """Live nodes with their busy slot counts"""
+        if self.redis is None:
+            with self._lock:
+                return [{**node, "busy": self._busy.get(name, 0)} for name, node in self._nodes.items()]
+
+        keys = [key for key in self.redis.scan_iter(self.PREFIX + "*") if not key.endswith(":busy")]
+        if not keys:
+            return []
+        values = self.redis.mget(keys)
+        busy = self.redis.mget([key + ":busy" for key in keys])
+        return [
+            {**json.loads(value), "busy": max(0, int(count or 0))}
+            for value, count in zip(values, busy) if value is not None
+        ]
+
+
+class DistributedExecutor:
+    """
+    Sends simulation phases and heavy analyses to Celery workers.
+
+    A phase goes to the queue of a single node, chosen by advertised cores
+    and free slots. Projects live on storage shared by all nodes, so the
+    worker appends the phase output to a stream file in the project, which
+    is followed and parsed for progress here exactly like a local mdrun.
+    """
+
+    def __init__(self, celery, registry: NodeRegistry, enabled: bool = DISTRIBUTED_EXECUTION):
+        self.celery = celery
+        self.registry = registry
+        self.enabled = enabled
+        # Phases sent to a node whose workers may not have picked them up yet
+        self.inflight: Dict[str, int] = {}
+        self.dispatched = 0
+
+    def select_node(self, cores: int) -> Optional[Dict]:
+        """
+        Node for a phase needing `cores`: the one with most free slots among
+        nodes with enough cores. When all are busy the task still goes to the
+        best node and waits in its queue.
+        """
+        nodes = self.registry.nodes()
+        fitting = [n for n in nodes if n["cores"] >= cores] or nodes
+        if not fitting:
+            return None
+
+        def free_slots(node: Dict) -> int:
+            return node["slots"] - max(node["busy"], self.inflight.get(node["name"], 0))
+
+        return max(fitting, key=lambda n: (free_slots(n), n["cores"]))
+
+    async def _wait(self, submitted: asyncio.Future):
+        """The task's AsyncResult, once the task has finished"""
+        loop = asyncio.get_running_loop()
+        result = await submitted
+        while not await loop.run_in_executor(None, result.ready):
+            await asyncio.sleep(TASK_POLL_INTERVAL)
+        return result
+
+    async def run_phase(
+        self,
+        project_path: str,
+        phase: str,
+        config: Dict,
+        progress_callback=None,
+        process_callback=None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Run a phase on a worker node; same interface as
+        GromacsService.run_simulation_phase. mdrun runs on another host, so
+        `process_callback` is not called and the phase is not sampled by
+        the local telemetry.
+        """
+        project_dir = Path(project_path)
+        loop = asyncio.get_running_loop()
+        stream = phase_stream_path(project_dir, phase)
+        task_file = phase_task_path(project_dir, phase)
+        task = self.celery.tasks[RUN_PHASE_TASK]
+        node_name = None
+
+        # A task sent before an API restart may still be queued or running
+        previous = self.celery.AsyncResult(task_file.read_text().strip()) if task_file.exists() else None
+        previous_state = await loop.run_in_executor(None, lambda: previous.state) if previous else None
+        if previous_state == "PENDING":
+            # Celery also reports ids it does not know (results past result_expires,
+            # messages lost by the broker) as PENDING; started tasks are STARTED.
+            # Revoke the task in case it is still queued and send the phase again;
+            # should both run, the second refuses to start over the first's mdrun
+            await loop.run_in_executor(None, previous.revoke)
+            yield f"{phase} task {previous.id} sent before restart is unknown or not started, sending it again\n"
+        if previous_state is not None and previous_state not in ("PENDING", "FAILURE", "REVOKED"):
+            yield f"Following {phase} task {previous.id} sent before restart\n"
+            submitted = loop.create_future()
+            submitted.set_result(previous)
+            offset = stream.stat().st_size if stream.exists() else 0
+        else:
+            cores = int(config.get("ntomp") or 1) * int(config.get("ntmpi") or 1)
+            node = self.select_node(cores)
+            if node is None:
+                raise RuntimeError("No worker nodes available")
+            node_name = node["name"]
+            self.inflight[node_name] = self.inflight.get(node_name, 0) + 1
+            self.dispatched += 1
+
+            stream.write_bytes(b"")
+            offset = 0
+            # Core pinning is node-local; the worker's mdrun chooses its own cores
+            remote_config = {k: v for k, v in config.items() if k != "pinoffset"}
+            yield f"Sending {phase} to node {node_name}\n"
+            # Eager tasks run inside apply_async, so keep it off the event loop
+            submitted = loop.run_in_executor(None, partial(
+                task.apply_async, (str(project_dir), phase, remote_config), queue=node["queue"]
+            ))
+
+            def remember(future: asyncio.Future) -> None:
+                if not future.cancelled() and future.exception() is None:
+                    task_file.write_text(future.result().id)
+
+            submitted.add_done_callback(remember)
+
+        waiter = asyncio.create_task(self._wait(submitted))
+        parser = MdrunProgressParser.from_mdp(project_dir / f"{phase}.mdp")
+        try:
+            async for line in follow_output(stream, offset, lambda: not waiter.done()):
+                yield line
+                if progress_callback:
+                    update = parser.parse(line)
+                    if update is not None:
+                        await progress_callback(update)
+            result = await waiter
+            outcome = await loop.run_in_executor(None, partial(result.get, propagate=True))
+        except asyncio.CancelledError:
+            waiter.cancel()
+            if submitted.done() and not submitted.exception():
+                # The worker turns TERM into a cancelled phase, which checkpoints mdrun
+                await loop.run_in_executor(None, partial(
+                    submitted.result().revoke, terminate=True, signal="SIGTERM"
+                ))
+            raise
+        finally:
+            if node_name is not None:
+                self.inflight[node_name] -= 1
+
+        if task_file.exists():
+            task_file.unlink()
+        if progress_callback and outcome.get("progress"):
+            await progress_callback(outcome["progress"])
+        yield f"{phase} finished on node {outcome['node']}\n"
+
+    async def run_analysis(self, name: str, project_dir: str, **params) -> Dict:
+        """Run an analysis task on any free worker and return its result"""
+        loop = asyncio.get_running_loop()
+        submitted = loop.run_in_executor(None, partial(
+            self.celery.tasks[name].apply_async, (project_dir,), params, queue=ANALYSIS_QUEUE
+        ))
+        result = await self._wait(submitted)
+        return await loop.run_in_executor(None, partial(result.get, propagate=True))
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "eager": CELERY_TASK_ALWAYS_EAGER,
+            "nodes": self.registry.nodes() if self.enabled else [],
+            "inflight": {name: count for name, count in self.inflight.items() if count},
+            "dispatched": self.dispatched
+        }
@@ -0,0 +1,311 @@
+import os
+import asyncio
+import hashlib
+import json
+import math
+import uuid
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import aiofiles
+from fastapi import UploadFile
+
+from app.services.storage_service import temp_path
+
+logger = logging.getLogger(__name__)
+
+# Read/write size for streamed single-request uploads
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Default chunk size of resumable upload sessions
+SESSION_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Directory (inside the project) holding partially uploaded files
+PARTIAL_UPLOAD_DIR = ".uploads"
+
+
+def new_checksum():
+    """Hash used for ProjectFile.checksum"""
+    return hashlib.sha256()
+
+
+async def _hash_update(hasher, data: bytes) -> None:
+    # hashlib releases the GIL for large buffers, so hash off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, hasher.update, data)
+
+
+class UploadSession:
+    """
+    A chunked upload of one file. Chunks may arrive in any order and in
+    parallel; each is written straight to its offset in a preallocated
+    part file. The session itself is saved next to the part file, so an
+    upload can be resumed after a backend restart.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        project_dir: str,
+        filename: str,
+        size: int,
+        chunk_size: int,
+        session_id: Optional[str] = None
+    ):
+        self.id = session_id or str(uuid.uuid4())
+        self.project_id = project_id
+        self.filename = filename
+        self.size = size
+        self.chunk_size = chunk_size
+        self.total_chunks = math.ceil(size / chunk_size)
+        self.final_path = os.path.join(project_dir, filename)
+        self.part_path = os.path.join(project_dir, PARTIAL_UPLOAD_DIR, f"{self.id}.part")
+        self.state_path = os.path.join(project_dir, PARTIAL_UPLOAD_DIR, f"{self.id}.json")
+        self.created_at = datetime.now()
+        self.received: Set[int] = set()
+
+        # Chunks are hashed in order as soon as the contiguous prefix grows,
+        # so the checksum is ready when the last chunk lands. A hash state
+        # cannot be saved: after a restart the prefix is hashed again.
+        self._hasher = new_checksum()
+        self._next_to_hash = 0
+        self._hash_lock = asyncio.Lock()
+        self._save_lock = asyncio.Lock()
+
+    @classmethod
+    def load(cls, state_path: str) -> "UploadSession":
+        """Session saved at `state_path` by `state()`"""
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        project_dir = os.path.dirname(os.path.dirname(state_path))
+        session = cls(
+            state["project_id"], project_dir, state["filename"], state["size"],
+            state["chunk_size"], session_id=state["session_id"]
+        )
+        session.created_at = datetime.fromisoformat(state["created_at"])
+        session.received = {i for i in state["received"] if 0 <= i < session.total_chunks}
+        return session
+
+    def state(self) -> Dict:
+        return {
+            "session_id": self.id,
+            "project_id": self.project_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "created_at": self.created_at.isoformat(),
+            "received": sorted(self.received)
+        }
+
+    def chunk_length(self, index: int) -> int:
+        if index == self.total_chunks - 1:
+            return self.size - index * self.chunk_size
+        return self.chunk_size
+
+    @property
+    def missing_chunks(self):
+        return [i for i in range(self.total_chunks) if i not in self.received]
+
+    def to_dict(self) -> Dict:
+        return {
+            "session_id": self.id,
+            "project_id": self.project_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "received_chunks": len(self.received),
+            "missing_chunks": self.missing_chunks,
+            "created_at": self.created_at.isoformat()
+        }
+
+
+class FileService:
+    """
+    Service for storing uploaded project files without blocking the event loop
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, UploadSession] = {}
+
+    def load_sessions(self, projects_dir: str) -> List[UploadSession]:
+        """
+        Reload the upload sessions saved in the projects' partial upload
+        directories, e.g. on startup. Part files without a readable session
+        can no longer be resumed and are removed.
+        """
+        loaded = []
+        for project in os.scandir(projects_dir) if os.path.isdir(projects_dir) else ():
+            uploads_dir = os.path.join(project.path, PARTIAL_UPLOAD_DIR)
+            if not project.is_dir() or not os.path.isdir(uploads_dir):
+                continue
+            sessions = {}
+            for entry in os.scandir(uploads_dir):
+                if not entry.name.endswith(".json") or entry.name.startswith("."):
+                    continue
+                try:
+                    session = UploadSession.load(entry.path)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Discarding unreadable upload session {entry.path}: {e}")
+                    continue
+                if os.path.exists(session.part_path):
+                    sessions[session.id] = session
+            for entry in os.scandir(uploads_dir):
+                name, _ = os.path.splitext(entry.name)
+                if entry.is_file() and name not in sessions:
+                    os.remove(entry.path)
+            self.sessions.update(sessions)
+            loaded.extend(sessions.values())
+        if loaded:
+            logger.info(f"Reloaded {len(loaded)} upload sessions")
+        return loaded
+
+    async def _save_session(self, session: UploadSession) -> None:
+        """Replace the saved state of a session with its current one"""
+        async with session._save_lock:
+            data = json.dumps(session.state())
+            tmp_path = temp_path(session.state_path)
+            async with aiofiles.open(tmp_path, "w") as f:
+                await f.write(data)
+            os.replace(tmp_path, session.state_path)
+
+    async def save_upload(self, upload: UploadFile, file_path: str) -> Tuple[int, str]:
+        """
+        Stream an uploaded file to disk in chunks, hashing as it goes.
+        Returns the size and checksum.
+
+        The data goes to a temporary file renamed over `file_path` at the
+        end: an existing file there may share its inode with a stored blob
+        (and other projects), so it must never be opened for writing.
+        """
+        hasher = new_checksum()
+        size = 0
+        tmp_path = temp_path(file_path)
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while True:
+                    data = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not data:
+                        break
+                    await out.write(data)
+                    await _hash_update(hasher, data)
+                    size += len(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return size, hasher.hexdigest()
+
+    async def create_session(
+        self,
+        project_id: str,
+        project_dir: str,
+        filename: str,
+        size: int,
+        chunk_size: Optional[int] = None
+    ) -> UploadSession:
+        """Start a resumable upload and preallocate its part file"""
+        session = UploadSession(project_id, project_dir, filename, size, chunk_size or SESSION_CHUNK_SIZE)
+        os.makedirs(os.path.dirname(session.part_path), exist_ok=True)
+        async with aiofiles.open(session.part_path, "wb") as f:
+            await f.truncate(size)
+        await self._save_session(session)
+
+        self.sessions[session.id] = session
+        logger.info(
+            f"Upload session {session.id} for {filename} "
+            f"({size} bytes in {session.total_chunks} chunks)"
+        )
+        return session
+
+    def get_session(self, project_id: str, session_id: str) -> Optional[UploadSession]:
+        session = self.sessions.get(session_id)
+        if session is None or session.project_id != project_id:
+            return None
+        return session
+
+    async def write_chunk(self, session: UploadSession, index: int, body: AsyncIterator[bytes]) -> UploadSession:
+        """Write one chunk at its offset; re-sending a received chunk is a no-op"""
+        if not 0 <= index < session.total_chunks:
+            raise ValueError(f"Chunk index {index} out of range (0-{session.total_chunks - 1})")
+
+        expected = session.chunk_length(index)
+        data = bytearray()
+        async for piece in body:
+            data.extend(piece)
+            if len(data) > expected:
+                raise ValueError(f"Chunk {index} is larger than {expected} bytes")
+        if len(data) != expected:
+            raise ValueError(f"Chunk {index} has {len(data)} bytes, expected {expected}")
+
+        if index in session.received:
+            return session
+
+        async with aiofiles.open(session.part_path, "r+b") as f:
+            await f.seek(index * session.chunk_size)
+            await f.write(bytes(data))
+            await f.flush()
+            # The chunk must be on disk before the saved session lists it
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, f.fileno())
+        session.received.add(index)
+        await self._save_session(session)
+
+        await self._advance_hash(session, index, bytes(data))
+        return session
+
+    async def _advance_hash(self, session: UploadSession, index: Optional[int] = None, data: bytes = b"") -> None:
+        """Hash the received chunks following the hashed prefix; `data` is chunk `index`, if at hand"""
+        async with session._hash_lock:
+            while session._next_to_hash in session.received:
+                current = session._next_to_hash
+                if current == index:
+                    chunk = data
+                else:
+                    # Arrived out of order earlier; read it back now the gap is filled
+                    async with aiofiles.open(session.part_path, "rb") as f:
+                        await f.seek(current * session.chunk_size)
+                        chunk = await f.read(session.chunk_length(current))
+                await _hash_update(session._hasher, chunk)
+                session._next_to_hash += 1
+
+    async def complete_session(self, session: UploadSession) -> Tuple[int, str]:
+        """
+        Move a fully received upload into place; returns its size and
+        checksum. Raises LookupError if the session was already completed
+        or aborted, e.g. by a concurrent request.
+        """
+        missing = session.missing_chunks
+        if missing:
+            raise ValueError(f"Upload incomplete, {len(missing)} chunks missing")
+
+        # Claim the session before the first await, so only one request completes it
+        if self.sessions.pop(session.id, None) is None:
+            raise LookupError(f"Upload session {session.id} is already completed or aborted")
+        try:
+            # Chunks received before a restart have not been hashed in this process
+            await self._advance_hash(session)
+            async with session._hash_lock:
+                checksum = session._hasher.hexdigest()
+            os.replace(session.part_path, session.final_path)
+        except BaseException:
+            self.sessions[session.id] = session
+            raise
+
+        self._remove_state(session)
+        logger.info(f"Upload session {session.id} completed: {session.final_path}")
+        return session.size, checksum
+
+    def abort_session(self, session: UploadSession) -> None:
+        self.sessions.pop(session.id, None)
+        if os.path.exists(session.part_path):
+            os.remove(session.part_path)
+        self._remove_state(session)
+
+    @staticmethod
+    def _remove_state(session: UploadSession) -> None:
+        try:
+            os.remove(session.state_path)
+        except FileNotFoundError:
+            pass
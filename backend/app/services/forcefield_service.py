@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.utils.gromacs_utils import (
+    parse_atomtypes,
+    parse_r2b,
+    parse_rtp,
+    parse_watermodels,
+    parse_xlateat
+)
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between mtime checks of the force field directories
+FORCEFIELD_RECHECK_INTERVAL = float(os.getenv("FORCEFIELD_RECHECK_INTERVAL", "5"))
+
+# pdb2gmx renames HIS to one of these depending on its protonation state
+HISTIDINE_VARIANTS = ["HISD", "HISE", "HISH", "HISA", "HISB", "HID", "HIE", "HIP"]
+
+
+def _is_hydrogen(atom: str) -> bool:
+    name = atom.lstrip("0123456789")
+    return name.startswith("H")
+
+
+class ForceField:
+    """
+    Index of one force field directory: residue building blocks, atom
+    types and water models, parsed once per directory mtime
+    """
+
+    def __init__(self, path: Path, mtime_ns: int):
+        self.path = path
+        self.name = path.name[:-3] if path.name.endswith(".ff") else path.name
+        self.mtime_ns = mtime_ns
+        self.description = self._read_description()
+        self.residues: Dict[str, Set[str]] = {}
+        self.aliases: Dict[str, List[str]] = {}
+        self.atom_types: Set[str] = set()
+        self.xlate: List[Tuple[str, str, str]] = []
+        self.water_models: List[Dict[str, str]] = []
+
+        for rtp in sorted(path.glob("*.rtp")):
+            for residue, atoms in parse_rtp(rtp).items():
+                self.residues.setdefault(residue, set()).update(atoms)
+        for r2b in sorted(path.glob("*.r2b")):
+            self.aliases.update(parse_r2b(r2b))
+
+        atp = path / "atomtypes.atp"
+        sources = [atp] if atp.exists() else sorted(path.glob("*.itp"))
+        for source in sources:
+            self.atom_types.update(parse_atomtypes(source))
+
+        if (path / "xlateat.dat").exists():
+            self.xlate = parse_xlateat(path / "xlateat.dat")
+        if (path / "watermodels.dat").exists():
+            self.water_models = parse_watermodels(path / "watermodels.dat")
+
+    def _read_description(self) -> Optional[str]:
+        """Description from a forcefield.itp comment, or the first line of forcefield.doc"""
+        try:
+            with open(self.path / "forcefield.itp", "r", errors="replace") as f:
+                for line in f:
+                    if line.strip().startswith(';') and 'description' in line.lower():
+                        return line.strip()[1:].strip()
+            doc = self.path / "forcefield.doc"
+            if doc.exists():
+                with open(doc, "r", errors="replace") as f:
+                    return f.readline().strip() or None
+        except OSError:
+            pass
+        return None
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "description": self.description or f"{self.name} force field",
+            "residue_count": len(self.residues),
+            "atom_type_count": len(self.atom_types),
+            "water_models": self.water_models
+        }
+
+
+class ForceFieldCatalogue:
+    """
+    Catalogue of the force fields under GROMACS_FORCE_FIELDS_PATH.
+
+    Directory mtimes are checked at most every FORCEFIELD_RECHECK_INTERVAL
+    seconds and only force fields whose directory changed are re-indexed,
+    so listing force fields or checking a structure against them does not
+    touch the (possibly network-mounted) installation.
+    """
+
+    def __init__(self, root: str, recheck_interval: float = FORCEFIELD_RECHECK_INTERVAL):
+        self.root = Path(root)
+        self.recheck_interval = recheck_interval
+        self.forcefields: Dict[str, ForceField] = {}
+        self.global_xlate: List[Tuple[str, str, str]] = []
+        self._root_mtime: Optional[int] = None
+        self._dirs: List[Path] = []
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.recheck_interval:
+                return
+            self._checked_at = now
+
+            try:
+                root_mtime = self.root.stat().st_mtime_ns
+            except OSError:
+                self.forcefields = {}
+                self._dirs = []
+                self._root_mtime = None
+                return
+
+            # Force field directories are only added or removed when the root changes
+            if root_mtime != self._root_mtime:
+                self._root_mtime = root_mtime
+                self._dirs = sorted(
+                    Path(entry.path) for entry in os.scandir(self.root)
+                    if entry.is_dir() and os.path.exists(os.path.join(entry.path, "forcefield.itp"))
+                )
+                xlateat = self.root / "xlateat.dat"
+                self.global_xlate = parse_xlateat(xlateat) if xlateat.exists() else []
+
+            forcefields = {}
+            for path in self._dirs:
+                try:
+                    mtime = path.stat().st_mtime_ns
+                except OSError:
+                    continue
+                name = path.name[:-3] if path.name.endswith(".ff") else path.name
+                known = self.forcefields.get(name)
+                if known is not None and known.mtime_ns == mtime:
+                    forcefields[name] = known
+                    continue
+                try:
+                    forcefields[name] = ForceField(path, mtime)
+                    logger.info(f"Indexed force field {name}")
+                except OSError as e:
+                    logger.warning(f"Could not index force field {path}: {e}")
+            self.forcefields = forcefields
+
+    def list(self) -> List[Dict]:
+        self.refresh()
+        return [ff.to_dict() for ff in self.forcefields.values()]
+
+    def get(self, name: str) -> Optional[ForceField]:
+        self.refresh()
+        return self.forcefields.get(name)
+
+    def _building_blocks(self, ff: ForceField, resname: str) -> List[str]:
+        """Building blocks pdb2gmx may use for a residue, including terminal variants"""
+        names = [resname]
+        if resname == "HIS":
+            names += HISTIDINE_VARIANTS
+        for name in list(names):
+            names += ff.aliases.get(name, [])
+        # AMBER-style terminal blocks (NALA, CALA)
+        names += [prefix + name for name in list(names) for prefix in ("N", "C")]
+        return [name for name in dict.fromkeys(names) if name in ff.residues]
+
+    def check_residues(self, ff: ForceField, residues: List[Dict]) -> Dict:
+        """
+        Check residues read from a structure against a force field: unknown
+        residues make pdb2gmx fail, unknown heavy atoms usually do too
+        """
+        rules = self.global_xlate + ff.xlate
+        unknown_residues: Dict[str, int] = {}
+        unknown_atoms: List[Dict] = []
+
+        for residue in residues:
+            resname = residue["name"]
+            blocks = self._building_blocks(ff, resname)
+            if not blocks:
+                unknown_residues[resname] = unknown_residues.get(resname, 0) + 1
+                continue
+
+            known = set().union(*(ff.residues[block] for block in blocks))
+            for atom in residue["atoms"]:
+                if atom in known or _is_hydrogen(atom):
+                    continue
+                renamed = {new for group, old, new in rules if old == atom and (group == resname or group not in ff.residues)}
+                if not renamed & known:
+                    unknown_atoms.append({
+                        "chain": residue["chain"],
+                        "resseq": residue["resseq"],
+                        "residue": resname,
+                        "atom": atom
+                    })
+
+        return {
+            "forcefield": ff.name,
+            "compatible": not unknown_residues,
+            "unknown_residues": unknown_residues,
+            "unknown_atoms": unknown_atoms[:100],
+            "unknown_atom_count": len(unknown_atoms)
+        }
+
+    def check_compatibility(self, residues: List[Dict], names: Optional[List[str]] = None) -> List[Dict]:
+        """Residue compatibility of a structure with each (or the named) force field"""
+        self.refresh()
+        selected = [ff for name, ff in self.forcefields.items() if names is None or name in names]
+        return [self.check_residues(ff, residues) for ff in selected]
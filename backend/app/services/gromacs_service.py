@@ -2,15 +2,98 @@ import os
 import subprocess
 import asyncio
 import json
+import time
 import shutil
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, AsyncGenerator
 from datetime import datetime
+from functools import partial
 import logging
 import re
+import signal
+import socket
+
+from app.services.cache_service import StageCache, snapshot_dir
+from app.services.forcefield_service import ForceFieldCatalogue
+from app.services.storage_service import clone_file, temp_path
+from app.services.tuning_service import TUNING_BENCHMARK_STEPS, simulated_ns_per_day
+from app.utils.gromacs_utils import MdrunProgressParser, read_log_last_step, read_log_performance
 
 logger = logging.getLogger(__name__)
 
+# Output line terminators of GROMACS tools ("\r" for in-place progress lines)
+LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+
+# Output prefixes of the simulation phases; their files are not copied into replicas
+PHASE_OUTPUT_PREFIXES = ("em.", "nvt.", "npt.", "md.", "mdout.")
+
+# Seconds between reads of replica .log files during -multidir runs
+MULTIDIR_POLL_INTERVAL = 2.0
+
+# Minutes between mdrun checkpoints (-cpt)
+MDRUN_CHECKPOINT_INTERVAL = float(os.getenv("MDRUN_CHECKPOINT_INTERVAL", "15"))
+
+# Wall-clock hours of one mdrun segment (-maxh); 0 runs each phase in one segment
+MDRUN_MAXH = float(os.getenv("MDRUN_MAXH", "0"))
+
+# Seconds between reads of the output file of a running mdrun
+MDRUN_OUTPUT_POLL_INTERVAL = 0.5
+
+# Pid, output prefix and output offset of the mdrun running in a project
+RUN_STATE_FILE = ".mdrun.json"
+
+# An mdrun of another node whose output changed within this many seconds is
+# taken to be running (its pid cannot be checked from here)
+MDRUN_LIVE_WINDOW = float(os.getenv("MDRUN_LIVE_WINDOW", "600"))
+
+# mdrun stopped early but wrote a checkpoint: -maxh reached, or TERM/INT received
+MDRUN_INTERRUPTED = re.compile(rb"Run time exceeded|Received the \w+ signal")
+
+# Bytes read from the end of mdrun output when checking how a segment ended;
+# the messages looked for are printed within the last few hundred steps
+SEGMENT_TAIL_BYTES = 64 * 1024
+
+# Logged between -maxh segments of a phase; completed segments can be analysed
+SEGMENT_END_MESSAGE = "{phase} reached the segment walltime, continuing from checkpoint\n"
+
+HOSTNAME = socket.gethostname()
+
+
+def _read_tail(path: Path, offset: int = 0, length: int = SEGMENT_TAIL_BYTES) -> bytes:
+    """At most the last `length` bytes of a file, none of them before `offset`"""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(offset, size - length))
+        return f.read()
+
+
+async def follow_output(path: Path, offset: int, running) -> AsyncGenerator[str, None]:
+    """
+    Yield the lines appended to a file from offset on, until running() is
+    false and the file is drained. mdrun -v rewrites its progress line with
+    carriage returns, so "\r" also ends a line.
+    """
+    pending = b""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            # Checked before reading, so output written just before exit is not lost
+            alive = running()
+            chunk = f.read(65536)
+            if chunk:
+                lines = LINE_BREAK.split(pending + chunk)
+                pending = lines.pop()
+                for line in lines:
+                    if line:
+                        yield line.decode(errors="replace") + "\n"
+            elif alive:
+                await asyncio.sleep(MDRUN_OUTPUT_POLL_INTERVAL)
+            else:
+                break
+    if pending:
+        yield pending.decode(errors="replace") + "\n"
+
+
 class GromacsService:
     """
     Service for executing GROMACS commands and managing simulations
@@ -21,11 +104,24 @@ class GromacsService:
         self.gmx_command = os.path.join(self.gromacs_bin, "gmx")
         self.force_fields_path = os.getenv("GROMACS_FORCE_FIELDS_PATH", "/usr/local/gromacs/share/gromacs/top")
         self.mock_mode = os.getenv("MOCK_GROMACS", "false").lower() == "true"
+        # MPI launcher and MPI-enabled binary used for -multidir ensembles
+        self.mpirun_command = os.getenv("GROMACS_MPIRUN", "mpirun")
+        self.gmx_mpi_command = os.path.join(self.gromacs_bin, "gmx_mpi")
         
         # Verify GROMACS installation
         if not self.mock_mode and not self._verify_gromacs():
             logger.warning("GROMACS not found, running in mock mode")
             self.mock_mode = True
+
+        self.stage_cache = StageCache()
+        self.forcefields = ForceFieldCatalogue(self.force_fields_path)
+        # Set on shutdown: cancelled jobs then leave their mdrun running for reattachment
+        self.detached = False
+        self._engine_version: Optional[str] = None
+    
+    def detach(self) -> None:
+        """Leave running mdrun processes alone when their jobs are cancelled (backend shutdown)"""
+        self.detached = True
     
     def _verify_gromacs(self) -> bool:
         """Verify GROMACS installation"""
@@ -51,58 +147,63 @@ class GromacsService:
                 {"name": "amber14sb", "description": "AMBER14SB protein force field"}
             ]
         
-        forcefields = []
-        ff_path = Path(self.force_fields_path)
-        
-        if ff_path.exists():
-            for ff_dir in ff_path.iterdir():
-                if ff_dir.is_dir() and (ff_dir / "forcefield.itp").exists():
-                    # Read description from forcefield.itp if available
-                    description = self._read_forcefield_description(ff_dir / "forcefield.itp")
-                    forcefields.append({
-                        "name": ff_dir.name,
-                        "description": description or f"{ff_dir.name} force field"
-                    })
-        
-        return forcefields
-    
-    def _read_forcefield_description(self, itp_file: Path) -> Optional[str]:
-        """Read force field description from .itp file"""
-        try:
-            with open(itp_file, 'r') as f:
-                for line in f:
-                    if line.strip().startswith(';') and 'description' in line.lower():
-                        return line.strip()[1:].strip()
-            return None
-        except Exception:
-            return None
+        # Indexing reads every force field directory; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.forcefields.list)
     
     async def prepare_system(self, project_dir: str, config: Dict) -> Dict[str, str]:
         """
         Prepare system for simulation
         Returns dict with generated files
+
+        Topology, solvation and ion stages are memoized in the stage cache;
+        `cache_<stage>` entries in the result report hits and misses.
         """
         project_path = Path(project_dir)
         results = {}
+        use_cache = config.get("use_stage_cache", True)
         
         try:
             # Step 1: Generate topology
-            topology_result = await self._generate_topology(project_path, config)
-            results.update(topology_result)
+            pdb_files = sorted(project_path.glob("*.pdb"))
+            upstream_key = await self._run_stage(
+                "topology", project_path, results, use_cache,
+                params={
+                    "forcefield": config.get("forcefield", "amber99sb-ildn"),
+                    "water_model": config.get("water_model", "tip3p")
+                },
+                input_files=pdb_files[:1],
+                upstream_key=None,
+                run=partial(self._generate_topology, project_path, config)
+            )
             
             # Step 2: Define box and solvate
             if config.get("add_solvent", True):
-                solvation_result = await self._solvate_system(project_path, config)
-                results.update(solvation_result)
+                upstream_key = await self._run_stage(
+                    "solvate", project_path, results, use_cache,
+                    params={
+                        "box_distance": config.get("box_distance", 1.0),
+                        "box_type": config.get("box_type", "cubic"),
+                        "solvent": "spc216.gro"
+                    },
+                    input_files=[],
+                    upstream_key=upstream_key,
+                    run=partial(self._solvate_system, project_path, config)
+                )
             
             # Step 3: Add ions
             if config.get("add_ions", True):
-                ions_result = await self._add_ions(project_path, config)
-                results.update(ions_result)
+                await self._run_stage(
+                    "ions", project_path, results, use_cache,
+                    params={"pname": "NA", "nname": "CL", "neutral": True},
+                    input_files=[],
+                    upstream_key=upstream_key,
+                    run=partial(self._add_ions, project_path, config)
+                )
             
             # Step 4: Generate MDP files
             mdp_result = await self._generate_mdp_files(project_path, config)
             results.update(mdp_result)
+            self.mark_completed(project_path, "prepare")
             
             logger.info(f"System preparation completed for {project_dir}")
             return results
@@ -110,6 +211,50 @@ class GromacsService:
         except Exception as e:
             logger.error(f"System preparation failed: {str(e)}")
             raise
+
+    async def _run_stage(
+        self,
+        stage: str,
+        project_path: Path,
+        results: Dict[str, str],
+        use_cache: bool,
+        params: Dict,
+        input_files: List[Path],
+        upstream_key: Optional[str],
+        run
+    ) -> Optional[str]:
+        """
+        Run one preparation stage, or restore its outputs from the stage
+        cache. Inputs produced by earlier stages are covered by chaining
+        `upstream_key`. Returns the stage's cache key.
+        """
+        if not use_cache:
+            results.update(await run())
+            return None
+
+        loop = asyncio.get_running_loop()
+        # Mock outputs must never be restored into a real run
+        params = {**params, "mock": self.mock_mode}
+        key = await loop.run_in_executor(
+            None, partial(self.stage_cache.key, stage, params, input_files, upstream_key)
+        )
+
+        restored = await loop.run_in_executor(
+            None, partial(self.stage_cache.restore, stage, key, project_path)
+        )
+        if restored is not None:
+            results.update(restored)
+            results[f"cache_{stage}"] = "hit"
+            return key
+
+        before = snapshot_dir(project_path)
+        stage_result = await run()
+        await loop.run_in_executor(
+            None, partial(self.stage_cache.store, stage, key, project_path, before, stage_result)
+        )
+        results.update(stage_result)
+        results[f"cache_{stage}"] = "miss"
+        return key
     
     async def _generate_topology(self, project_path: Path, config: Dict) -> Dict[str, str]:
         """Generate topology file using pdb2gmx"""
@@ -128,7 +273,7 @@ class GromacsService:
             return {"topology": str(top_file), "structure": str(gro_file)}
         
         # Find input PDB file
-        pdb_files = list(project_path.glob("*.pdb"))
+        pdb_files = sorted(project_path.glob("*.pdb"))
         if not pdb_files:
             raise ValueError("No PDB file found in project directory")
         
@@ -142,7 +287,7 @@ class GromacsService:
             "-o", "conf.gro",
             "-p", "topol.top",
             "-ff", forcefield,
-            "-water", "tip3p"
+            "-water", config.get("water_model", "tip3p")
         ]
         
         await self._run_command(command, cwd=project_path)
@@ -155,6 +300,8 @@ class GromacsService:
     async def _solvate_system(self, project_path: Path, config: Dict) -> Dict[str, str]:
         """Solvate the system"""
         if self.mock_mode:
+            with open(project_path / "solv.gro", 'w') as f:
+                f.write("Mock solvated structure\n1\n1ALA      N    1   1.000   1.000   1.000\n3.0 3.0 3.0\n")
             await asyncio.sleep(1)
             return {"solvated_structure": str(project_path / "solv.gro")}
         
@@ -163,8 +310,8 @@ class GromacsService:
             self.gmx_command, "editconf",
             "-f", "conf.gro",
             "-o", "newbox.gro",
-            "-c", "-d", "1.0",
-            "-bt", "cubic"
+            "-c", "-d", str(config.get("box_distance", 1.0)),
+            "-bt", config.get("box_type", "cubic")
         ], cwd=project_path)
         
         # Solvate
@@ -181,6 +328,8 @@ class GromacsService:
     async def _add_ions(self, project_path: Path, config: Dict) -> Dict[str, str]:
         """Add ions to neutralize the system"""
         if self.mock_mode:
+            with open(project_path / "ions.gro", 'w') as f:
+                f.write("Mock structure with ions\n1\n1ALA      N    1   1.000   1.000   1.000\n3.0 3.0 3.0\n")
             await asyncio.sleep(1)
             return {"ions_structure": str(project_path / "ions.gro")}
         
@@ -284,6 +433,11 @@ ref_t                   = {config.get('temperature', 300)}    {config.get('tempe
 
 pcoupl                  = no           ; no pressure coupling in NVT
 pbc                     = xyz          ; 3-D PBC
+
+gen_vel                 = yes          ; assign velocities from Maxwell distribution
+gen_temp                = {config.get('temperature', 300)}          ; temperature for Maxwell distribution
+gen_seed                = {config.get('gen_seed', -1)}           ; -1 draws a random seed; replicas get distinct seeds
+ld_seed                 = {config.get('gen_seed', -1)}           ; thermostat random stream
 """,
             
             "npt": f"""
@@ -320,6 +474,7 @@ ref_p                   = {config.get('pressure', 1.0)}          ; reference pre
 compressibility         = 4.5e-5      ; isothermal compressibility of water, bar^-1
 
 pbc                     = xyz          ; 3-D PBC
+ld_seed                 = {config.get('gen_seed', -1)}           ; thermostat random stream
 """,
             
             "production": f"""
@@ -357,6 +512,7 @@ compressibility         = 4.5e-5      ; isothermal compressibility of water, bar
 
 pbc                     = xyz          ; 3-D PBC
 gen_vel                 = no           ; Velocity generation is off
+ld_seed                 = {config.get('gen_seed', -1)}           ; thermostat random stream
 """
         }
         
@@ -365,8 +521,11 @@ gen_vel                 = no           ; Velocity generation is off
             filename = f"{phase}.mdp"
             filepath = project_path / filename
             
-            with open(filepath, 'w') as f:
+            # Replace rather than overwrite: an uploaded .mdp of the same name may be a blob link
+            tmp_path = temp_path(str(filepath))
+            with open(tmp_path, 'w') as f:
                 f.write(content)
+            os.replace(tmp_path, filepath)
             
             generated_files[f"{phase}_mdp"] = str(filepath)
         
@@ -377,26 +536,519 @@ gen_vel                 = no           ; Velocity generation is off
         project_path: str, 
         phase: str, 
         config: Dict,
-        progress_callback=None
+        progress_callback=None,
+        process_callback=None
     ) -> AsyncGenerator[str, None]:
         """
         Run a specific simulation phase (minimization, nvt, npt, production)
         Yields log output in real-time
+
+        `progress_callback` receives MdrunProgressParser updates (step,
+        time_ps, progress, eta_seconds, ns_per_day); `process_callback`
+        receives the pid of mdrun once it has started.
+
+        mdrun checkpoints every MDRUN_CHECKPOINT_INTERVAL minutes and runs in
+        segments of at most `maxh` hours, each continuing from the last
+        checkpoint. If the phase has a checkpoint it is resumed rather than
+        restarted; if its mdrun is still running (the backend restarted) the
+        output of that process is followed instead of starting a new one.
         """
         project_dir = Path(project_path)
+        parser = MdrunProgressParser.from_mdp(project_dir / f"{phase}.mdp")
+        phase_config = self._phase_config(project_dir, phase)
+        prefix = phase_config["output_prefix"]
         
         if self.mock_mode:
+            async for line in self._run_mock_phase(project_dir, phase, prefix, config, parser, progress_callback):
+                yield line
+            # The next phase (and launch tuning) starts from the output structure
+            if (project_dir / phase_config["input_gro"]).exists():
+                shutil.copyfile(project_dir / phase_config["input_gro"], project_dir / f"{prefix}.gro")
+            self.mark_completed(project_dir, phase)
+            return
+        
+        state = self.read_run_state(project_dir)
+        running = state is not None and self._run_live(project_dir, state)
+        # Only an mdrun nobody follows any more (the backend or worker that
+        # started it exited) is reattached; a redelivered task must not start
+        # a second mdrun, or follow one its first delivery still follows
+        if running and (state.get("prefix") != prefix or state.get("host") != HOSTNAME
+                        or self._follower_alive(state)):
+            raise RuntimeError(
+                f"{state.get('prefix')} mdrun is already running in this project "
+                f"(pid {state.get('pid')} on {state.get('host')})"
+            )
+        if running:
+            yield f"Reattaching to running {phase} simulation (pid {state['pid']})\n"
+            segment = self._attach_mdrun(project_dir, state["pid"], process_callback)
+        elif (project_dir / f"{prefix}.cpt").exists():
+            yield f"Resuming {phase} simulation from checkpoint {prefix}.cpt\n"
+            segment = None
+        else:
+            # Step 1: grompp (preprocessing)
+            yield f"Preprocessing {phase} simulation...\n"
+            
+            grompp_cmd = [
+                self.gmx_command, "grompp",
+                "-f", phase_config["mdp"],
+                "-c", phase_config["input_gro"],
+                "-p", "topol.top",
+                "-o", f"{prefix}.tpr"
+            ]
+            
+            try:
+                await self._run_command(grompp_cmd, cwd=project_dir)
+                yield "Preprocessing completed successfully\n"
+            except subprocess.CalledProcessError as e:
+                yield f"Preprocessing failed: {e}\n"
+                raise
+            segment = None
+        
+        # Step 2: mdrun (actual simulation), one segment per -maxh walltime
+        mdrun_cmd = self._mdrun_command(prefix, config)
+        while True:
+            if segment is None:
+                yield f"Starting {phase} simulation...\n"
+                segment = self._run_mdrun(mdrun_cmd, project_dir, prefix, process_callback)
+            
+            async for line in segment:
+                yield line
+                
+                # Parse progress from GROMACS output
+                if progress_callback:
+                    update = parser.parse(line)
+                    if update is not None:
+                        await progress_callback(update)
+            
+            outcome = await asyncio.get_running_loop().run_in_executor(
+                None, self._segment_outcome, project_dir, prefix
+            )
+            if outcome == "finished":
+                break
+            if outcome != "walltime":
+                raise RuntimeError(f"mdrun of {phase} stopped before finishing ({outcome}); resume from {prefix}.cpt")
+            # -maxh reached; mdrun wrote a checkpoint on the way out
+            yield SEGMENT_END_MESSAGE.format(phase=phase)
+            segment = None
+        
+        self.clear_run_state(project_dir)
+        
+        # The final throughput is in the performance table of the .log
+        if progress_callback:
+            performance = read_log_performance(project_dir / f"{prefix}.log")
+            if performance is not None:
+                await progress_callback(parser.finish(performance["ns_per_day"]))
+        
+        self.mark_completed(project_dir, phase)
+        yield f"{phase} simulation completed successfully\n"
+    
+    async def _run_mock_phase(
+        self,
+        project_dir: Path,
+        phase: str,
+        prefix: str,
+        config: Dict,
+        parser: MdrunProgressParser,
+        progress_callback=None
+    ) -> AsyncGenerator[str, None]:
+        """Mock mdrun; the step reached is "checkpointed" so interrupted phases resume"""
+        checkpoint = project_dir / f"{prefix}.cpt"
+        done = int(checkpoint.read_text() or 0) if checkpoint.exists() else 0
+        if done:
+            yield f"Resuming {phase} simulation from checkpoint {prefix}.cpt (mock mode)\n"
+        else:
             yield f"Starting {phase} simulation (mock mode)\n"
+        if config.get("pinoffset") is not None:
+            threads = int(config.get("ntomp") or 1) * int(config.get("ntmpi") or 1)
+            yield f"Pinning {threads} threads starting at core {config['pinoffset']}\n"
+        nsteps = parser.nsteps or 1000
+        for i in range(done, 10):
+            await asyncio.sleep(1)
+            progress = (i + 1) * 10
+            line = f"Step {nsteps * (i + 1) // 10}, Progress: {progress}%\n"
+            checkpoint.write_text(str(i + 1))
+            yield line
+            update = parser.parse(line)
+            if progress_callback and update:
+                await progress_callback(update)
+        yield f"{phase} simulation completed successfully\n"
+    
+    def _mdrun_command(self, prefix: str, config: Dict) -> List[str]:
+        mdrun_cmd = [
+            self.gmx_command, "mdrun",
+            "-s", f"{prefix}.tpr",
+            "-o", f"{prefix}.trr",
+            "-x", f"{prefix}.xtc",
+            "-c", f"{prefix}.gro",
+            "-e", f"{prefix}.edr",
+            "-g", f"{prefix}.log",
+            # Continue from the checkpoint if there is one, appending to the outputs
+            "-cpi", f"{prefix}.cpt",
+            "-cpo", f"{prefix}.cpt",
+            "-cpt", str(MDRUN_CHECKPOINT_INTERVAL),
+            "-v"  # Verbose output
+        ]
+        
+        maxh = config.get("maxh") or MDRUN_MAXH
+        if maxh:
+            mdrun_cmd.extend(["-maxh", str(maxh)])
+        
+        # Add GPU/CPU specific flags
+        if config.get("gpu_enabled", True):
+            mdrun_cmd.extend(["-nb", "gpu"])
+        else:
+            mdrun_cmd.extend(["-nb", "cpu"])
+        
+        # Add threading options
+        if config.get("ntomp"):
+            mdrun_cmd.extend(["-ntomp", str(config["ntomp"])])
+        
+        if config.get("ntmpi"):
+            mdrun_cmd.extend(["-ntmpi", str(config["ntmpi"])])
+        
+        # Dedicated PME ranks, chosen by launch tuning
+        if config.get("npme") is not None:
+            mdrun_cmd.extend(["-npme", str(config["npme"])])
+
+        # Pin threads to the cores handed out by the scheduler
+        if config.get("pinoffset") is not None:
+            mdrun_cmd.extend([
+                "-pin", "on",
+                "-pinoffset", str(config["pinoffset"]),
+                "-pinstride", "1"
+            ])
+        return mdrun_cmd
+    
+    def mark_completed(self, project_dir: Path, step: str) -> None:
+        """Record that preparation or a phase finished, so a resumed run skips it"""
+        (Path(project_dir) / f".{step}.done").touch()
+    
+    def is_completed(self, project_dir: str, step: str) -> bool:
+        return (Path(project_dir) / f".{step}.done").exists()
+    
+    def reset_run_state(self, project_dir: str) -> None:
+        """Forget completed phases and checkpoints before a run from scratch"""
+        project_path = Path(project_dir)
+        # Completion markers, and ids of phase tasks sent to worker nodes
+        for path in [*project_path.glob(".*.done"), *project_path.glob(".*.task")]:
+            path.unlink()
+        for prefix in PHASE_OUTPUT_PREFIXES:
+            # {prefix}.cpt and the {prefix}_prev.cpt backup
+            for path in project_path.glob(f"{prefix.rstrip('.')}*.cpt"):
+                path.unlink()
+        self.clear_run_state(project_path)
+    
+    def read_run_state(self, project_dir: Path) -> Optional[Dict]:
+        try:
+            with open(Path(project_dir) / RUN_STATE_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def clear_run_state(self, project_dir: Path) -> None:
+        try:
+            (Path(project_dir) / RUN_STATE_FILE).unlink()
+        except FileNotFoundError:
+            pass
+    
+    def _mdrun_alive(self, pid: int) -> bool:
+        """Whether pid is a live mdrun (and not an unrelated process that reused the pid)"""
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                return b"mdrun" in f.read()
+        except OSError:
+            return False
+    
+    def _run_live(self, project_dir: Path, state: Dict) -> bool:
+        """Whether the mdrun recorded in a run state is still running"""
+        if state.get("host") == HOSTNAME:
+            return self._mdrun_alive(state["pid"])
+        try:
+            modified = (Path(project_dir) / f"{state['prefix']}.out").stat().st_mtime
+        except (KeyError, OSError):
+            return False
+        return time.time() - modified < MDRUN_LIVE_WINDOW
+    
+    def _follower_alive(self, state: Dict) -> bool:
+        """Whether another process of this host is following the recorded mdrun"""
+        follower = state.get("follower")
+        if not follower or follower == os.getpid():
+            return False
+        try:
+            os.kill(follower, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+    
+    def _write_run_state(self, project_dir: Path, state: Dict) -> None:
+        with open(Path(project_dir) / RUN_STATE_FILE, "w") as f:
+            json.dump(state, f)
+    
+    def _segment_outcome(self, project_dir: Path, prefix: str) -> str:
+        """
+        How the last mdrun segment ended: "finished", "walltime" or "signal"
+        (stopped early after writing a checkpoint) or "crashed"
+        """
+        state = self.read_run_state(project_dir) or {}
+        match = MDRUN_INTERRUPTED.search(_read_tail(project_dir / f"{prefix}.out", state.get("offset", 0)))
+        if match:
+            return "walltime" if match.group().startswith(b"Run time") else "signal"
+        # Segments append to the same .log; only look at what this one wrote
+        try:
+            if b"Finished mdrun" in _read_tail(project_dir / f"{prefix}.log", state.get("log_offset", 0)):
+                return "finished"
+        except OSError:
+            pass
+        return "crashed"
+    
+    async def _run_mdrun(self, command: List[str], project_dir: Path, prefix: str, on_start=None) -> AsyncGenerator[str, None]:
+        """
+        Start mdrun in its own session with its output in {prefix}.out and
+        yield that output line by line. Unlike a pipe, the file outlives the
+        backend, so mdrun keeps running across a restart and can be
+        reattached from RUN_STATE_FILE.
+        """
+        output_path = project_dir / f"{prefix}.out"
+        log_path = project_dir / f"{prefix}.log"
+        log_offset = log_path.stat().st_size if log_path.exists() else 0
+        with open(output_path, "ab") as output:
+            offset = output.tell()
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                cwd=project_dir,
+                stdout=output,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True
+            )
+        self._write_run_state(project_dir, {
+            "pid": process.pid,
+            "prefix": prefix,
+            "offset": offset,
+            "log_offset": log_offset,
+            "host": HOSTNAME,
+            "follower": os.getpid(),
+            "started": time.time()
+        })
+        if on_start is not None:
+            on_start(process.pid)
+        
+        try:
+            async for line in follow_output(output_path, offset, lambda: process.returncode is None):
+                yield line
+        except asyncio.CancelledError:
+            if not self.detached:
+                # mdrun writes a checkpoint before exiting on TERM
+                process.terminate()
+            raise
+        
+        await process.wait()
+        
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+    
+    async def _attach_mdrun(self, project_dir: Path, pid: int, on_start=None) -> AsyncGenerator[str, None]:
+        """Follow the output of an mdrun started before the backend restarted"""
+        if on_start is not None:
+            on_start(pid)
+        state = self.read_run_state(project_dir)
+        self._write_run_state(project_dir, {**state, "follower": os.getpid()})
+        output_path = project_dir / f"{state['prefix']}.out"
+        try:
+            async for line in follow_output(output_path, output_path.stat().st_size, lambda: self._mdrun_alive(pid)):
+                yield line
+        except asyncio.CancelledError:
+            if not self.detached:
+                os.kill(pid, signal.SIGTERM)
+            raise
+    
+    async def prepare_replica(self, source_dir: str, replica_dir: str, config: Dict) -> Dict[str, str]:
+        """
+        Set up an ensemble replica from an already prepared system. The
+        prepared files are cloned (copy-on-write where supported) and only
+        the MDP files are regenerated, with the replica's seed.
+        """
+        source = Path(source_dir)
+        replica = Path(replica_dir)
+        replica.mkdir(parents=True, exist_ok=True)
+        
+        def clone_prepared():
+            for entry in os.scandir(source):
+                if (entry.is_file() and not entry.name.startswith(("#", "."))
+                        and not entry.name.startswith(PHASE_OUTPUT_PREFIXES)):
+                    clone_file(entry.path, str(replica / entry.name))
+        
+        await asyncio.get_running_loop().run_in_executor(None, clone_prepared)
+        result = await self._generate_mdp_files(replica, config)
+        self.mark_completed(replica, "prepare")
+        return result
+    
+    async def run_multidir_phase(
+        self,
+        replica_dirs: List[str],
+        phase: str,
+        config: Dict,
+        progress_callback=None,
+        process_callback=None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Run one phase of all replicas as a single `mdrun -multidir`, one MPI
+        rank per replica. mdrun only prints the progress of the first
+        replica, so `progress_callback(replica_index, update)` is fed from
+        the energy blocks of each replica's .log. Replicas with a checkpoint
+        of the phase continue from it.
+        """
+        dirs = [Path(d) for d in replica_dirs]
+        parsers = [MdrunProgressParser.from_mdp(d / f"{phase}.mdp") for d in dirs]
+        
+        if self.mock_mode:
+            yield f"Starting {phase} for {len(dirs)} replicas with -multidir (mock mode)\n"
             for i in range(10):
                 await asyncio.sleep(1)
-                progress = (i + 1) * 10
-                yield f"Step {i*100}, Progress: {progress}%\n"
-                if progress_callback:
-                    await progress_callback(progress)
-            yield f"{phase} simulation completed successfully\n"
+                for index, parser in enumerate(parsers):
+                    update = parser.observe_step((parser.nsteps or 1000) * (i + 1) // 10)
+                    if progress_callback:
+                        await progress_callback(index, update)
+                yield f"Step {parsers[0].step}, Progress: {(i + 1) * 10}%\n"
+            for d in dirs:
+                self.mark_completed(d, phase)
+            yield f"{phase} simulation completed successfully for {len(dirs)} replicas\n"
             return
         
-        # Phase-specific configurations
+        prefix = self._phase_config(dirs[0], phase)["output_prefix"]
+        
+        yield f"Preprocessing {phase} for {len(dirs)} replicas...\n"
+        grompp_cmds = []
+        for d in dirs:
+            if (d / f"{prefix}.cpt").exists():
+                # Resumed from the checkpoint below; its .tpr must stay as it is
+                continue
+            phase_config = self._phase_config(d, phase)
+            grompp_cmds.append(self._run_command([
+                self.gmx_command, "grompp",
+                "-f", phase_config["mdp"],
+                "-c", phase_config["input_gro"],
+                "-p", "topol.top",
+                "-o", f"{prefix}.tpr"
+            ], cwd=d))
+        await asyncio.gather(*grompp_cmds)
+        yield "Preprocessing completed successfully\n"
+        
+        mdrun_cmd = [
+            self.mpirun_command, "-np", str(len(dirs)),
+            self.gmx_mpi_command, "mdrun",
+            "-multidir", *[str(d.resolve()) for d in dirs],
+            "-deffnm", prefix,
+            "-cpi", f"{prefix}.cpt",
+            "-cpt", str(MDRUN_CHECKPOINT_INTERVAL),
+            "-v",
+            "-nb", "gpu" if config.get("gpu_enabled", True) else "cpu"
+        ]
+        if config.get("ntomp"):
+            mdrun_cmd.extend(["-ntomp", str(config["ntomp"])])
+        if config.get("pinoffset") is not None:
+            mdrun_cmd.extend(["-pin", "on", "-pinoffset", str(config["pinoffset"]), "-pinstride", "1"])
+        
+        async def poll_logs():
+            loop = asyncio.get_running_loop()
+            while True:
+                await asyncio.sleep(MULTIDIR_POLL_INTERVAL)
+                steps = await loop.run_in_executor(
+                    None, lambda: [read_log_last_step(d / f"{prefix}.log") for d in dirs]
+                )
+                for index, step in enumerate(steps):
+                    if step is not None and step != parsers[index].step:
+                        await progress_callback(index, parsers[index].observe_step(step))
+        
+        poller = asyncio.create_task(poll_logs()) if progress_callback else None
+        try:
+            async for line in self._run_command_with_output(mdrun_cmd, cwd=dirs[0].parent, on_start=process_callback):
+                yield line
+        finally:
+            if poller is not None:
+                poller.cancel()
+        
+        if progress_callback:
+            for index, d in enumerate(dirs):
+                performance = read_log_performance(d / f"{prefix}.log")
+                await progress_callback(index, parsers[index].finish(performance and performance["ns_per_day"]))
+        
+        for d in dirs:
+            self.mark_completed(d, phase)
+        yield f"{phase} simulation completed successfully for {len(dirs)} replicas\n"
+    
+    def engine_version(self) -> str:
+        """GROMACS version string, part of the host fingerprint of tuned layouts"""
+        if self.mock_mode:
+            return "mock"
+        if self._engine_version is None:
+            try:
+                result = subprocess.run([self.gmx_command, "--version"], capture_output=True, text=True, timeout=10)
+                match = re.search(r"GROMACS version:\s*(\S+)", result.stdout)
+                self._engine_version = match.group(1) if match else "unknown"
+            except (OSError, subprocess.TimeoutExpired):
+                self._engine_version = "unknown"
+        return self._engine_version
+    
+    async def prepare_benchmark(self, project_dir: str) -> None:
+        """Preprocess the NVT system into .tune/bench.tpr for launch benchmarks"""
+        tune_dir = Path(project_dir) / ".tune"
+        tune_dir.mkdir(exist_ok=True)
+        if self.mock_mode:
+            return
+        await self._run_command([
+            self.gmx_command, "grompp",
+            "-f", "nvt.mdp",
+            "-c", "em.gro",
+            "-p", "topol.top",
+            "-o", ".tune/bench.tpr",
+            "-po", ".tune/mdout.mdp"
+        ], cwd=Path(project_dir))
+    
+    async def benchmark_layout(self, project_dir: str, layout: Dict, config: Dict, system: Dict) -> Optional[float]:
+        """
+        ns/day of a short mdrun with the given ntmpi/ntomp/npme layout, timed
+        over its second half; None if mdrun rejects the layout. In mock mode
+        the throughput comes from the simulated cost model.
+        """
+        gpu = config.get("gpu_enabled", True)
+        if self.mock_mode:
+            await asyncio.sleep(0.1)
+            return simulated_ns_per_day(system, layout, gpu, config.get("time_step", 0.002))
+        
+        command = [
+            self.gmx_command, "mdrun",
+            "-s", ".tune/bench.tpr",
+            "-deffnm", ".tune/bench",
+            "-nsteps", str(TUNING_BENCHMARK_STEPS),
+            "-resethway",
+            "-noconfout",
+            "-nb", "gpu" if gpu else "cpu",
+            "-ntmpi", str(layout["ntmpi"]),
+            "-ntomp", str(layout["ntomp"]),
+            "-npme", str(layout["npme"])
+        ]
+        if config.get("pinoffset") is not None:
+            command.extend(["-pin", "on", "-pinoffset", str(config["pinoffset"]), "-pinstride", "1"])
+        
+        log_path = Path(project_dir) / ".tune" / "bench.log"
+        if log_path.exists():
+            log_path.unlink()
+        try:
+            await self._run_command(command, cwd=Path(project_dir))
+        except subprocess.CalledProcessError as e:
+            logger.info(f"Benchmark layout {layout} failed: {str(e.output).strip()[-200:]}")
+            return None
+        performance = read_log_performance(log_path)
+        return performance["ns_per_day"] if performance else None
+    
+    def output_prefix(self, phase: str) -> str:
+        """Prefix of the files a phase writes (em, nvt, npt, md)"""
+        return self._phase_config(Path("."), phase)["output_prefix"]
+    
+    def _phase_config(self, project_dir: Path, phase: str) -> Dict[str, str]:
+        """MDP, input structure and output prefix of a simulation phase"""
         phase_configs = {
             "minimization": {
                 "mdp": "minimization.mdp",
@@ -423,63 +1075,7 @@ gen_vel                 = no           ; Velocity generation is off
         if phase not in phase_configs:
             raise ValueError(f"Unknown simulation phase: {phase}")
         
-        phase_config = phase_configs[phase]
-        
-        # Step 1: grompp (preprocessing)
-        yield f"Preprocessing {phase} simulation...\n"
-        
-        grompp_cmd = [
-            self.gmx_command, "grompp",
-            "-f", phase_config["mdp"],
-            "-c", phase_config["input_gro"],
-            "-p", "topol.top",
-            "-o", f"{phase_config['output_prefix']}.tpr"
-        ]
-        
-        try:
-            await self._run_command(grompp_cmd, cwd=project_dir)
-            yield f"Preprocessing completed successfully\n"
-        except subprocess.CalledProcessError as e:
-            yield f"Preprocessing failed: {e}\n"
-            raise
-        
-        # Step 2: mdrun (actual simulation)
-        yield f"Starting {phase} simulation...\n"
-        
-        mdrun_cmd = [
-            self.gmx_command, "mdrun",
-            "-s", f"{phase_config['output_prefix']}.tpr",
-            "-o", f"{phase_config['output_prefix']}.trr",
-            "-c", f"{phase_config['output_prefix']}.gro",
-            "-e", f"{phase_config['output_prefix']}.edr",
-            "-g", f"{phase_config['output_prefix']}.log",
-            "-v"  # Verbose output
-        ]
-        
-        # Add GPU/CPU specific flags
-        if config.get("gpu_enabled", True):
-            mdrun_cmd.extend(["-nb", "gpu"])
-        else:
-            mdrun_cmd.extend(["-nb", "cpu"])
-        
-        # Add threading options
-        if config.get("ntomp"):
-            mdrun_cmd.extend(["-ntomp", str(config["ntomp"])])
-        
-        if config.get("ntmpi"):
-            mdrun_cmd.extend(["-ntmpi", str(config["ntmpi"])])
-        
-        # Run mdrun with real-time output
-        async for line in self._run_command_with_output(mdrun_cmd, cwd=project_dir):
-            yield line
-            
-            # Parse progress from GROMACS output
-            if progress_callback:
-                progress = self._parse_progress_from_output(line)
-                if progress is not None:
-                    await progress_callback(progress)
-        
-        yield f"{phase} simulation completed successfully\n"
+        return phase_configs[phase]
     
     async def _run_command(self, command: List[str], cwd: Path) -> str:
         """Run a command and return output"""
@@ -498,35 +1094,34 @@ gen_vel                 = no           ; Velocity generation is off
         
         return stdout.decode()
     
-    async def _run_command_with_output(self, command: List[str], cwd: Path) -> AsyncGenerator[str, None]:
-        """Run a command and yield output line by line"""
+    async def _run_command_with_output(self, command: List[str], cwd: Path, on_start=None) -> AsyncGenerator[str, None]:
+        """
+        Run a command and yield output line by line. mdrun -v rewrites its
+        progress line with carriage returns, so "\r" also ends a line.
+        """
         process = await asyncio.create_subprocess_exec(
             *command,
             cwd=cwd,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT
         )
+        if on_start is not None:
+            on_start(process.pid)
         
+        pending = b""
         while True:
-            line = await process.stdout.readline()
-            if not line:
+            chunk = await process.stdout.read(65536)
+            if not chunk:
                 break
-            yield line.decode()
+            lines = LINE_BREAK.split(pending + chunk)
+            pending = lines.pop()
+            for line in lines:
+                if line:
+                    yield line.decode(errors="replace") + "\n"
+        if pending:
+            yield pending.decode(errors="replace") + "\n"
         
         await process.wait()
         
         if process.returncode != 0:
             raise subprocess.CalledProcessError(process.returncode, command)
-    
-    def _parse_progress_from_output(self, line: str) -> Optional[float]:
-        """Parse simulation progress from GROMACS output"""
-        # Look for progress indicators in GROMACS output
-        # Example: "Step 12500, time 25.000 (ps), lambda 0"
-        step_match = re.search(r'Step\s+(\d+)', line)
-        if step_match:
-            current_step = int(step_match.group(1))
-            # This is a simplified progress calculation
-            # In real implementation, you'd need to know total steps
-            return min(100.0, (current_step / 50000) * 100)
-        
-        return None
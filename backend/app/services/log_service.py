@@ -0,0 +1,149 @@
+import os
+import re
+import time
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Default number of bytes returned by one page of a log
+DEFAULT_PAGE_BYTES = int(os.getenv("LOG_PAGE_BYTES", str(256 * 1024)))
+
+# Block size used when scanning a log backwards or forwards
+READ_BLOCK_BYTES = 64 * 1024
+
+# Longest regular expression accepted by grep
+MAX_GREP_PATTERN = 200
+
+# Bytes of each line a regular expression is matched against
+GREP_LINE_BYTES = 4096
+
+# Seconds one grep call may spend matching before it returns what it has
+GREP_TIME_BUDGET = float(os.getenv("LOG_GREP_TIME_BUDGET", "2"))
+
+
+class LogService:
+    """
+    Cursor-based access to simulation log files.
+
+    Every call costs O(bytes returned or scanned), never O(file size):
+    clients page forward with byte offsets, tail by seeking backwards from
+    the end, and filter with a streaming grep.
+    """
+
+    def __init__(self, logs_dir: str = "logs"):
+        self.logs_dir = logs_dir
+
+    def log_path(self, project_id: str) -> str:
+        return os.path.join(self.logs_dir, f"{project_id}.log")
+
+    def read_range(self, path: str, since: int = 0, limit: int = DEFAULT_PAGE_BYTES) -> Dict:
+        """
+        Read up to `limit` bytes starting at byte offset `since`. The page is
+        cut at the last complete line so lines are never split between pages.
+        """
+        size = os.path.getsize(path)
+        since = min(max(0, since), size)
+
+        with open(path, "rb") as f:
+            f.seek(since)
+            data = f.read(limit)
+
+        # Keep a trailing partial line for the next poll, unless it is all we have
+        if data and not data.endswith(b"\n"):
+            cut = data.rfind(b"\n")
+            if cut >= 0:
+                data = data[:cut + 1]
+            elif since + len(data) == size:
+                # Line still being written; wait for its newline
+                data = b""
+
+        return {
+            "offset": since,
+            "next_offset": since + len(data),
+            "size": size,
+            "logs": data.decode("utf-8", errors="replace")
+        }
+
+    def tail(self, path: str, lines: int) -> Dict:
+        """Last `lines` lines of a file, found by reading blocks backwards from the end"""
+        size = os.path.getsize(path)
+        position = size
+        data = b""
+
+        with open(path, "rb") as f:
+            # One extra newline is needed to know where the first wanted line starts
+            while position > 0 and data.count(b"\n") <= lines:
+                block = min(READ_BLOCK_BYTES, position)
+                position -= block
+                f.seek(position)
+                data = f.read(block) + data
+
+        # Split off whole lines; the last element is the (possibly empty) partial line
+        parts = data.split(b"\n")
+        complete = parts[:-1]
+        if position > 0:
+            # The first element may be a partial line cut by the block boundary
+            complete = complete[1:]
+        selected = complete[-lines:] if lines > 0 else []
+        body = b"".join(line + b"\n" for line in selected)
+        end = size - len(parts[-1])
+
+        return {
+            "offset": end - len(body),
+            "next_offset": end,
+            "size": size,
+            "logs": body.decode("utf-8", errors="replace")
+        }
+
+    def grep(
+        self,
+        path: str,
+        pattern: str,
+        since: int = 0,
+        limit: int = DEFAULT_PAGE_BYTES,
+        max_matches: int = 1000,
+        ignore_case: bool = False,
+        regex: bool = False
+    ) -> Dict:
+        """
+        Stream the file from `since`, returning lines that contain `pattern`,
+        or with `regex` match it as a regular expression. At most `limit`
+        bytes and GREP_TIME_BUDGET seconds are spent per call; `next_offset`
+        tells the client where to resume.
+
+        Patterns come from clients, so regular expressions are capped at
+        MAX_GREP_PATTERN characters and matched against the first
+        GREP_LINE_BYTES of each line, bounding the cost of backtracking.
+        """
+        if regex and len(pattern) > MAX_GREP_PATTERN:
+            raise re.error(f"pattern longer than {MAX_GREP_PATTERN} characters")
+        source = pattern.encode("utf-8")
+        compiled = re.compile(source if regex else re.escape(source), re.IGNORECASE if ignore_case else 0)
+        line_bytes = GREP_LINE_BYTES if regex else None
+        deadline = time.monotonic() + GREP_TIME_BUDGET
+        size = os.path.getsize(path)
+        since = min(max(0, since), size)
+        matches: List[Dict] = []
+        position = since
+
+        with open(path, "rb") as f:
+            f.seek(since)
+            while position - since < limit and len(matches) < max_matches and time.monotonic() < deadline:
+                line = f.readline()
+                if not line or not line.endswith(b"\n"):
+                    break
+                if compiled.search(line[:line_bytes]):
+                    matches.append({
+                        "offset": position,
+                        "line": line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+                    })
+                position += len(line)
+
+        return {
+            "offset": since,
+            "next_offset": position,
+            "size": size,
+            "pattern": pattern,
+            "matches": matches
+        }
@@ -0,0 +1,216 @@
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stage timings of a project's last pipeline run
+PIPELINE_FILE = "pipeline.json"
+
+
+class StageStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    CANCELLED = "cancelled"
+
+
+class PipelineStage:
+    """
+    One node of a pipeline: a coroutine run once all its dependencies completed
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[Any]],
+        after: List[str],
+        required: bool = True
+    ):
+        self.name = name
+        self.run = run
+        self.after = after
+        # A failed optional stage (a check or plot) does not stop the pipeline
+        self.required = required
+        self.status = StageStatus.PENDING
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "after": self.after,
+            "required": self.required,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_s": round(self.duration, 3) if self.duration is not None else None,
+            "result": self.result if isinstance(self.result, (dict, list, str, int, float, type(None))) else None,
+            "error": self.error
+        }
+
+
+class Pipeline:
+    """
+    Stage graph of a simulation run.
+
+    Every stage starts as soon as the stages it comes after have completed,
+    so independent work (checks of a finished phase, analysis of a finished
+    production segment) overlaps with the run of the next phase. Stages can
+    be added while the pipeline runs. Start and end times of each stage are
+    written to PIPELINE_FILE, together with the critical path: the chain of
+    dependent stages with the largest total duration.
+    """
+
+    def __init__(self, project_dir: str):
+        self.project_dir = Path(project_dir)
+        self.stages: Dict[str, PipelineStage] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._changed = asyncio.Event()
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[Any]],
+        after: Optional[List[str]] = None,
+        required: bool = True
+    ) -> PipelineStage:
+        if name in self.stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        after = [dep for dep in (after or []) if dep is not None]
+        for dep in after:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} comes after unknown stage {dep}")
+        stage = self.stages[name] = PipelineStage(name, run, after, required)
+        self._changed.set()
+        return stage
+
+    def _ready(self, stage: PipelineStage) -> bool:
+        return all(self.stages[dep].status == StageStatus.COMPLETED for dep in stage.after)
+
+    def _blocked(self, stage: PipelineStage) -> bool:
+        """A dependency failed or was skipped, so the stage can never run"""
+        return any(
+            self.stages[dep].status in (StageStatus.FAILED, StageStatus.SKIPPED, StageStatus.CANCELLED)
+            for dep in stage.after
+        )
+
+    async def _run_stage(self, stage: PipelineStage) -> None:
+        stage.status = StageStatus.RUNNING
+        stage.started_at = time.time()
+        self.save()
+        try:
+            stage.result = await stage.run()
+            stage.status = StageStatus.COMPLETED
+        except asyncio.CancelledError:
+            stage.status = StageStatus.CANCELLED
+            raise
+        except Exception as e:
+            stage.status = StageStatus.FAILED
+            stage.error = str(e)
+            if stage.required:
+                raise
+            logger.warning(f"Optional pipeline stage {stage.name} failed: {e}")
+        finally:
+            stage.finished_at = time.time()
+            self._changed.set()
+            self.save()
+
+    async def run(self) -> Dict[str, PipelineStage]:
+        """Run all stages; raises the error of the first required stage that fails"""
+        self.started_at = time.time()
+        try:
+            while True:
+                self._changed.clear()
+                for stage in self.stages.values():
+                    if stage.status != StageStatus.PENDING or stage.name in self._tasks:
+                        continue
+                    if self._blocked(stage):
+                        stage.status = StageStatus.SKIPPED
+                        self._changed.set()
+                    elif self._ready(stage):
+                        self._tasks[stage.name] = asyncio.create_task(self._run_stage(stage))
+
+                running = [task for task in self._tasks.values() if not task.done()]
+                for task in self._tasks.values():
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                if not running and not self._changed.is_set():
+                    break
+                # Wake up when a stage finishes or a stage is added
+                changed = asyncio.create_task(self._changed.wait())
+                await asyncio.wait([changed, *running], return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+        except BaseException:
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.finished_at = time.time()
+            self.save()
+        return self.stages
+
+    def critical_path(self) -> Dict:
+        """Chain of dependent stages with the largest total duration"""
+        longest: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        # Stages are added after their dependencies, so insertion order is topological
+        for name, stage in self.stages.items():
+            best = max(stage.after, key=lambda dep: longest[dep], default=None)
+            previous[name] = best
+            longest[name] = (stage.duration or 0.0) + (longest[best] if best else 0.0)
+
+        if not longest:
+            return {"stages": [], "duration_s": 0.0}
+        end = max(longest, key=longest.get)
+        path = []
+        while end is not None:
+            path.append(end)
+            end = previous[end]
+        path.reverse()
+        return {"stages": path, "duration_s": round(longest[path[-1]], 3)}
+
+    def to_dict(self) -> Dict:
+        finished = self.finished_at or time.time()
+        busy = sum(stage.duration or 0.0 for stage in self.stages.values())
+        wall = finished - self.started_at if self.started_at else 0.0
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wall_s": round(wall, 3),
+            # Above 1 when stages overlapped
+            "concurrency": round(busy / wall, 2) if wall > 0 else None,
+            "critical_path": self.critical_path(),
+            "stages": [stage.to_dict() for stage in self.stages.values()]
+        }
+
+    def save(self) -> None:
+        try:
+            with open(self.project_dir / PIPELINE_FILE, "w") as f:
+                json.dump(self.to_dict(), f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write pipeline timings: {e}")
+
+
+def read_pipeline(project_dir: str) -> Optional[Dict]:
+    try:
+        with open(Path(project_dir) / PIPELINE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
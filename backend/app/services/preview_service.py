@@ -0,0 +1,202 @@
+import os
+import json
+import math
+import zlib
+import struct
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.analysis_service import TrajectoryReader
+from app.utils.gromacs_utils import read_mdp
+
+logger = logging.getLogger(__name__)
+
+# Atoms shown by the viewer: everything but water and ions
+PREVIEW_SELECTION = os.getenv(
+    "PREVIEW_SELECTION",
+    "not resname SOL WAT HOH TIP3 TIP4 TIP5 SPC SPCE NA CL K NA+ CL- SOD CLA POT"
+)
+
+# Frames kept in a preview, whatever the length of the simulation
+PREVIEW_MAX_FRAMES = int(os.getenv("PREVIEW_MAX_FRAMES", "500"))
+
+# Coordinate quantization step (nm)
+PREVIEW_PRECISION = float(os.getenv("PREVIEW_PRECISION", "0.01"))
+
+# Files of a project's preview, in PREVIEW_DIR of the project
+PREVIEW_DIR = "preview"
+MANIFEST = "preview.json"
+STRUCTURE = "structure.pdb"
+FRAMES = "frames.bin"
+
+# Per-frame record header: time (ps), origin (nm, xyz), scale (nm), payload bytes
+FRAME_HEADER = struct.Struct("<d3ffI")
+
+FORMAT_VERSION = 1
+
+
+def encode_frame(positions: np.ndarray, time_ps: float, precision: float = PREVIEW_PRECISION) -> bytes:
+    """
+    One preview frame record. Coordinates (nm) are quantized to 16 bits per
+    axis relative to the frame's bounding box, laid out axis by axis and
+    delta-encoded along the atoms, which are mostly bonded neighbours, before
+    zlib compression.
+    """
+    if not len(positions):
+        raise ValueError("A preview frame needs at least one atom")
+    origin = positions.min(axis=0)
+    extent = float((positions.max(axis=0) - origin).max())
+    scale = max(precision, extent / 65535)
+    quantized = np.rint((positions - origin) / scale).astype(np.uint16).T
+    # Differences wrap around modulo 2**16; decoding is a cumulative sum with the same wrap
+    deltas = np.diff(quantized, axis=1, prepend=np.zeros((3, 1), dtype=np.uint16))
+    payload = zlib.compress(np.ascontiguousarray(deltas).astype("<u2").tobytes(), 6)
+    return FRAME_HEADER.pack(time_ps, *origin.astype(np.float32), scale, len(payload)) + payload
+
+
+def decode_frame(record: bytes, n_atoms: int) -> Dict:
+    """Time and (n_atoms, 3) coordinates in nm of an encode_frame record"""
+    time_ps, ox, oy, oz, scale, length = FRAME_HEADER.unpack_from(record)
+    payload = record[FRAME_HEADER.size:FRAME_HEADER.size + length]
+    deltas = np.frombuffer(zlib.decompress(payload), dtype="<u2").reshape(3, n_atoms)
+    quantized = np.cumsum(deltas, axis=1, dtype=np.uint16)
+    positions = quantized.T.astype(np.float32) * np.float32(scale) + np.array([ox, oy, oz], dtype=np.float32)
+    return {"time_ps": time_ps, "positions": positions}
+
+
+def planned_time_ps(mdp_path: Path) -> Optional[float]:
+    """Simulated time of a phase according to its .mdp, if known"""
+    try:
+        params = read_mdp(mdp_path)
+        return int(params["nsteps"]) * float(params.get("dt", 0.001))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def read_manifest(project_dir: str) -> Optional[Dict]:
+    try:
+        with open(Path(project_dir) / PREVIEW_DIR / MANIFEST, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class PreviewBuilder:
+    """
+    Keeps a small preview of a project's trajectory up to date for the viewer.
+
+    Each update appends the frames written since the last one, on a time
+    stride chosen so the planned simulation fits in `max_frames`; should the
+    preview still outgrow that (longer runs, appended segments), every other
+    frame is dropped and the stride doubled. Only the `selection` atoms are
+    kept, with quantized, compressed coordinates. The manifest lists the
+    byte offset of each frame record in the frames file, so the viewer can
+    fetch any frame with a range request.
+    """
+
+    def __init__(
+        self,
+        project_dir: str,
+        max_frames: int = PREVIEW_MAX_FRAMES,
+        precision: float = PREVIEW_PRECISION
+    ):
+        self.dir = Path(project_dir) / PREVIEW_DIR
+        self.max_frames = max_frames
+        self.precision = precision
+
+    def _start(self, reader: TrajectoryReader, planned_ps: Optional[float]) -> Dict:
+        """Empty preview of the reader's trajectory, with its structure file"""
+        self.dir.mkdir(exist_ok=True)
+        dt = reader.dt
+        stride_ps = dt
+        if planned_ps:
+            stride_ps = max(1, math.ceil(planned_ps / self.max_frames / dt)) * dt
+
+        reader.universe.trajectory[0]
+        reader.atoms.write(str(self.dir / STRUCTURE))
+        (self.dir / FRAMES).write_bytes(b"")
+        return {
+            "format": FORMAT_VERSION,
+            "version": 0,
+            "trajectory": Path(reader.trajectory).name,
+            "selection": reader.selection,
+            "n_atoms": reader.n_atoms,
+            "precision_nm": self.precision,
+            "stride_ps": stride_ps,
+            "frames": []
+        }
+
+    def update(self, reader: TrajectoryReader, planned_ps: Optional[float] = None) -> Dict:
+        """
+        Append the frames of `reader` past the end of the preview and return
+        the manifest. Raises ValueError while the trajectory has no frames.
+        """
+        if reader.n_frames == 0:
+            raise ValueError(f"Trajectory {Path(reader.trajectory).name} has no frames yet")
+        manifest = read_manifest(str(self.dir.parent))
+        if (manifest is None or manifest.get("format") != FORMAT_VERSION
+                or manifest["trajectory"] != Path(reader.trajectory).name
+                or manifest["selection"] != reader.selection
+                or manifest["n_atoms"] != reader.n_atoms
+                or not (self.dir / FRAMES).exists()):
+            manifest = self._start(reader, planned_ps)
+
+        frames: List[Dict] = manifest["frames"]
+        last_time = reader.start_time + (reader.n_frames - 1) * reader.dt
+        if frames and frames[-1]["time_ps"] > last_time + 1e-6:
+            # A run from scratch has overwritten the trajectory
+            manifest = self._start(reader, planned_ps)
+            frames = manifest["frames"]
+
+        stride = max(1, round(manifest["stride_ps"] / reader.dt))
+        start_time = frames[-1]["time_ps"] + manifest["stride_ps"] if frames else None
+        added = 0
+        with open(self.dir / FRAMES, "ab") as out:
+            offset = out.tell()
+            for chunk in reader.iter_chunks(stride=stride, start_time=start_time):
+                for time_ps, positions in zip(chunk.times, chunk.positions):
+                    record = encode_frame(positions, float(time_ps), self.precision)
+                    out.write(record)
+                    frames.append({"time_ps": round(float(time_ps), 6), "offset": offset, "length": len(record)})
+                    offset += len(record)
+                    added += 1
+
+        if len(frames) > self.max_frames:
+            manifest = self._decimate(manifest)
+        if added or manifest["version"] == 0:
+            manifest["version"] += 1
+            self._save(manifest)
+            logger.info(
+                f"Preview of {manifest['trajectory']}: {len(manifest['frames'])} frames "
+                f"of {manifest['n_atoms']} atoms (+{added})"
+            )
+        return manifest
+
+    def _decimate(self, manifest: Dict) -> Dict:
+        """Halve the frame rate until the preview fits in max_frames"""
+        frames = manifest["frames"]
+        while len(frames) > self.max_frames:
+            frames = frames[::2]
+            manifest["stride_ps"] *= 2
+
+        tmp_path = self.dir / f"{FRAMES}.tmp"
+        kept = []
+        with open(self.dir / FRAMES, "rb") as src, open(tmp_path, "wb") as dst:
+            for frame in frames:
+                src.seek(frame["offset"])
+                kept.append({**frame, "offset": dst.tell()})
+                dst.write(src.read(frame["length"]))
+        # Responses still streaming the old file keep reading its inode
+        os.replace(tmp_path, self.dir / FRAMES)
+        manifest["frames"] = kept
+        return manifest
+
+    def _save(self, manifest: Dict) -> None:
+        manifest["size"] = (self.dir / FRAMES).stat().st_size
+        tmp_path = self.dir / f"{MANIFEST}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.dir / MANIFEST)
@@ -0,0 +1,122 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+
+from app.api.projects import Project, Simulation
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of buffered progress updates
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "2"))
+
+# Number of rows with pending updates that triggers an early flush
+PROGRESS_FLUSH_MAX_PENDING = int(os.getenv("PROGRESS_FLUSH_MAX_PENDING", "500"))
+
+MODELS = {"project": Project, "simulation": Simulation}
+
+
+class ProgressWriter:
+    """
+    Write-behind buffer for progress and performance metrics.
+
+    Updates are merged per row in memory, so a job reporting progress on
+    every mdrun line still costs one row update per flush. All pending rows
+    are written in a single transaction every PROGRESS_FLUSH_INTERVAL
+    seconds, or earlier once PROGRESS_FLUSH_MAX_PENDING rows are waiting.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        flush_interval: float = PROGRESS_FLUSH_INTERVAL,
+        max_pending: int = PROGRESS_FLUSH_MAX_PENDING
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending: Dict[Tuple[str, str], Dict] = {}
+        self.flushes = 0
+        self.rows_written = 0
+        self.updates_received = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def record(self, kind: str, row_id: str, **values) -> None:
+        """Buffer new values for a project or simulation row; later values win"""
+        self.pending.setdefault((kind, row_id), {}).update(values)
+        self.updates_received += 1
+        if len(self.pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def finish(self, kind: str, row_id: str, **values) -> None:
+        """Record final values (e.g. status) and write everything pending now"""
+        self.record(kind, row_id, **values)
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Progress flush failed: {e}")
+
+    async def flush(self) -> int:
+        """Write all buffered rows in one transaction; returns the number of rows"""
+        async with self._flush_lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+
+            now = datetime.now(timezone.utc)
+            rows: Dict[str, list] = {}
+            for (kind, row_id), values in batch.items():
+                rows.setdefault(kind, []).append({"id": row_id, "updated_at": now, **values})
+
+            try:
+                async with self.session_factory() as session:
+                    for kind, params in rows.items():
+                        # ORM bulk UPDATE by primary key: one executemany per model
+                        await session.execute(update(MODELS[kind]), params)
+                    await session.commit()
+            except Exception:
+                # Put the batch back without overwriting anything newer
+                for key, values in batch.items():
+                    self.pending[key] = {**values, **self.pending.get(key, {})}
+                raise
+
+            self.flushes += 1
+            self.rows_written += len(batch)
+            return len(batch)
+
+    def stats(self) -> Dict:
+        return {
+            "pending_rows": len(self.pending),
+            "updates_received": self.updates_received,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes
+        }
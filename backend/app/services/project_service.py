@@ -0,0 +1,310 @@
+import json
+import base64
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.orm import selectinload
+
+from app.api.projects import Project, ProjectFile, ProjectStatus, Simulation
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Page size limits of the project list
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: datetime, project_id: str) -> str:
+    """Opaque keyset cursor pointing just after a project"""
+    raw = json.dumps([created_at.isoformat(), project_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, project_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), project_id
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def file_to_dict(project_file: ProjectFile) -> Dict:
+    return {
+        "filename": project_file.filename,
+        "file_type": project_file.file_type,
+        "size": project_file.file_size,
+        "upload_time": _isoformat(project_file.uploaded_at),
+        "checksum": project_file.checksum,
+        "is_validated": project_file.is_validated,
+        "validation_errors": project_file.validation_errors
+    }
+
+
+def simulation_to_dict(simulation: Simulation) -> Dict:
+    return {
+        "id": simulation.id,
+        "name": simulation.name,
+        "simulation_type": simulation.simulation_type,
+        "status": simulation.status.value,
+        "progress_percentage": simulation.progress_percentage,
+        "performance_ns_per_day": simulation.performance_ns_per_day,
+        "cpu_usage_percent": simulation.cpu_usage_percent,
+        "memory_usage_mb": simulation.memory_usage_mb,
+        "started_at": _isoformat(simulation.started_at),
+        "completed_at": _isoformat(simulation.completed_at)
+    }
+
+
+def project_to_dict(project: Project) -> Dict:
+    return {
+        "id": project.id,
+        "name": project.name,
+        "description": project.description,
+        "created_at": _isoformat(project.created_at),
+        "status": project.status.value,
+        "config": project.config,
+        "progress_percentage": project.progress_percentage,
+        "cpu_hours": project.cpu_hours,
+        "memory_peak_mb": project.memory_peak_mb,
+        # Latest step, simulated time, ETA and ns/day of the running phase
+        "progress": (project.metadata_info or {}).get("progress"),
+        "files": [file_to_dict(f) for f in project.files],
+        "simulations": [
+            simulation_to_dict(s) for s in sorted(project.simulations, key=lambda s: s.created_at)
+        ]
+    }
+
+
+class ProjectRepository:
+    """
+    Project persistence on the async engine.
+
+    Every call uses its own short-lived session from the pool. Files and
+    simulations are loaded with selectinload, so a page of projects costs
+    three queries regardless of its size.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    def _with_relations(self, query):
+        return query.options(selectinload(Project.files), selectinload(Project.simulations))
+
+    async def create(self, project_id: str, name: str, description: Optional[str] = "") -> Dict:
+        project = Project(
+            id=project_id,
+            name=name,
+            description=description,
+            status=ProjectStatus.CREATED,
+            # Set here rather than by the server so keyset cursors keep sub-second order
+            created_at=datetime.now(timezone.utc),
+            updated_at=datetime.now(timezone.utc)
+        )
+        async with self.session_factory() as session:
+            session.add(project)
+            await session.commit()
+        return await self.get(project_id)
+
+    async def get(self, project_id: str) -> Optional[Dict]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                self._with_relations(select(Project).where(Project.id == project_id))
+            )
+            project = result.scalar_one_or_none()
+            return project_to_dict(project) if project else None
+
+    async def get_many(self, project_ids: List[str]) -> List[Dict]:
+        """Several projects in one query, in the order given"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                self._with_relations(select(Project).where(Project.id.in_(project_ids)))
+            )
+            found = {p.id: project_to_dict(p) for p in result.scalars().all()}
+        return [found[i] for i in project_ids if i in found]
+
+    async def exists(self, project_id: str) -> bool:
+        async with self.session_factory() as session:
+            result = await session.execute(select(Project.id).where(Project.id == project_id))
+            return result.scalar_one_or_none() is not None
+
+    async def list(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        status: Optional[ProjectStatus] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None
+    ) -> Dict:
+        """
+        One page of projects, newest first. Pass the returned `next_cursor`
+        to get the following page; the cost of a page does not grow with
+        its position in the list.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = select(Project)
+
+        if status is not None:
+            query = query.where(Project.status == status)
+        if created_after is not None:
+            query = query.where(Project.created_at >= created_after)
+        if created_before is not None:
+            query = query.where(Project.created_at < created_before)
+        if cursor:
+            created_at, project_id = decode_cursor(cursor)
+            query = query.where(or_(
+                Project.created_at < created_at,
+                and_(Project.created_at == created_at, Project.id < project_id)
+            ))
+
+        # Fetch one extra row to know whether another page exists
+        query = self._with_relations(
+            query.order_by(Project.created_at.desc(), Project.id.desc()).limit(limit + 1)
+        )
+
+        async with self.session_factory() as session:
+            rows = (await session.execute(query)).scalars().all()
+
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+        return {
+            "projects": [project_to_dict(p) for p in page],
+            "next_cursor": next_cursor,
+            "limit": limit
+        }
+
+    async def set_status(self, project_id: str, status: ProjectStatus) -> None:
+        values = {"status": status, "updated_at": datetime.now(timezone.utc)}
+        if status == ProjectStatus.RUNNING:
+            values["started_at"] = datetime.now(timezone.utc)
+        elif status in (ProjectStatus.COMPLETED, ProjectStatus.FAILED, ProjectStatus.CANCELLED):
+            values["completed_at"] = datetime.now(timezone.utc)
+
+        async with self.session_factory() as session:
+            await session.execute(update(Project).where(Project.id == project_id).values(**values))
+            await session.commit()
+
+    async def set_config(self, project_id: str, config: Dict) -> None:
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Project)
+                .where(Project.id == project_id)
+                .values(config=config, status=ProjectStatus.CONFIGURED, updated_at=datetime.now(timezone.utc))
+            )
+            await session.commit()
+
+    async def record_file(
+        self,
+        project_id: str,
+        filename: str,
+        file_path: str,
+        size: int,
+        checksum: Optional[str]
+    ) -> Tuple[Dict, List[str]]:
+        """
+        Add a file to a project, replacing any previous file of the same
+        name. Returns the new file and the checksums of replaced files.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(ProjectFile.checksum)
+                .where(ProjectFile.project_id == project_id, ProjectFile.filename == filename)
+            )
+            replaced = [c for c in result.scalars().all() if c]
+            await session.execute(
+                delete(ProjectFile)
+                .where(ProjectFile.project_id == project_id, ProjectFile.filename == filename)
+            )
+
+            project_file = ProjectFile(
+                project_id=project_id,
+                filename=filename,
+                original_filename=filename,
+                file_type=filename[filename.rfind("."):].lower() if "." in filename else "",
+                file_path=file_path,
+                file_size=size,
+                checksum=checksum,
+                uploaded_at=datetime.now(timezone.utc)
+            )
+            session.add(project_file)
+            await session.commit()
+            return file_to_dict(project_file), replaced
+
+    async def create_simulation(self, simulation_id: str, project_id: str, phase: str, config: Dict) -> None:
+        """Record the start of one simulation phase"""
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as session:
+            session.add(Simulation(
+                id=simulation_id,
+                project_id=project_id,
+                name=f"{phase} ({project_id[:8]})",
+                simulation_type=phase,
+                config=config,
+                status=ProjectStatus.RUNNING,
+                started_at=now,
+                created_at=now,
+                updated_at=now
+            ))
+            await session.commit()
+
+    async def list_active(self) -> List[Dict]:
+        """Id, status and config of queued and running projects, oldest first"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Project.id, Project.status, Project.config)
+                .where(Project.status.in_([ProjectStatus.QUEUED, ProjectStatus.RUNNING]))
+                .order_by(Project.created_at, Project.id)
+            )
+            return [
+                {"id": project_id, "status": status.value, "config": config}
+                for project_id, status, config in result.all()
+            ]
+
+    async def interrupt_simulations(self, project_id: str, reason: str) -> None:
+        """Close the simulations a lost job left running"""
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Simulation)
+                .where(Simulation.project_id == project_id, Simulation.status == ProjectStatus.RUNNING)
+                .values(status=ProjectStatus.CANCELLED, error_message=reason, completed_at=now, updated_at=now)
+            )
+            await session.commit()
+
+    async def set_file_validation(self, project_id: str, filename: str, checksum: Optional[str], issues: List[Dict]) -> bool:
+        """
+        Record the validation issues of a file; it counts as validated when
+        none is an error. Returns False if the file was replaced meanwhile.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(ProjectFile)
+                .where(
+                    ProjectFile.project_id == project_id,
+                    ProjectFile.filename == filename,
+                    ProjectFile.checksum == checksum if checksum is not None else ProjectFile.checksum.is_(None)
+                )
+                .values(
+                    is_validated=not any(issue["severity"] == "error" for issue in issues),
+                    validation_errors=issues
+                )
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def list_files(self, project_id: str) -> List[Dict]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(ProjectFile).where(ProjectFile.project_id == project_id).order_by(ProjectFile.id)
+            )
+            return [file_to_dict(f) for f in result.scalars().all()]
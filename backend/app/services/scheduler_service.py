@@ -0,0 +1,379 @@
+import os
+import asyncio
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Extra simulated time (ns) spent in the NVT and NPT equilibration phases
+EQUILIBRATION_TIME_NS = 0.2
+
+# Seconds a finished job stays available for status queries
+JOB_RETENTION = float(os.getenv("SCHEDULER_JOB_RETENTION", "86400"))
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+class SimulationJob:
+    """
+    A simulation waiting for, or holding, a set of CPU cores
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        config: Dict,
+        runner: Callable[["SimulationJob"], Awaitable[None]],
+        cores_requested: int,
+        estimated_runtime: float
+    ):
+        self.id = str(uuid.uuid4())
+        self.project_id = project_id
+        self.config = config
+        self.runner = runner
+        self.cores_requested = cores_requested
+        self.estimated_runtime = estimated_runtime
+        self.status = JobStatus.QUEUED
+        self.cores: List[int] = []
+        self.backfilled = False
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def pin_offset(self) -> Optional[int]:
+        """First core of the allotted block, passed to mdrun as -pinoffset"""
+        return self.cores[0] if self.cores else None
+
+    @property
+    def estimated_end(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return self.started_at + self.estimated_runtime
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "project_id": self.project_id,
+            "status": self.status,
+            "cores_requested": self.cores_requested,
+            "cores": self.cores,
+            "pin_offset": self.pin_offset,
+            "backfilled": self.backfilled,
+            "estimated_runtime_s": round(self.estimated_runtime, 1),
+            "submitted_at": _isoformat(self.submitted_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "error": self.error
+        }
+
+
+class SimulationScheduler:
+    """
+    Core-aware job scheduler for GROMACS simulations.
+
+    Jobs are admitted first-come first-served onto disjoint, contiguous core
+    blocks so that concurrent mdrun processes can be pinned without
+    oversubscribing the host. Smaller jobs further back in the queue are
+    backfilled into idle cores as long as they do not delay the job at the
+    head of the queue (EASY backfilling).
+    """
+
+    def __init__(
+        self,
+        total_cores: Optional[int] = None,
+        max_concurrent: Optional[int] = None,
+        ns_per_day_per_core: Optional[float] = None
+    ):
+        self.total_cores = (
+            total_cores
+            or int(os.getenv("SCHEDULER_TOTAL_CORES") or 0)
+            or os.cpu_count()
+            or 1
+        )
+        # 0 means the number of concurrent jobs is bounded only by cores
+        self.max_concurrent = (
+            max_concurrent if max_concurrent is not None
+            else int(os.getenv("MAX_CONCURRENT_SIMULATIONS") or 0)
+        )
+        # Rough throughput used to estimate runtimes before a job reports real numbers
+        self.ns_per_day_per_core = ns_per_day_per_core or float(
+            os.getenv("SCHEDULER_NS_PER_DAY_PER_CORE", "5.0")
+        )
+
+        self._core_free = [True] * self.total_cores
+        self._queue: List[SimulationJob] = []
+        self._running: Dict[str, SimulationJob] = {}
+        self._jobs: Dict[str, SimulationJob] = {}
+        self._project_jobs: Dict[str, str] = {}
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    def cores_for_config(self, config: Dict) -> int:
+        """Number of cores a job needs: OpenMP threads times thread-MPI ranks"""
+        ntomp = max(1, int(config.get("ntomp") or 1))
+        ntmpi = max(1, int(config.get("ntmpi") or 1))
+        cores = ntomp * ntmpi
+        if cores > self.total_cores:
+            logger.warning(
+                f"Job requests {cores} cores but host has {self.total_cores}, clamping"
+            )
+            cores = self.total_cores
+        return cores
+
+    def estimate_runtime(self, config: Dict, cores: int) -> float:
+        """Estimate wall-clock seconds for the whole simulation pipeline"""
+        if config.get("estimated_runtime_s"):
+            return float(config["estimated_runtime_s"])
+        simulated_ns = float(config.get("total_time", 10.0)) + EQUILIBRATION_TIME_NS
+        ns_per_day = self.ns_per_day_per_core * cores
+        return simulated_ns / ns_per_day * 86400
+
+    def submit(
+        self,
+        project_id: str,
+        config: Dict,
+        runner: Callable[[SimulationJob], Awaitable[None]]
+    ) -> SimulationJob:
+        """
+        Queue a simulation. The runner is awaited once cores are allotted and
+        receives the job, whose `cores` and `pin_offset` describe the allotment.
+        """
+        cores = self.cores_for_config(config)
+        job = SimulationJob(
+            project_id=project_id,
+            config=config,
+            runner=runner,
+            cores_requested=cores,
+            estimated_runtime=self.estimate_runtime(config, cores)
+        )
+        self._prune(job.submitted_at)
+        previous = self._jobs.get(self._project_jobs.get(project_id))
+        if previous is not None and previous.status in JobStatus.FINISHED:
+            # Only the latest job of a project can be looked up
+            del self._jobs[previous.id]
+        self._jobs[job.id] = job
+        self._project_jobs[project_id] = job.id
+        self._queue.append(job)
+        logger.info(f"Queued job {job.id} for project {project_id} ({cores} cores)")
+
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a queued job or cancel a running one"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        if job.status == JobStatus.QUEUED:
+            self._queue.remove(job)
+            job.status = JobStatus.CANCELLED
+            job.finished_at = time.time()
+            self._dispatch()
+            return True
+        if job.status == JobStatus.RUNNING and job.task is not None:
+            job.task.cancel()
+            return True
+        return False
+
+    def _prune(self, now: float) -> None:
+        """Forget jobs finished more than JOB_RETENTION seconds ago"""
+        for job in list(self._jobs.values()):
+            if job.status in JobStatus.FINISHED and job.finished_at < now - JOB_RETENTION:
+                del self._jobs[job.id]
+                if self._project_jobs.get(job.project_id) == job.id:
+                    del self._project_jobs[job.project_id]
+
+    # ------------------------------------------------------------------
+    # Admission and allocation
+    # ------------------------------------------------------------------
+
+    def _find_block(self, size: int, core_free: Optional[List[bool]] = None) -> Optional[int]:
+        """First-fit search for `size` contiguous free cores (of `core_free`, by default the current map)"""
+        run = 0
+        for core, free in enumerate(self._core_free if core_free is None else core_free):
+            run = run + 1 if free else 0
+            if run == size:
+                return core - size + 1
+        return None
+
+    def _has_slot(self) -> bool:
+        return not self.max_concurrent or len(self._running) < self.max_concurrent
+
+    def _reservation(self, job: SimulationJob, now: float) -> Tuple[float, Set[int]]:
+        """
+        Earliest time the head job can start (shadow time) and the core block
+        it will get then. Running jobs are released in order of their
+        estimated end until a contiguous block of the head's size is free.
+        """
+        core_free = list(self._core_free)
+        shadow_time = now
+        for running in [None, *sorted(self._running.values(), key=lambda j: j.estimated_end)]:
+            if running is not None:
+                shadow_time = max(now, running.estimated_end)
+                for core in running.cores:
+                    core_free[core] = True
+            offset = self._find_block(job.cores_requested, core_free)
+            if offset is not None:
+                return shadow_time, set(range(offset, offset + job.cores_requested))
+
+        return float("inf"), set()
+
+    def _dispatch(self) -> None:
+        """Start every queued job that can run now without delaying the head of the queue"""
+        while self._queue and self._has_slot():
+            head = self._queue[0]
+            offset = self._find_block(head.cores_requested)
+            if offset is None:
+                break
+            self._queue.pop(0)
+            self._start(head, offset)
+
+        if not self._queue or not self._has_slot():
+            return
+
+        now = time.time()
+        shadow_time, reserved = self._reservation(self._queue[0], now)
+        # Jobs still running at the shadow time must keep off the head's block
+        outside_reserved = [free and core not in reserved for core, free in enumerate(self._core_free)]
+
+        for job in list(self._queue[1:]):
+            if not self._has_slot():
+                break
+            if now + job.estimated_runtime <= shadow_time:
+                offset = self._find_block(job.cores_requested)
+            else:
+                offset = self._find_block(job.cores_requested, outside_reserved)
+            if offset is None:
+                continue
+
+            for core in range(offset, offset + job.cores_requested):
+                outside_reserved[core] = False
+            self._queue.remove(job)
+            job.backfilled = True
+            self._start(job, offset)
+
+    def _start(self, job: SimulationJob, offset: int) -> None:
+        job.cores = list(range(offset, offset + job.cores_requested))
+        for core in job.cores:
+            self._core_free[core] = False
+
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        self._running[job.id] = job
+        logger.info(
+            f"Starting job {job.id} for project {job.project_id} "
+            f"on cores {job.cores[0]}-{job.cores[-1]}"
+        )
+        job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: SimulationJob) -> None:
+        try:
+            await job.runner(job)
+            job.status = JobStatus.COMPLETED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+            raise
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            logger.error(f"Job {job.id} failed: {str(e)}")
+        finally:
+            job.finished_at = time.time()
+            self._prune(job.finished_at)
+            for core in job.cores:
+                self._core_free[core] = True
+            self._running.pop(job.id, None)
+            self._dispatch()
+
+    # ------------------------------------------------------------------
+    # Queue inspection
+    # ------------------------------------------------------------------
+
+    def get_job(self, job_id: str) -> Optional[SimulationJob]:
+        return self._jobs.get(job_id)
+
+    def job_for_project(self, project_id: str) -> Optional[SimulationJob]:
+        job_id = self._project_jobs.get(project_id)
+        return self._jobs.get(job_id) if job_id else None
+
+    def estimated_start_times(self) -> Dict[str, float]:
+        """
+        Project a start time for every queued job by placing each one, in queue
+        order, into the earliest contiguous core block left free for its whole
+        runtime by running jobs and the jobs queued ahead of it
+        """
+        now = time.time()
+        # (cores, start, end) of running and already placed jobs
+        allotments: List[Tuple[List[int], float, float]] = [
+            (job.cores, now, max(now, job.estimated_end))
+            for job in self._running.values()
+        ]
+
+        starts = {}
+        for job in self._queue:
+            candidates = sorted({now} | {end for _, _, end in allotments if end > now})
+            for t in candidates:
+                end = t + job.estimated_runtime
+                core_free = [True] * self.total_cores
+                for cores, busy_from, busy_until in allotments:
+                    if busy_from < end and busy_until > t:
+                        for core in cores:
+                            core_free[core] = False
+                offset = self._find_block(job.cores_requested, core_free)
+                if offset is not None:
+                    break
+            # Once every allotment has ended all cores are free, so the last candidate always fits
+            starts[job.id] = t
+            allotments.append((list(range(offset, offset + job.cores_requested)), t, end))
+
+        return starts
+
+    def job_info(self, job: SimulationJob) -> Dict:
+        """Job details including queue position and estimated start time"""
+        info = job.to_dict()
+        if job.status == JobStatus.QUEUED:
+            info["queue_position"] = self._queue.index(job) + 1
+            info["estimated_start_time"] = _isoformat(self.estimated_start_times().get(job.id))
+        else:
+            info["queue_position"] = None
+            info["estimated_start_time"] = info["started_at"]
+        return info
+
+    def status(self) -> Dict:
+        """Snapshot of core usage, running jobs and the queue"""
+        starts = self.estimated_start_times()
+        queued = []
+        for position, job in enumerate(self._queue, start=1):
+            info = job.to_dict()
+            info["queue_position"] = position
+            info["estimated_start_time"] = _isoformat(starts.get(job.id))
+            queued.append(info)
+
+        return {
+            "total_cores": self.total_cores,
+            "free_cores": self._core_free.count(True),
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": len(self._queue),
+            "running": [job.to_dict() for job in self._running.values()],
+            "queued": queued
+        }
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
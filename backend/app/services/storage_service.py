@@ -0,0 +1,257 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Root of the content-addressed store; must be on the same filesystem (and
+# mount) as the project directories for hardlinks/reflinks to work
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join("projects", ".blobs"))
+
+# How project files are materialized from blobs: auto (reflink, then
+# hardlink, then copy), reflink, hardlink or copy
+BLOB_LINK_MODE = os.getenv("BLOB_LINK_MODE", "auto").lower()
+
+# ioctl request number for FICLONE (copy-on-write clone) on Linux
+FICLONE = 0x40049409
+
+CHECKSUM_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def temp_path(path: str) -> str:
+    """Hidden temporary name next to `path`, unique per process and thread"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """
+    Copy-on-write clone of src to dst, if the filesystem supports it. The
+    clone is made in a new file renamed over dst: dst may be a hardlink to
+    a blob, whose inode must never be truncated.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    tmp = temp_path(dst)
+    try:
+        with open(src, "rb") as s, open(tmp, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        os.replace(tmp, dst)
+        return True
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+
+
+def clone_file(src: str, dst: str) -> str:
+    """
+    Independent copy of src at dst, sharing data blocks when the filesystem
+    supports copy-on-write. dst is replaced, never written in place.
+    Returns the method used.
+    """
+    if _reflink(src, dst):
+        return "reflink"
+
+    tmp = temp_path(dst)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return "copy"
+
+
+class BlobStore:
+    """
+    Content-addressed file store with reference counting.
+
+    Blobs are keyed by the SHA-256 checksum recorded for every uploaded
+    file. Project directories hold reflinks or hardlinks to the blob, so a
+    receptor uploaded into fifty projects is stored once. Every project path
+    using a blob has a reference file under refs/<checksum>/, and `gc()`
+    deletes blobs whose references are all gone.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR, link_mode: str = BLOB_LINK_MODE):
+        self.root = root
+        self.link_mode = link_mode
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "refs"), exist_ok=True)
+
+    def _check(self, checksum: str) -> str:
+        checksum = checksum.lower()
+        if not CHECKSUM_PATTERN.match(checksum):
+            raise ValueError(f"Invalid checksum: {checksum}")
+        return checksum
+
+    def blob_path(self, checksum: str) -> str:
+        checksum = self._check(checksum)
+        return os.path.join(self.root, "objects", checksum[:2], checksum[2:4], checksum)
+
+    def _ref_dir(self, checksum: str) -> str:
+        return os.path.join(self.root, "refs", self._check(checksum))
+
+    def _ref_path(self, checksum: str, path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return os.path.join(self._ref_dir(checksum), key)
+
+    def has_blob(self, checksum: str) -> bool:
+        return os.path.exists(self.blob_path(checksum))
+
+    def _materialize(self, blob: str, dest: str) -> str:
+        """Create dest from a blob without copying data when possible; returns the method used"""
+        tmp = f"{dest}.blobtmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        if self.link_mode in ("auto", "reflink") and _reflink(blob, tmp):
+            method = "reflink"
+        elif self.link_mode in ("auto", "hardlink"):
+            try:
+                os.link(blob, tmp)
+                method = "hardlink"
+            except OSError:
+                shutil.copyfile(blob, tmp)
+                method = "copy"
+        else:
+            shutil.copyfile(blob, tmp)
+            method = "copy"
+
+        os.replace(tmp, dest)
+        return method
+
+    def _add_ref(self, checksum: str, path: str) -> None:
+        os.makedirs(self._ref_dir(checksum), exist_ok=True)
+        with open(self._ref_path(checksum, path), "w") as f:
+            f.write(os.path.abspath(path))
+
+    def ingest(self, path: str, checksum: str) -> str:
+        """
+        Take a freshly written project file into the store. If the content
+        is already stored, the file is replaced by a link to the existing
+        blob. Returns how the project file is now backed.
+        """
+        blob = self.blob_path(checksum)
+        with self._lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                try:
+                    # New content: the uploaded file itself becomes the blob
+                    os.link(path, blob)
+                    method = "stored"
+                except FileExistsError:
+                    method = self._materialize(blob, path)
+                except OSError:
+                    shutil.copyfile(path, f"{blob}.tmp")
+                    os.replace(f"{blob}.tmp", blob)
+                    method = "stored"
+            elif os.path.getsize(blob) != os.path.getsize(path):
+                raise ValueError(f"Blob {checksum} exists with a different size")
+            else:
+                method = self._materialize(blob, path)
+
+            self._add_ref(checksum, path)
+
+        logger.info(f"Stored {path} as blob {checksum[:12]} ({method})")
+        return method
+
+    def link(self, checksum: str, dest: str) -> str:
+        """Place an existing blob at dest (e.g. into a new project); returns the method used"""
+        blob = self.blob_path(checksum)
+        if not os.path.exists(blob):
+            raise FileNotFoundError(f"Blob {checksum} not found")
+
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+            method = self._materialize(blob, dest)
+            self._add_ref(checksum, dest)
+        return method
+
+    def release(self, checksum: str, path: str) -> None:
+        """Drop the reference of a project path, e.g. when the file is deleted"""
+        ref = self._ref_path(checksum, path)
+        if os.path.exists(ref):
+            os.remove(ref)
+
+    def gc(self) -> Dict:
+        """
+        Drop stale references (missing or replaced project files) and delete
+        blobs nobody references any more
+        """
+        removed_blobs = 0
+        removed_refs = 0
+        freed_bytes = 0
+
+        with self._lock:
+            refs_root = os.path.join(self.root, "refs")
+            checksums = set(os.listdir(refs_root))
+            objects_root = os.path.join(self.root, "objects")
+            for dirpath, _, filenames in os.walk(objects_root):
+                checksums.update(name for name in filenames if CHECKSUM_PATTERN.match(name))
+
+            for checksum in checksums:
+                blob = self.blob_path(checksum)
+                blob_size = os.path.getsize(blob) if os.path.exists(blob) else None
+                ref_dir = self._ref_dir(checksum)
+                live = 0
+
+                if os.path.isdir(ref_dir):
+                    for name in os.listdir(ref_dir):
+                        ref = os.path.join(ref_dir, name)
+                        with open(ref) as f:
+                            target = f.read().strip()
+                        if os.path.exists(target) and os.path.getsize(target) == blob_size:
+                            live += 1
+                        else:
+                            os.remove(ref)
+                            removed_refs += 1
+
+                if live == 0:
+                    if blob_size is not None:
+                        os.remove(blob)
+                        removed_blobs += 1
+                        freed_bytes += blob_size
+                    if os.path.isdir(ref_dir):
+                        shutil.rmtree(ref_dir, ignore_errors=True)
+
+        logger.info(f"Blob GC removed {removed_blobs} blobs ({freed_bytes} bytes) and {removed_refs} stale refs")
+        return {"removed_blobs": removed_blobs, "removed_refs": removed_refs, "freed_bytes": freed_bytes}
+
+    def stats(self) -> Dict:
+        """Stored versus logical size of all blobs"""
+        blobs = 0
+        stored_bytes = 0
+        logical_bytes = 0
+        references = 0
+        objects_root = os.path.join(self.root, "objects")
+
+        for dirpath, _, filenames in os.walk(objects_root):
+            for name in filenames:
+                if not CHECKSUM_PATTERN.match(name):
+                    continue
+                size = os.path.getsize(os.path.join(dirpath, name))
+                ref_dir = self._ref_dir(name)
+                refs = len(os.listdir(ref_dir)) if os.path.isdir(ref_dir) else 0
+                blobs += 1
+                references += refs
+                stored_bytes += size
+                logical_bytes += size * max(refs, 1)
+
+        return {
+            "blobs": blobs,
+            "references": references,
+            "stored_bytes": stored_bytes,
+            "logical_bytes": logical_bytes,
+            "saved_bytes": logical_bytes - stored_bytes
+        }
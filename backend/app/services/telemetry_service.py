@@ -0,0 +1,274 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds between resource samples of running simulations
+TELEMETRY_INTERVAL = float(os.getenv("TELEMETRY_INTERVAL", "5"))
+
+# Samples kept per simulation (720 x 5 s = one hour)
+TELEMETRY_HISTORY = int(os.getenv("TELEMETRY_HISTORY", "720"))
+
+# Finished simulations whose series stay available in memory
+TELEMETRY_FINISHED_KEPT = 200
+
+PROC = "/proc"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_stat(path: str) -> Optional[List[str]]:
+    """Fields of a /proc stat file after the command name (state is field 0)"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses; it ends at the last ")"
+    return data[data.rfind(b")") + 2:].decode().split()
+
+
+def scan_processes() -> Dict[int, List[str]]:
+    """One pass over /proc: stat fields of every process, keyed by pid"""
+    processes = {}
+    try:
+        entries = os.listdir(PROC)
+    except OSError:
+        return processes
+    for entry in entries:
+        if entry.isdigit():
+            fields = _read_stat(f"{PROC}/{entry}/stat")
+            if fields is not None:
+                processes[int(entry)] = fields
+    return processes
+
+
+def count_runnable_threads(pid: int) -> int:
+    runnable = 0
+    try:
+        tids = os.listdir(f"{PROC}/{pid}/task")
+    except OSError:
+        return 0
+    for tid in tids:
+        fields = _read_stat(f"{PROC}/{pid}/task/{tid}/stat")
+        if fields and fields[0] == "R":
+            runnable += 1
+    return runnable
+
+
+class JobTelemetry:
+    """
+    Resource usage of one simulation's process tree
+    """
+
+    def __init__(self, simulation_id: str, project_id: str, pid: int, cores: int):
+        self.simulation_id = simulation_id
+        self.project_id = project_id
+        self.pid = pid
+        self.cores = cores
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        # CPU seconds per (pid, start time), so exited children keep their share
+        self.cpu_by_process: Dict[Tuple[int, str], float] = {}
+        self.cpu_seconds = 0.0
+        self.rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+        self.cpu_percent = 0.0
+        self.threads = 0
+        self.runnable = 0
+        self.oversubscribed_samples = 0
+        self.samples_taken = 0
+        self.series: Deque[Dict] = deque(maxlen=TELEMETRY_HISTORY)
+        self._last: Optional[Tuple[float, float]] = None
+
+    def measure(self, processes: Dict[int, List[str]], children: Dict[int, List[int]]) -> Tuple[Dict, int, int, int]:
+        """CPU seconds by process, threads, RSS bytes and runnable threads of the job's process tree"""
+        tree = []
+        stack = [self.pid]
+        while stack:
+            pid = stack.pop()
+            if pid in processes:
+                tree.append(pid)
+                stack.extend(children.get(pid, ()))
+
+        cpu_by_process = {}
+        rss = 0
+        threads = 0
+        runnable = 0
+        for pid in tree:
+            fields = processes[pid]
+            cpu_by_process[(pid, fields[19])] = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+            threads += int(fields[17])
+            rss += int(fields[21]) * PAGE_SIZE
+            runnable += count_runnable_threads(pid)
+        return cpu_by_process, threads, rss, runnable
+
+    def sample(self, measurement: Tuple[Dict, int, int, int], now: float) -> None:
+        cpu_by_process, threads, rss, runnable = measurement
+        self.cpu_by_process.update(cpu_by_process)
+        self.cpu_seconds = sum(self.cpu_by_process.values())
+        if self._last is not None and now > self._last[0]:
+            self.cpu_percent = 100.0 * (self.cpu_seconds - self._last[1]) / (now - self._last[0])
+        self._last = (now, self.cpu_seconds)
+
+        self.rss_mb = rss / (1024 * 1024)
+        self.peak_rss_mb = max(self.peak_rss_mb, self.rss_mb)
+        self.threads = threads
+        self.runnable = runnable
+        self.samples_taken += 1
+
+        oversubscribed = runnable > self.cores
+        if oversubscribed:
+            if not self.oversubscribed_samples:
+                logger.warning(
+                    f"Simulation {self.simulation_id} has {runnable} runnable threads "
+                    f"on {self.cores} allotted cores"
+                )
+            self.oversubscribed_samples += 1
+
+        self.series.append({
+            "time": now,
+            "cpu_percent": round(self.cpu_percent, 1),
+            "rss_mb": round(self.rss_mb, 1),
+            "threads": threads,
+            "runnable_threads": runnable,
+            "oversubscribed": oversubscribed
+        })
+
+    def summary(self) -> Dict:
+        end = self.finished or time.time()
+        wall = max(end - self.started, 1e-9)
+        return {
+            "simulation_id": self.simulation_id,
+            "project_id": self.project_id,
+            "pid": self.pid,
+            "cores": self.cores,
+            "running": self.finished is None,
+            "cpu_seconds": self.cpu_seconds,
+            "cpu_percent": self.cpu_percent,
+            "average_cpu_percent": 100.0 * self.cpu_seconds / wall,
+            "rss_mb": self.rss_mb,
+            "peak_rss_mb": self.peak_rss_mb,
+            "threads": self.threads,
+            "runnable_threads": self.runnable,
+            "oversubscribed_samples": self.oversubscribed_samples,
+            "samples": self.samples_taken
+        }
+
+
+class ResourceSampler:
+    """
+    Samples CPU time, RSS and runnable threads of every registered gmx
+    process tree from /proc.
+
+    A single task serves all jobs: each tick scans /proc once, builds the
+    parent/child map and then walks each job's tree, so the cost grows with
+    the number of processes rather than jobs x processes.
+    """
+
+    def __init__(self, interval: float = TELEMETRY_INTERVAL):
+        self.interval = interval
+        self.enabled = os.path.isdir(PROC)
+        self.jobs: Dict[str, JobTelemetry] = {}
+        self.finished: "OrderedDict[str, JobTelemetry]" = OrderedDict()
+        self.last_tick_seconds = 0.0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        if not self.enabled:
+            logger.warning("/proc not available, resource telemetry disabled")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def register(self, simulation_id: str, project_id: str, pid: int, cores: int) -> None:
+        with self._lock:
+            self.jobs[simulation_id] = JobTelemetry(simulation_id, project_id, pid, cores)
+
+    def unregister(self, simulation_id: str) -> Optional[Dict]:
+        """
+        Stop sampling and return the job's summary as of its last tick. No
+        final sample is taken: it would scan /proc on the caller's (event
+        loop) thread, and the exited process tree is gone from /proc anyway.
+        """
+        with self._lock:
+            job = self.jobs.pop(simulation_id, None)
+            if job is None:
+                return None
+            job.finished = time.time()
+            self.finished[simulation_id] = job
+            while len(self.finished) > TELEMETRY_FINISHED_KEPT:
+                self.finished.popitem(last=False)
+            return job.summary()
+
+    def _tick(self) -> None:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        if not jobs:
+            return
+
+        # /proc is read without the lock, so registering, unregistering and
+        # queries on the event loop only wait for the samples to be recorded
+        started = time.perf_counter()
+        processes = scan_processes()
+        children: Dict[int, List[int]] = {}
+        for pid, fields in processes.items():
+            children.setdefault(int(fields[1]), []).append(pid)
+        measurements = [(job, job.measure(processes, children)) for job in jobs]
+
+        now = time.time()
+        with self._lock:
+            for job, measurement in measurements:
+                # Jobs unregistered during the scan keep their final summary
+                if job.finished is None:
+                    job.sample(measurement, now)
+        self.last_tick_seconds = time.perf_counter() - started
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await loop.run_in_executor(None, self._tick)
+            except Exception as e:
+                logger.error(f"Resource sampling failed: {e}")
+
+    def _get(self, simulation_id: str) -> Optional[JobTelemetry]:
+        return self.jobs.get(simulation_id) or self.finished.get(simulation_id)
+
+    def series(self, simulation_id: str, since: Optional[float] = None) -> Optional[Dict]:
+        """Summary and samples of a simulation, optionally only samples after `since`"""
+        with self._lock:
+            job = self._get(simulation_id)
+            if job is None:
+                return None
+            points = [p for p in job.series if since is None or p["time"] > since]
+            return {"summary": job.summary(), "series": points}
+
+    def for_project(self, project_id: str) -> List[Dict]:
+        with self._lock:
+            jobs = [j for j in list(self.jobs.values()) + list(self.finished.values()) if j.project_id == project_id]
+            return [job.summary() for job in jobs]
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "running_jobs": len(self.jobs),
+            "last_tick_seconds": self.last_tick_seconds
+        }
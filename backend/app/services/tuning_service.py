@@ -0,0 +1,222 @@
+import os
+import json
+import math
+import time
+import hashlib
+import platform
+import threading
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.utils.gromacs_utils import read_gro_header, read_mdp
+
+logger = logging.getLogger(__name__)
+
+# Best mdrun launch layouts found by benchmarking, shared by all projects
+TUNING_CACHE_PATH = os.getenv("TUNING_CACHE_PATH", os.path.join("projects", ".tuning_cache.json"))
+
+# Steps of each benchmark mdrun; timings are taken over the second half
+TUNING_BENCHMARK_STEPS = int(os.getenv("TUNING_BENCHMARK_STEPS", "5000"))
+
+# Systems whose atom counts differ by less than this factor share a tuned layout
+ATOM_BUCKET_RATIO = 1.05
+
+# MDP options that change the cost of the PME part of a step
+PME_OPTIONS = ("coulombtype", "rcoulomb", "rvdw", "fourierspacing", "pme_order", "cutoff_scheme")
+
+# -npme value leaving the number of PME ranks to mdrun
+DEFAULT_NPME = -1
+
+
+def describe_system(project_dir: str, mdp: str = "nvt.mdp", structure: str = "em.gro") -> Dict:
+    """Atom count, box and PME settings of a prepared system"""
+    project_path = Path(project_dir)
+    header = read_gro_header(project_path / structure)
+    params = read_mdp(project_path / mdp)
+    return {
+        "atoms": header["atoms"],
+        "box": header["box"][:3],
+        "pme": {option: params.get(option) for option in PME_OPTIONS}
+    }
+
+
+def host_fingerprint(engine: str) -> Dict:
+    """CPU model, core count and GROMACS build the tuned layouts were measured on"""
+    model = None
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {
+        "cpu": model or platform.processor() or None,
+        "cpus": os.cpu_count(),
+        "machine": platform.machine(),
+        "engine": engine
+    }
+
+
+def candidate_layouts(cores: int, gpu: bool) -> List[Dict]:
+    """
+    Thread-MPI ranks x OpenMP threads filling exactly `cores`, each with
+    mdrun's own PME rank choice and, from four ranks up, a quarter of the
+    ranks dedicated to PME (one PME rank next to the GPU ranks).
+    """
+    layouts = []
+    for ntmpi in range(1, cores + 1):
+        if cores % ntmpi:
+            continue
+        npme_options = [DEFAULT_NPME]
+        if ntmpi >= 4:
+            npme_options.append(1 if gpu else ntmpi // 4)
+        for npme in npme_options:
+            layouts.append({"ntmpi": ntmpi, "ntomp": cores // ntmpi, "npme": npme})
+    return layouts
+
+
+def simulated_ns_per_day(system: Dict, layout: Dict, gpu: bool, time_step: float) -> Optional[float]:
+    """
+    Deterministic stand-in for the throughput of an mdrun layout, used by
+    mock mode. It models per-atom work split between short-range and PME,
+    OpenMP efficiency falling with threads per rank, halo exchange and PME
+    all-to-all costs growing with ranks, and GPU offload of the short-range
+    part. Returns None where mdrun would refuse the domain decomposition.
+    """
+    atoms = max(system["atoms"], 1)
+    ntmpi, ntomp = layout["ntmpi"], layout["ntomp"]
+    npme = layout["npme"]
+    if npme < 0:
+        # mdrun only splits off PME ranks itself for larger rank counts
+        npme = ntmpi // 4 if ntmpi >= 12 else 0
+    pp_ranks = ntmpi - npme
+    if pp_ranks < 1:
+        return None
+
+    # Domain cells must stay larger than the cut-off
+    cutoff = float(system["pme"].get("rcoulomb") or 1.0)
+    cells_per_dim = math.ceil(pp_ranks ** (1 / 3))
+    if pp_ranks > 1 and min(system["box"]) / cells_per_dim < cutoff + 0.2:
+        return None
+
+    omp_efficiency = 1.0 / (1.0 + 0.06 * (ntomp - 1))
+    work = 1.0e-6 * atoms  # seconds per step on one core
+    short_range = 0.65 * work
+    pme = 0.35 * work
+    if gpu:
+        # Offloaded, but every rank adds launch latency on the shared device
+        short_range = short_range / 8 + 2.0e-5 * pp_ranks
+
+    pp_time = short_range / (pp_ranks * ntomp * omp_efficiency)
+    if pp_ranks > 1:
+        pp_time += 5.0e-6 * math.log2(pp_ranks) + 2.0e-8 * atoms ** (2 / 3) / pp_ranks ** (1 / 3)
+
+    if npme:
+        pme_time = pme / (npme * ntomp * omp_efficiency) + 1.0e-5 * npme
+        step_time = max(pp_time, pme_time) + 5.0e-6
+    else:
+        step_time = pp_time + pme / (pp_ranks * ntomp * omp_efficiency) + 1.0e-5 * pp_ranks
+
+    return round(time_step * 86400 / step_time / 1000, 3)
+
+
+class LaunchTuner:
+    """
+    Picks mdrun thread, rank and PME rank layouts by benchmarking.
+
+    Each candidate layout runs a short mdrun on the allotted cores and the
+    one with the highest ns/day wins. Winners are cached under a key of
+    atom-count bucket, box, PME settings, core count, GPU use and host
+    fingerprint, so similar systems on the same hardware reuse them
+    without benchmarking again.
+    """
+
+    def __init__(self, cache_path: str = TUNING_CACHE_PATH):
+        self.cache_path = Path(cache_path)
+        self._lock = threading.Lock()
+
+    def key(self, system: Dict, cores: int, gpu: bool, engine: str) -> str:
+        return hashlib.sha256(json.dumps({
+            "atoms": round(math.log(max(system["atoms"], 1), ATOM_BUCKET_RATIO)),
+            "box": [round(length, 1) for length in system["box"]],
+            "pme": system["pme"],
+            "cores": cores,
+            "gpu": gpu,
+            "host": host_fingerprint(engine)
+        }, sort_keys=True).encode()).hexdigest()
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            return self._read().get(key)
+
+    def store(self, key: str, entry: Dict) -> None:
+        with self._lock:
+            entries = self._read()
+            entries[key] = entry
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Replace atomically; other backends may read the cache at any time
+            tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+
+    def entries(self) -> List[Dict]:
+        with self._lock:
+            return [{"key": key, **entry} for key, entry in self._read().items()]
+
+    async def tune(
+        self,
+        system: Dict,
+        cores: int,
+        gpu: bool,
+        engine: str,
+        benchmark: Callable[[Dict], Awaitable[Optional[float]]],
+        prepare: Optional[Callable[[], Awaitable[None]]] = None,
+        report: Optional[Callable[[Dict, Optional[float]], Awaitable[None]]] = None
+    ) -> Dict:
+        """
+        Best layout for the system, from the cache or by awaiting
+        `benchmark(layout)` (ns/day, or None if the layout failed) for every
+        candidate. `prepare` runs once before the first benchmark.
+        """
+        key = self.key(system, cores, gpu, engine)
+        cached = self.lookup(key)
+        if cached is not None:
+            return {"key": key, "cached": True, **cached}
+
+        if prepare is not None:
+            await prepare()
+        benchmarks = []
+        for layout in candidate_layouts(cores, gpu):
+            ns_per_day = await benchmark(layout)
+            benchmarks.append({**layout, "ns_per_day": ns_per_day})
+            if report is not None:
+                await report(layout, ns_per_day)
+
+        measured = [b for b in benchmarks if b["ns_per_day"] is not None]
+        if not measured:
+            raise RuntimeError(f"No mdrun layout for {cores} cores could be benchmarked")
+        best = max(measured, key=lambda b: b["ns_per_day"])
+        entry = {
+            "layout": {option: best[option] for option in ("ntmpi", "ntomp", "npme")},
+            "ns_per_day": best["ns_per_day"],
+            "system": system,
+            "cores": cores,
+            "gpu": gpu,
+            "host": host_fingerprint(engine),
+            "benchmarks": benchmarks,
+            "tuned_at": time.time()
+        }
+        self.store(key, entry)
+        logger.info(f"Tuned mdrun layout for {system['atoms']} atoms on {cores} cores: {entry['layout']}")
+        return {"key": key, "cached": False, **entry}
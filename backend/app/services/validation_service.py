@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.services.cache_service import StructureCache
+from app.services.forcefield_service import ForceFieldCatalogue
+from app.utils.validation_utils import check_mdp, check_structure, check_topology, error, warning
+
+logger = logging.getLogger(__name__)
+
+# Processes validating uploaded files (defaults to all host cores)
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS") or 0) or os.cpu_count() or 1
+
+STRUCTURE_TYPES = (".pdb", ".gro")
+TOPOLOGY_TYPES = (".top", ".itp")
+
+# Per worker process: parsed structures and force field residue databases
+_structure_cache: Optional[StructureCache] = None
+_catalogues: Dict[str, ForceFieldCatalogue] = {}
+
+
+def validate_file(
+    path: str,
+    checksum: Optional[str],
+    forcefields_path: str,
+    forcefield: Optional[str] = None
+) -> Dict:
+    """
+    Validate one project file; runs in a worker process. Returns the issues
+    found ({"severity", "message"}) and a summary of the file's contents.
+    """
+    global _structure_cache
+    file_type = Path(path).suffix.lower()
+    issues: List[Dict] = []
+    summary: Dict = {}
+    started = time.perf_counter()
+    try:
+        if file_type in STRUCTURE_TYPES:
+            if _structure_cache is None:
+                _structure_cache = StructureCache()
+            structure = _structure_cache.load(path, checksum)
+            issues += check_structure(structure)
+            summary = structure.summary()
+            if forcefield and file_type == ".pdb":
+                issues += _check_forcefield(structure.residues(), forcefields_path, forcefield)
+        elif file_type in TOPOLOGY_TYPES:
+            issues, summary = check_topology(Path(path), [Path(path).parent, Path(forcefields_path)])
+        elif file_type == ".mdp":
+            issues, summary = check_mdp(Path(path))
+        elif os.path.getsize(path) == 0:
+            issues.append(error("File is empty"))
+    except (ValueError, OSError, UnicodeDecodeError) as e:
+        issues.append(error(str(e)))
+
+    summary["validation_seconds"] = round(time.perf_counter() - started, 3)
+    return {"issues": issues, "summary": summary}
+
+
+def _check_forcefield(residues: List[Dict], forcefields_path: str, forcefield: str) -> List[Dict]:
+    catalogue = _catalogues.get(forcefields_path)
+    if catalogue is None:
+        catalogue = _catalogues[forcefields_path] = ForceFieldCatalogue(forcefields_path)
+    results = catalogue.check_compatibility(residues, [forcefield])
+    if not results:
+        return [warning(f"Force field {forcefield} not found; residues not checked")]
+
+    result = results[0]
+    issues = []
+    if result["unknown_residues"]:
+        names = ", ".join(f"{name} x{count}" for name, count in sorted(result["unknown_residues"].items()))
+        issues.append(error(f"Residues unknown to {forcefield}: {names}"))
+    if result["unknown_atom_count"]:
+        examples = ", ".join(
+            f"{atom['residue']}{atom['resseq']}/{atom['atom']}" for atom in result["unknown_atoms"][:5]
+        )
+        issues.append(warning(f"{result['unknown_atom_count']} atoms unknown to {forcefield} ({examples})"))
+    return issues
+
+
+class ValidationService:
+    """
+    Validates uploaded project files on a process pool.
+
+    Every file is a separate task, so files of one upload batch and of
+    different projects are validated in parallel; a bulk import finishes
+    in about the time of its slowest file. Results are handed to a
+    callback as they complete, together with the project's progress.
+    """
+
+    def __init__(self, forcefields_path: str, workers: int = VALIDATION_WORKERS):
+        self.forcefields_path = forcefields_path
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks = set()
+        # Files submitted and validated per project since its queue last ran empty
+        self._progress: Dict[str, Dict[str, int]] = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Forking the threaded API process is unsafe; workers start fresh
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def progress(self, project_id: str) -> Dict[str, int]:
+        progress = self._progress.get(project_id, {"total": 0, "done": 0})
+        return {**progress, "pending": progress["total"] - progress["done"]}
+
+    def submit(
+        self,
+        project_id: str,
+        files: List[Dict],
+        forcefield: Optional[str],
+        on_result: Callable[[str, Dict, Dict, Dict], Awaitable[None]]
+    ) -> None:
+        """
+        Validate `files` ({"filename", "checksum"}) of a project in the
+        background; `on_result(project_id, file, result, progress)` is awaited
+        for each one as it finishes
+        """
+        progress = self._progress.setdefault(project_id, {"total": 0, "done": 0})
+        progress["total"] += len(files)
+        for project_file in files:
+            task = asyncio.create_task(self._validate(project_id, project_file, forcefield, on_result))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _validate(self, project_id: str, project_file: Dict, forcefield: Optional[str], on_result) -> None:
+        path = os.path.join("projects", project_id, project_file["filename"])
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_pool(), partial(
+                validate_file, path, project_file.get("checksum"), self.forcefields_path, forcefield
+            ))
+        except Exception as e:
+            logger.error(f"Validation of {path} failed: {e}")
+            result = {"issues": [error(f"Validation failed: {e}")], "summary": {}}
+
+        progress = self._progress[project_id]
+        progress["done"] += 1
+        snapshot = self.progress(project_id)
+        if progress["done"] >= progress["total"]:
+            del self._progress[project_id]
+        try:
+            await on_result(project_id, project_file, result, snapshot)
+        except Exception as e:
+            logger.error(f"Recording validation of {path} failed: {e}")
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so the relative projects/ paths of the services land there"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "projects").mkdir()
+    return tmp_path
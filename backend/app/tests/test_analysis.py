@@ -0,0 +1,216 @@
+import time
+
+import MDAnalysis as mda
+import numpy as np
+import pytest
+
+from app.services.analysis_service import AnalysisService, RunningMoments, TrajectoryReader, superpose_block
+from app.services.cache_service import AnalysisCache, trajectory_fingerprint
+from app.services.preview_service import PREVIEW_SELECTION, PreviewBuilder, decode_frame, encode_frame
+from app.utils.downsample_utils import SeriesPyramid, lttb
+
+
+def test_pyramid_grown_in_pieces_matches_one_built_at_once():
+    rng = np.random.default_rng(1)
+    times = np.arange(10000, dtype=np.float64)
+    values = rng.normal(size=10000)
+
+    whole = SeriesPyramid()
+    whole.extend(times, values)
+    pieces = SeriesPyramid()
+    for start in range(0, 10000, 777):
+        pieces.extend(times[start:start + 777], values[start:start + 777])
+
+    assert pieces.n == whole.n == 10000
+    assert pieces.depth == whole.depth
+    for k in range(1, whole.depth + 1):
+        for grown, built in zip(pieces.level(k), whole.level(k)):
+            assert np.array_equal(grown, built)
+    assert np.array_equal(pieces.values, values)
+
+
+def test_pyramid_query_keeps_extremes_of_window():
+    times = np.arange(100000, dtype=np.float64)
+    values = np.sin(times / 1000)
+    values[54321] = 50.0
+    values[54322] = -50.0
+    pyramid = SeriesPyramid()
+    pyramid.extend(times, values)
+
+    result = pyramid.query(500)
+    window = pyramid.query(500, start_time=50000, end_time=60000)
+
+    assert len(result["values"]) <= 500 and result["level"] > 0
+    assert result["values"].max() == 50.0 and result["values"].min() == -50.0
+    assert window["window_points"] == 10001
+    assert window["time_ps"][0] >= 50000 and window["time_ps"][-1] <= 60000
+    assert 50.0 in window["values"] and -50.0 in window["values"]
+    assert np.all(np.diff(result["time_ps"]) > 0)
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    times = np.arange(1000, dtype=np.float64)
+    values = np.zeros(1000)
+    values[500] = 10.0
+
+    indices = lttb(times, values, 20)
+
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 500 in indices
+
+
+def _write_system(directory, n_frames=20, resnames=("ALA", "ALA", "SOL")):
+    """conf.gro and md.xtc of a few atoms drifting along x, one frame per ps"""
+    lines = [f"{i + 1:>5}{resname:<5}{'CA' if resname != 'SOL' else 'OW':>5}{i + 1:>5}{i:8.3f}{0:8.3f}{0:8.3f}"
+             for i, resname in enumerate(resnames)]
+    (directory / "conf.gro").write_text("test\n" + f"{len(resnames)}\n" + "\n".join(lines) + "\n   5.0   5.0   5.0\n")
+    universe = mda.Universe(str(directory / "conf.gro"))
+    with mda.Writer(str(directory / "md.xtc"), universe.atoms.n_atoms) as writer:
+        for frame in range(n_frames):
+            universe.atoms.positions = universe.atoms.positions + np.array([1.0, 0.0, 0.0])
+            universe.trajectory.ts.time = float(frame)
+            writer.write(universe.atoms)
+
+
+def test_preview_frame_round_trip():
+    positions = np.random.default_rng(2).uniform(0, 10, size=(50, 3)).astype(np.float32)
+
+    decoded = decode_frame(encode_frame(positions, 12.5, precision=0.001), 50)
+
+    assert decoded["time_ps"] == 12.5
+    assert np.abs(decoded["positions"] - positions).max() <= 0.001
+    with pytest.raises(ValueError):
+        encode_frame(np.empty((0, 3)), 0.0)
+
+
+def test_preview_builder_appends_only_new_frames(workdir):
+    _write_system(workdir, n_frames=20)
+    reader = TrajectoryReader(str(workdir / "conf.gro"), str(workdir / "md.xtc"), PREVIEW_SELECTION)
+    builder = PreviewBuilder(str(workdir), max_frames=8)
+
+    manifest = builder.update(reader, planned_ps=19.0)
+    again = builder.update(reader, planned_ps=19.0)
+
+    assert manifest["n_atoms"] == 2
+    assert len(manifest["frames"]) <= 8
+    assert [frame["time_ps"] for frame in manifest["frames"]] == sorted(frame["time_ps"] for frame in manifest["frames"])
+    assert again["version"] == manifest["version"] and again["frames"] == manifest["frames"]
+
+
+def test_preview_of_water_only_system_is_rejected(workdir):
+    _write_system(workdir, n_frames=2, resnames=("SOL", "SOL"))
+
+    with pytest.raises(ValueError, match="matched no atoms"):
+        TrajectoryReader(str(workdir / "conf.gro"), str(workdir / "md.xtc"), PREVIEW_SELECTION)
+
+
+def _rotation(angle: float) -> np.ndarray:
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]], dtype=np.float32)
+
+
+def test_superpose_block_removes_rotation_and_translation():
+    rng = np.random.default_rng(3)
+    reference = rng.normal(size=(30, 3)).astype(np.float32)
+    reference -= reference.mean(axis=0)
+    noise = rng.normal(scale=0.05, size=(30, 3)).astype(np.float32)
+    frames = np.stack([
+        reference @ _rotation(0.7).T + 4.0,
+        (reference + noise) @ _rotation(-2.0).T - 1.5
+    ])
+
+    displacements, rmsd = superpose_block(frames, reference)
+
+    assert displacements.shape == (2, 30, 3)
+    assert rmsd[0] < 1e-5
+    # Fitting can only lower the deviation of the noisy frame below the noise itself
+    assert 0 < rmsd[1] <= np.sqrt((noise ** 2).sum(axis=1).mean()) + 1e-6
+
+
+def test_superpose_block_does_not_fit_a_mirror_image():
+    rng = np.random.default_rng(4)
+    reference = rng.normal(size=(20, 3)).astype(np.float32)
+    reference -= reference.mean(axis=0)
+    mirrored = reference * np.array([1, 1, -1], dtype=np.float32)
+
+    _, rmsd = superpose_block(mirrored[None].copy(), reference)
+
+    assert rmsd[0] > 0.1
+
+
+def test_running_moments_merged_in_blocks_match_whole_trajectory():
+    rng = np.random.default_rng(5)
+    frames = rng.normal(size=(103, 12, 3))
+    expected = np.sqrt(((frames - frames.mean(axis=0)) ** 2).sum(axis=2).mean(axis=0))
+
+    moments = RunningMoments(12)
+    for start in range(0, 103, 17):
+        moments.update(frames[start:start + 17].copy())
+
+    assert moments.count == 103
+    assert np.allclose(moments.mean, frames.mean(axis=0))
+    assert np.allclose(moments.rmsf(), expected)
+
+
+def _write_frames(path, universe, positions):
+    with mda.Writer(str(path), universe.atoms.n_atoms) as writer:
+        for frame, frame_positions in enumerate(positions):
+            universe.atoms.positions = frame_positions
+            universe.trajectory.ts.time = float(frame)
+            writer.write(universe.atoms)
+
+
+def test_rms_of_a_growing_trajectory_extends_the_cached_result(workdir):
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    _write_system(project_dir, n_frames=1, resnames=("ALA",) * 6)
+    universe = mda.Universe(str(project_dir / "conf.gro"))
+    rng = np.random.default_rng(6)
+    positions = universe.atoms.positions + rng.normal(scale=0.5, size=(30, 6, 3))
+    # XTC frames are independent, so the first 10 frames are a prefix of all 30
+    _write_frames(project_dir / "md.xtc", universe, positions[:10])
+    _write_frames(workdir / "full.xtc", universe, positions)
+    service = AnalysisService(AnalysisCache(str(workdir / "cache")))
+
+    first = service.compute_rms(str(project_dir), selection="name CA")
+    (project_dir / "md.xtc").write_bytes((workdir / "full.xtc").read_bytes())
+    extended = service.compute_rms(str(project_dir), selection="name CA")
+    again = service.compute_rms(str(project_dir), selection="name CA")
+    fresh = AnalysisService(AnalysisCache(str(workdir / "other"))).compute_rms(str(project_dir), selection="name CA")
+
+    assert (first["cache"], extended["cache"], again["cache"], fresh["cache"]) == ("miss", "extend", "hit", "miss")
+    assert (first["n_frames"], extended["frames_computed"], again["frames_computed"]) == (10, 20, 0)
+    assert np.allclose(extended["rmsd_nm"], fresh["rmsd_nm"])
+    assert np.allclose(extended["rmsf_nm"], fresh["rmsf_nm"])
+    assert np.array_equal(again["rmsd_nm"], extended["rmsd_nm"])
+
+
+def test_analysis_cache_misses_when_the_trajectory_is_rewritten(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    trajectory = tmp_path / "md.xtc"
+    trajectory.write_bytes(b"a" * 100)
+    cache.store("rms", "k", {"trajectory": trajectory_fingerprint(trajectory)}, {"rmsd_nm": np.arange(3.0)})
+
+    assert cache.lookup("rms", "k", trajectory)[0] == "hit"
+    trajectory.write_bytes(b"a" * 100 + b"b" * 10)
+    assert cache.lookup("rms", "k", trajectory)[0] == "extend"
+    trajectory.write_bytes(b"c" * 200)
+    assert cache.lookup("rms", "k", trajectory) == ("miss", None, None)
+
+
+def test_analysis_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"), max_bytes=30000)
+    trajectory = tmp_path / "md.xtc"
+    trajectory.write_bytes(b"a")
+    meta = {"trajectory": trajectory_fingerprint(trajectory)}
+
+    for key in ("a", "b", "c"):
+        cache.store("rms", key, meta, {"rmsd_nm": np.zeros(1500)})
+        time.sleep(0.01)
+        # Reading "a" keeps it over "b"
+        cache.lookup("rms", "a", trajectory)
+
+    assert cache.lookup("rms", "b", trajectory)[0] == "miss"
+    assert cache.lookup("rms", "a", trajectory)[0] == "hit"
+    assert cache.stats()["size_bytes"] <= 30000
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from app.services.file_service import FileService
+from app.services.storage_service import BlobStore, clone_file
+from app.utils.file_utils import parse_gro, parse_pdb
+
+
+def _atom_line(serial: str, name: str, resname: str, resseq: str, x: float) -> str:
+    return (
+        f"ATOM  {serial:>5} {name:<4} {resname:>3} A{resseq:>4}    "
+        f"{x:8.3f}{0.0:8.3f}{0.0:8.3f}  1.00  0.00           {name[0]}\n"
+    )
+
+
+def test_parse_pdb_decodes_hybrid36_residue_numbers():
+    data = "".join([
+        _atom_line("99998", "CA", "ALA", "9999", 1.0),
+        _atom_line("99999", "CA", "GLY", "A000", 2.0),
+        _atom_line("A0000", "CA", "SER", "A001", 3.0),
+        _atom_line("A0001", "CA", "LYS", "a000", 4.0),
+    ]).encode()
+
+    structure = parse_pdb(data)
+
+    assert structure.resids.tolist() == [9999, 10000, 10001, 10000 + 26 * 36 ** 3]
+    assert np.allclose(structure.positions[:, 0], [0.1, 0.2, 0.3, 0.4])
+
+
+def test_parse_gro_reads_high_precision_coordinates():
+    data = (
+        b"Two atoms\n    2\n"
+        b"    1ALA      N    1   1.00000   2.00000   3.00000\n"
+        b"    1ALA     CA    2   1.10000   2.10000   3.10000\n"
+        b"   5.00000   5.00000   5.00000\n"
+    )
+
+    structure = parse_gro(data)
+
+    assert np.allclose(structure.positions, [[1.0, 2.0, 3.0], [1.1, 2.1, 3.1]])
+    assert structure.names.tolist() == [b"N", b"CA"]
+    assert np.allclose(structure.box[:3], 5.0)
+
+
+@pytest.mark.parametrize("padding", [b" " * 200, b" "])
+def test_parse_gro_rejects_implausible_column_widths(padding):
+    line = b"    1ALA      N    1   1.0" + padding + b"2.0   3.0\n"
+    data = b"Bad\n    2\n" + line + b"    1ALA     CA    2   1.1 2.1 3.1\n   5.0   5.0   5.0\n"
+
+    with pytest.raises(ValueError, match="GRO coordinate columns"):
+        parse_gro(data)
+
+
+async def _body(data: bytes):
+    yield data
+
+
+def test_upload_session_accepts_chunks_out_of_order(workdir):
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    data = os.urandom(10 * 1000 + 7)
+    service = FileService()
+
+    async def upload():
+        session = await service.create_session("p1", str(project_dir), "big.pdb", len(data), 1000)
+        order = list(range(session.total_chunks))[::-1]
+        await asyncio.gather(*[
+            service.write_chunk(session, i, _body(data[i * 1000:(i + 1) * 1000])) for i in order
+        ])
+        # A chunk sent again is accepted and ignored
+        await service.write_chunk(session, 3, _body(data[3000:4000]))
+        with pytest.raises(ValueError):
+            await service.write_chunk(session, 0, _body(data[:999]))
+        return await service.complete_session(session)
+
+    size, checksum = asyncio.run(upload())
+
+    assert (size, checksum) == (len(data), hashlib.sha256(data).hexdigest())
+    assert (project_dir / "big.pdb").read_bytes() == data
+    assert os.listdir(project_dir / ".uploads") == []
+    assert service.sessions == {}
+
+
+def test_upload_session_survives_restart(workdir):
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    data = os.urandom(4000)
+
+    async def first_half():
+        service = FileService()
+        session = await service.create_session("p1", str(project_dir), "big.pdb", len(data), 1000)
+        for i in (2, 0):
+            await service.write_chunk(session, i, _body(data[i * 1000:(i + 1) * 1000]))
+        return session.id
+
+    session_id = asyncio.run(first_half())
+    # A part file without its session cannot be resumed
+    (project_dir / ".uploads" / "orphan.part").write_bytes(b"x")
+
+    async def second_half():
+        service = FileService()
+        assert [s.id for s in service.load_sessions("projects")] == [session_id]
+        session = service.get_session("p1", session_id)
+        assert session.missing_chunks == [1, 3]
+        for i in session.missing_chunks:
+            await service.write_chunk(session, i, _body(data[i * 1000:(i + 1) * 1000]))
+        return await service.complete_session(session)
+
+    size, checksum = asyncio.run(second_half())
+
+    assert checksum == hashlib.sha256(data).hexdigest()
+    assert (project_dir / "big.pdb").read_bytes() == data
+    assert os.listdir(project_dir / ".uploads") == []
+
+
+def test_upload_session_completes_once(workdir):
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    data = os.urandom(3000)
+    service = FileService()
+
+    async def upload():
+        session = await service.create_session("p1", str(project_dir), "big.pdb", len(data), 1000)
+        for i in range(3):
+            await service.write_chunk(session, i, _body(data[i * 1000:(i + 1) * 1000]))
+        return await asyncio.gather(
+            service.complete_session(session), service.complete_session(session), return_exceptions=True
+        )
+
+    first, second = asyncio.run(upload())
+
+    assert first == (len(data), hashlib.sha256(data).hexdigest())
+    assert isinstance(second, LookupError)
+    assert (project_dir / "big.pdb").read_bytes() == data
+
+
+def _project_file(directory, name: str, data: bytes):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest()
+
+
+def test_blob_store_keeps_one_copy_of_identical_uploads(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"), link_mode="hardlink")
+    first, checksum = _project_file(tmp_path / "p1", "protein.pdb", b"ATOM\n" * 1000)
+    second, _ = _project_file(tmp_path / "p2", "protein.pdb", b"ATOM\n" * 1000)
+
+    assert store.ingest(first, checksum) == "stored"
+    assert store.ingest(second, checksum) == "hardlink"
+    assert store.link(checksum, str(tmp_path / "p3" / "receptor.pdb")) == "hardlink"
+
+    assert os.stat(first).st_ino == os.stat(second).st_ino == os.stat(store.blob_path(checksum)).st_ino
+    assert store.stats() == {
+        "blobs": 1, "references": 3, "stored_bytes": 5000, "logical_bytes": 15000, "saved_bytes": 10000
+    }
+
+
+def test_blob_store_rejects_bad_checksums(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    path, checksum = _project_file(tmp_path / "p1", "protein.pdb", b"ATOM\n")
+
+    with pytest.raises(ValueError):
+        store.ingest(path, "../" + checksum[3:])
+    with pytest.raises(FileNotFoundError):
+        store.link(checksum, str(tmp_path / "p2" / "protein.pdb"))
+
+
+def test_blob_gc_deletes_blobs_only_when_no_project_uses_them(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"), link_mode="hardlink")
+    first, checksum = _project_file(tmp_path / "p1", "protein.pdb", b"ATOM\n" * 10)
+    second, _ = _project_file(tmp_path / "p2", "protein.pdb", b"ATOM\n" * 10)
+    store.ingest(first, checksum)
+    store.ingest(second, checksum)
+
+    os.remove(first)
+    assert store.gc() == {"removed_blobs": 0, "removed_refs": 1, "freed_bytes": 0}
+    assert store.has_blob(checksum)
+
+    # A project file replaced by other content no longer holds the blob,
+    # and replacing it leaves the blob's contents alone
+    other, _ = _project_file(tmp_path / "p3", "ligand.pdb", b"HETATM\n")
+    clone_file(other, second)
+    with open(store.blob_path(checksum), "rb") as f:
+        assert f.read() == b"ATOM\n" * 10
+    assert store.gc() == {"removed_blobs": 1, "removed_refs": 1, "freed_bytes": 50}
+    assert not store.has_blob(checksum)
@@ -0,0 +1,75 @@
+import re
+
+import pytest
+
+from app.services import log_service as log_module
+from app.services.log_service import LogService
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "p1.log"
+    path.write_bytes(b"".join(f"step {i}, energy {i * 1.5}\n".encode() for i in range(1000)) + b"partial")
+    return str(path)
+
+
+def test_read_range_pages_whole_lines(log_file):
+    service = LogService()
+
+    first = service.read_range(log_file, 0, 100)
+    second = service.read_range(log_file, first["next_offset"], 100)
+
+    assert first["logs"].endswith("\n") and first["logs"].startswith("step 0,")
+    assert second["offset"] == first["next_offset"]
+    assert second["logs"].startswith(f"step {len(first['logs'].splitlines())},")
+    pages = []
+    offset = 0
+    while True:
+        page = service.read_range(log_file, offset, 4096)
+        if not page["logs"]:
+            break
+        pages.append(page["logs"])
+        offset = page["next_offset"]
+    assert "".join(pages).count("\n") == 1000
+    # The unterminated last line is held back until its newline arrives
+    assert "partial" not in "".join(pages)
+
+
+def test_tail_returns_last_complete_lines(log_file):
+    result = LogService().tail(log_file, 3)
+
+    assert result["logs"].splitlines() == ["step 997, energy 1495.5", "step 998, energy 1497.0", "step 999, energy 1498.5"]
+    assert result["next_offset"] == result["size"] - len("partial")
+
+
+def test_grep_matches_literal_text_by_default(log_file):
+    service = LogService()
+
+    literal = service.grep(log_file, "energy 1.5")
+    pattern = service.grep(log_file, r"step 99\d,", regex=True)
+
+    assert [m["line"] for m in literal["matches"]] == ["step 1, energy 1.5"]
+    assert [m["line"] for m in pattern["matches"]] == [f"step {i}, energy {i * 1.5}" for i in range(990, 1000)]
+    assert service.grep(log_file, "[").get("matches") == []
+
+
+def test_grep_resumes_from_next_offset(log_file):
+    service = LogService()
+
+    first = service.grep(log_file, "step", max_matches=10)
+    second = service.grep(log_file, "step", since=first["next_offset"], max_matches=10)
+
+    assert len(first["matches"]) == 10
+    assert second["matches"][0]["line"] == "step 10, energy 15.0"
+
+
+def test_grep_limits_regular_expressions(log_file, monkeypatch):
+    service = LogService()
+
+    with pytest.raises(re.error):
+        service.grep(log_file, "a" * 1000, regex=True)
+
+    # A spent time budget returns no matches, with the position to resume from
+    monkeypatch.setattr(log_module, "GREP_TIME_BUDGET", 0)
+    result = service.grep(log_file, "step", regex=True)
+    assert result["matches"] == [] and result["next_offset"] == 0
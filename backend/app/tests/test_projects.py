@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.projects import ProjectStatus
+from app.database import Base
+from app.services.project_service import ProjectRepository, decode_cursor
+
+
+def _with_repository(tmp_path, body):
+    """Run `body(repository)` against a fresh SQLite database"""
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            return await body(ProjectRepository(sessions))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+async def _pages(repository, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        page = await repository.list(limit=limit, cursor=cursor, **filters)
+        pages.append([project["id"] for project in page["projects"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_list_pages_through_projects_newest_first(tmp_path):
+    async def body(repository):
+        for i in range(7):
+            await repository.create(f"p{i}", f"Project {i}")
+        first = await repository.list(limit=3)
+        # Projects created while paging do not shift the following pages
+        await repository.create("p7", "Project 7")
+        second = await repository.list(limit=3, cursor=first["next_cursor"])
+        return first, second, await _pages(repository, 3)
+
+    first, second, pages = _with_repository(tmp_path, body)
+
+    assert [project["id"] for project in first["projects"]] == ["p6", "p5", "p4"]
+    assert [project["id"] for project in second["projects"]] == ["p3", "p2", "p1"]
+    assert pages == [["p7", "p6", "p5"], ["p4", "p3", "p2"], ["p1", "p0"]]
+
+
+def test_list_filters_by_status(tmp_path):
+    async def body(repository):
+        for i in range(5):
+            await repository.create(f"p{i}", f"Project {i}")
+        for project_id in ("p0", "p2", "p3"):
+            await repository.set_status(project_id, ProjectStatus.RUNNING)
+        return await _pages(repository, 2, status=ProjectStatus.RUNNING), await repository.list_active()
+
+    pages, active = _with_repository(tmp_path, body)
+
+    assert pages == [["p3", "p2"], ["p0"]]
+    assert [project["id"] for project in active] == ["p0", "p2", "p3"]
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_replacing_a_file_returns_the_old_checksum(tmp_path):
+    async def body(repository):
+        await repository.create("p1", "Project 1")
+        await repository.record_file("p1", "protein.pdb", "projects/p1/protein.pdb", 10, "a" * 64)
+        _, replaced = await repository.record_file("p1", "protein.pdb", "projects/p1/protein.pdb", 12, "b" * 64)
+        # Validation of the replaced upload finishing late is not recorded
+        stale = await repository.set_file_validation("p1", "protein.pdb", "a" * 64, [])
+        current = await repository.set_file_validation(
+            "p1", "protein.pdb", "b" * 64, [{"severity": "error", "message": "no atoms"}]
+        )
+        return replaced, stale, current, await repository.list_files("p1")
+
+    replaced, stale, current, files = _with_repository(tmp_path, body)
+
+    assert replaced == ["a" * 64]
+    assert (stale, current) == (False, True)
+    assert len(files) == 1
+    assert files[0]["size"] == 12 and files[0]["is_validated"] is False
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+from app.services.scheduler_service import JobStatus, SimulationScheduler
+
+
+def _config(cores: int, runtime: float):
+    return {"ntomp": cores, "estimated_runtime_s": runtime}
+
+
+def _run(scenario):
+    async def main():
+        gates = {}
+
+        def runner_for(name):
+            gates[name] = asyncio.Event()
+
+            async def runner(job):
+                await gates[name].wait()
+            return runner
+
+        await scenario(runner_for, gates)
+    asyncio.run(main())
+
+
+def test_jobs_get_first_fit_blocks_and_pin_offsets():
+    async def scenario(runner_for, gates):
+        scheduler = SimulationScheduler(total_cores=8, max_concurrent=0)
+        a = scheduler.submit("a", _config(2, 100), runner_for("a"))
+        b = scheduler.submit("b", _config(4, 100), runner_for("b"))
+        c = scheduler.submit("c", _config(2, 100), runner_for("c"))
+
+        assert (a.cores, a.pin_offset) == ([0, 1], 0)
+        assert (b.cores, b.pin_offset) == ([2, 3, 4, 5], 2)
+        assert (c.cores, c.pin_offset) == ([6, 7], 6)
+
+        # The first gap large enough is reused once a job ends
+        gates["a"].set()
+        await a.task
+        d = scheduler.submit("d", _config(1, 100), runner_for("d"))
+        assert d.pin_offset == 0
+
+        for gate in gates.values():
+            gate.set()
+        await asyncio.gather(b.task, c.task, d.task)
+        assert scheduler.status()["free_cores"] == 8
+
+    _run(scenario)
+
+
+def test_head_waits_for_contiguous_block():
+    async def scenario(runner_for, gates):
+        scheduler = SimulationScheduler(total_cores=8, max_concurrent=0)
+        a = scheduler.submit("a", _config(2, 100), runner_for("a"))
+        b = scheduler.submit("b", _config(2, 1000), runner_for("b"))
+        c = scheduler.submit("c", _config(2, 100), runner_for("c"))
+        d = scheduler.submit("d", _config(2, 1000), runner_for("d"))
+        gates["a"].set()
+        gates["c"].set()
+        await asyncio.gather(a.task, c.task)
+        assert [b.cores, d.cores] == [[2, 3], [6, 7]]
+
+        # Four cores are free, but only in blocks of two: the head has to wait
+        # for b and d, not for the first job to end
+        head = scheduler.submit("head", _config(4, 100), runner_for("head"))
+        assert head.status == JobStatus.QUEUED
+        start = scheduler.estimated_start_times()[head.id]
+        assert start >= time.time() + 900
+
+        for gate in gates.values():
+            gate.set()
+
+    _run(scenario)
+
+
+def test_backfill_does_not_delay_head():
+    async def scenario(runner_for, gates):
+        scheduler = SimulationScheduler(total_cores=8, max_concurrent=0)
+        long = scheduler.submit("long", _config(4, 1000), runner_for("long"))
+        short = scheduler.submit("short", _config(2, 100), runner_for("short"))
+        head = scheduler.submit("head", _config(6, 100), runner_for("head"))
+        assert [long.pin_offset, short.pin_offset] == [0, 4]
+        assert head.status == JobStatus.QUEUED
+
+        # Cores 6-7 are free; the head's block from the shadow time is 0-5
+        # (once long and short end), so a long job may only take 6-7 and one
+        # that ends before the shadow time may run anywhere free
+        outside = scheduler.submit("outside", _config(2, 5000), runner_for("outside"))
+        assert outside.backfilled and outside.cores == [6, 7]
+
+        gates["short"].set()
+        await short.task
+        blocking = scheduler.submit("blocking", _config(2, 5000), runner_for("blocking"))
+        quick = scheduler.submit("quick", _config(2, 10), runner_for("quick"))
+        assert blocking.status == JobStatus.QUEUED
+        assert quick.backfilled and quick.cores == [4, 5]
+
+        head_start = scheduler.estimated_start_times()[head.id]
+        assert head_start <= long.estimated_end + 1
+
+        for gate in gates.values():
+            gate.set()
+
+    _run(scenario)
+
+
+def test_finished_jobs_are_forgotten():
+    async def scenario(runner_for, gates):
+        scheduler = SimulationScheduler(total_cores=4, max_concurrent=0)
+        first = scheduler.submit("a", _config(1, 10), runner_for("first"))
+        gates["first"].set()
+        await first.task
+
+        second = scheduler.submit("a", _config(1, 10), runner_for("second"))
+        assert scheduler.get_job(first.id) is None
+        assert scheduler.job_for_project("a") is second
+
+        gates["second"].set()
+        await second.task
+        second.finished_at -= 2 * 86400
+        scheduler.submit("b", _config(1, 10), runner_for("b"))
+        assert scheduler.job_for_project("a") is None
+        gates["b"].set()
+
+    _run(scenario)
@@ -0,0 +1,302 @@
+import json
+import struct
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.cache_service import StageCache, snapshot_dir
+from app.services.distributed_service import (
+    RUN_PHASE_TASK,
+    DistributedExecutor,
+    NodeRegistry,
+    phase_stream_path,
+    phase_task_path
+)
+from app.services.gromacs_service import RUN_STATE_FILE, GromacsService
+from app.utils.gromacs_utils import (
+    ENX_FRAME_MAGIC,
+    ENX_NAMES_MAGIC,
+    ENX_VERSION,
+    XDR_DOUBLE,
+    EnergyFileReader,
+    MdrunProgressParser,
+    read_mdp
+)
+
+
+def test_progress_parser_reads_md_verbose_lines():
+    parser = MdrunProgressParser(nsteps=50000, dt=0.002)
+
+    first = parser.parse("step 12300, will finish Thu Oct 16 12:00:00 2026", now=0.0)
+    second = parser.parse("imb F  3% step 12400, will finish Thu Oct 16 12:00:00 2026", now=10.0)
+
+    assert first["step"] == 12300
+    assert first["time_ps"] == 12300 * 0.002
+    assert second["step"] == 12400
+    assert second["progress"] == 100.0 * 12400 / 50000
+    assert second["eta_seconds"] == (50000 - 12400) / 10.0
+
+
+def test_progress_parser_reads_minimizer_lines():
+    parser = MdrunProgressParser(nsteps=5000, dt=0.001, integrator="steep")
+
+    update = parser.parse("Step=   12, Dmax= 1.2e-02 nm, Epot= -4.56789e+05 Fmax= 2.34567e+03, atom= 1234")
+
+    assert update["step"] == 12
+    assert update["progress"] == 100.0 * 12 / 5000
+    assert "time_ps" not in update
+
+
+def test_progress_parser_ignores_other_lines():
+    parser = MdrunProgressParser(nsteps=5000, dt=0.002)
+
+    assert parser.parse("Steepest Descents converged to Fmax < 1000 in 812 steps") is None
+    assert parser.parse("Started mdrun on rank 0") is None
+
+
+def test_mock_prepare_system_writes_inputs_and_mdp_files(workdir, monkeypatch):
+    monkeypatch.setenv("MOCK_GROMACS", "true")
+    service = GromacsService()
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    (project_dir / "protein.pdb").write_text("ATOM      1  N   ALA A   1       1.000   1.000   1.000  1.00  0.00           N\n")
+
+    results = asyncio.run(service.prepare_system(str(project_dir), {"temperature": 310, "total_time": 1}))
+
+    assert (project_dir / "topol.top").exists()
+    for phase in ("minimization", "nvt", "npt", "production"):
+        assert results[f"{phase}_mdp"] == str(project_dir / f"{phase}.mdp")
+    assert read_mdp(project_dir / "nvt.mdp")["ref_t"].split()[0] == "310"
+    assert service.is_completed(str(project_dir), "prepare")
+    # MDP files are renamed into place; no temporary files are left behind
+    assert not [path for path in project_dir.iterdir() if path.name.endswith(".tmp")]
+
+
+class _FakeResult:
+    def __init__(self, task_id: str, state: str):
+        self.id = task_id
+        self.state = state
+        self.revoked = False
+
+    def ready(self):
+        return True
+
+    def get(self, propagate=True):
+        return {"node": "n1", "progress": None}
+
+    def revoke(self, **kwargs):
+        self.revoked = True
+
+
+class _FakeCelery:
+    """Just enough of a Celery app for DistributedExecutor.run_phase"""
+
+    def __init__(self, states):
+        self.results = {task_id: _FakeResult(task_id, state) for task_id, state in states.items()}
+        self.sent = []
+        fake = self
+
+        class Task:
+            def apply_async(self, args, queue):
+                result = _FakeResult(f"new-{len(fake.sent)}", "SUCCESS")
+                fake.sent.append((args, queue))
+                fake.results[result.id] = result
+                return result
+
+        self.tasks = {RUN_PHASE_TASK: Task()}
+
+    def AsyncResult(self, task_id):
+        return self.results.setdefault(task_id, _FakeResult(task_id, "PENDING"))
+
+
+def _run_remote_phase(workdir, previous_state):
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    phase_task_path(project_dir, "nvt").write_text("old")
+    phase_stream_path(project_dir, "nvt").write_text("Starting nvt simulation...\n")
+    celery = _FakeCelery({"old": previous_state})
+    registry = NodeRegistry()
+    registry.publish({"name": "n1", "cores": 8, "slots": 1, "queue": "node.n1"})
+    executor = DistributedExecutor(celery, registry, enabled=True)
+
+    async def run():
+        return [line async for line in executor.run_phase(str(project_dir), "nvt", {"ntomp": 4})]
+
+    lines = asyncio.run(run())
+    return celery, lines, project_dir
+
+
+def test_remote_phase_with_unknown_task_is_sent_again(workdir):
+    celery, lines, project_dir = _run_remote_phase(workdir, "PENDING")
+
+    assert celery.results["old"].revoked
+    assert [queue for _, queue in celery.sent] == ["node.n1"]
+    assert lines[-1] == "nvt finished on node n1\n"
+    assert not phase_task_path(project_dir, "nvt").exists()
+
+
+def test_remote_phase_started_before_restart_is_followed(workdir):
+    celery, lines, _ = _run_remote_phase(workdir, "STARTED")
+
+    assert celery.sent == []
+    assert not celery.results["old"].revoked
+    assert lines[0] == "Following nvt task old sent before restart\n"
+
+
+def _xdr_string(value: str) -> bytes:
+    data = value.encode()
+    return struct.pack(">I", len(data)) + data + b"\0" * (-len(data) % 4)
+
+
+def _edr_header(terms) -> bytes:
+    header = struct.pack(">iii", ENX_NAMES_MAGIC, ENX_VERSION, len(terms))
+    return header + b"".join(_xdr_string(name) + _xdr_string(unit) for name, unit in terms)
+
+
+def _edr_frame(step: int, energies, real: str = ">f4", block=None) -> bytes:
+    """A version 5 frame; `block` adds one sub-block of doubles, as mdrun writes for e.g. restraints"""
+    frame = np.array([-2e10], dtype=real).tobytes()
+    frame += struct.pack(">iidqiqdiii", ENX_FRAME_MAGIC, ENX_VERSION, step * 0.002, step, 0, 0, 0.002,
+                         len(energies), 0, 1 if block is not None else 0)
+    if block is not None:
+        frame += struct.pack(">iiii", 0, 1, XDR_DOUBLE, len(block))
+    frame += struct.pack(">iii", 0, 0, 0)
+    frame += np.asarray(energies, dtype=real).tobytes()
+    if block is not None:
+        frame += np.asarray(block, dtype=">f8").tobytes()
+    return frame
+
+
+def test_energy_reader_decodes_only_complete_appended_frames(tmp_path):
+    path = tmp_path / "md.edr"
+    frames = [_edr_frame(step, [-1000.0 - step, 300.0 + step]) for step in range(5)]
+    data = _edr_header([("Potential", "kJ/mol"), ("Temperature", "K")]) + b"".join(frames)
+    # mdrun is midway through writing the fourth frame
+    cut = len(data) - len(frames[-1]) - 7
+    path.write_bytes(data[:cut])
+    reader = EnergyFileReader(str(path))
+
+    assert reader.update() == 3
+    assert reader.term_names == ["Potential", "Temperature"]
+
+    path.write_bytes(data)
+    new = reader.read_new(["Temperature"])
+
+    assert list(new["step"]) == [3, 4]
+    assert list(new["Temperature"]) == [303.0, 304.0]
+    assert list(reader.columns()["Potential"]) == [-1000.0, -1001.0, -1002.0, -1003.0, -1004.0]
+    assert reader.update() == 0
+
+
+def test_energy_reader_skips_blocks_and_reads_double_precision(tmp_path):
+    path = tmp_path / "md.edr"
+    path.write_bytes(
+        _edr_header([("Pressure", "bar")])
+        + _edr_frame(0, [1.5], real=">f8", block=[9.0, 9.0])
+        + _edr_frame(10, [], real=">f8", block=[9.0])
+        + _edr_frame(20, [2.5], real=">f8")
+    )
+    reader = EnergyFileReader(str(path))
+
+    assert reader.update() == 2
+    columns = reader.columns()
+    assert list(columns["step"]) == [0, 20]
+    assert list(columns["Pressure"]) == [1.5, 2.5]
+    with pytest.raises(ValueError):
+        reader.columns(["Density"])
+
+
+def test_energy_reader_starts_over_when_the_file_is_rewritten(tmp_path):
+    path = tmp_path / "md.edr"
+    header = _edr_header([("Potential", "kJ/mol")])
+    path.write_bytes(header + b"".join(_edr_frame(step, [float(step)]) for step in range(4)))
+    reader = EnergyFileReader(str(path))
+    reader.update()
+
+    path.write_bytes(header + _edr_frame(100, [7.0]))
+
+    assert reader.update() == 1
+    assert list(reader.columns()["step"]) == [100]
+
+
+def test_stage_cache_restores_outputs_into_another_project(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    first = tmp_path / "p1"
+    first.mkdir()
+    (first / "protein.pdb").write_text("ATOM\n")
+    key = cache.key("pdb2gmx", {"forcefield": "amber99sb-ildn"}, [first / "protein.pdb"])
+
+    before = snapshot_dir(first)
+    (first / "processed.gro").write_text("gro\n")
+    (first / "topol.top").write_text("top\n")
+    cache.store("pdb2gmx", key, first, before, {"gro": str(first / "processed.gro")})
+
+    second = tmp_path / "p2"
+    second.mkdir()
+    (second / "protein.pdb").write_text("ATOM\n")
+    same_key = cache.key("pdb2gmx", {"forcefield": "amber99sb-ildn"}, [second / "protein.pdb"])
+    restored = cache.restore("pdb2gmx", same_key, second)
+
+    assert restored == {"gro": str(second / "processed.gro")}
+    assert (second / "topol.top").read_text() == "top\n"
+    # Only what the stage wrote is stored, not its inputs
+    assert cache.lookup("pdb2gmx", key)["files"] == ["processed.gro", "topol.top"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_stage_cache_key_changes_with_anything_upstream(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    pdb = tmp_path / "protein.pdb"
+    pdb.write_text("ATOM\n")
+    key = cache.key("solvate", {"box": 1.0}, [pdb], upstream_key="a")
+
+    assert cache.key("solvate", {"box": 1.0}, [pdb], upstream_key="a") == key
+    assert cache.key("solvate", {"box": 1.2}, [pdb], upstream_key="a") != key
+    assert cache.key("solvate", {"box": 1.0}, [pdb], upstream_key="b") != key
+    pdb.write_text("ATOM 2\n")
+    assert cache.key("solvate", {"box": 1.0}, [pdb], upstream_key="a") != key
+    assert cache.restore("solvate", key, tmp_path) is None
+
+
+def _segment_outputs(project_dir, out: bytes, log: bytes, state=None):
+    (project_dir / "md.out").write_bytes(out)
+    (project_dir / "md.log").write_bytes(log)
+    if state is not None:
+        (project_dir / RUN_STATE_FILE).write_text(json.dumps(state))
+    return GromacsService()._segment_outcome(project_dir, "md")
+
+
+def test_segment_outcome_reads_only_the_last_segment(tmp_path):
+    first_segment = b"step 100\nRun time exceeded 0.99 hours, will terminate the run\n"
+    first_log = b"Writing checkpoint, step 100\n"
+
+    assert _segment_outputs(tmp_path, first_segment, first_log) == "walltime"
+    assert _segment_outputs(tmp_path, b"step 100\nReceived the TERM signal, stopping\n", first_log) == "signal"
+    # The second segment appends to the outputs of the first
+    offsets = {"offset": len(first_segment), "log_offset": len(first_log)}
+    assert _segment_outputs(
+        tmp_path, first_segment + b"step 200\n", first_log + b"Finished mdrun on rank 0\n", offsets
+    ) == "finished"
+    assert _segment_outputs(tmp_path, first_segment + b"step 150\n", first_log + b"step 150\n", offsets) == "crashed"
+
+
+def test_mock_phase_resumes_from_its_checkpoint(workdir, monkeypatch):
+    monkeypatch.setenv("MOCK_GROMACS", "true")
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    (project_dir / "nvt.cpt").write_text("8")
+
+    async def run():
+        service = GromacsService()
+        return [line async for line in service.run_simulation_phase(str(project_dir), "nvt", {})], service
+
+    lines, service = asyncio.run(run())
+
+    assert lines[0] == "Resuming nvt simulation from checkpoint nvt.cpt (mock mode)\n"
+    assert [line for line in lines if line.startswith("Step")] == ["Step 900, Progress: 90%\n", "Step 1000, Progress: 100%\n"]
+    assert service.is_completed(str(project_dir), "nvt")
+
+    service.reset_run_state(str(project_dir))
+    assert not (project_dir / "nvt.cpt").exists()
+    assert not service.is_completed(str(project_dir), "nvt")
@@ -0,0 +1,52 @@
+import asyncio
+
+from app.services.validation_service import ValidationService, validate_file
+
+GRO = "test\n    2\n    1ALA     CA    1   1.000   1.000   1.000\n    1ALA      C    2   1.150   1.000   1.000\n   3.0   3.0   3.0\n"
+
+
+def test_validate_file_reports_broken_files(workdir):
+    (workdir / "empty.dat").write_bytes(b"")
+    (workdir / "bad.gro").write_text("test\n    5\n    1ALA     CA    1   1.000\n")
+
+    empty = validate_file(str(workdir / "empty.dat"), None, str(workdir))
+    bad = validate_file(str(workdir / "bad.gro"), None, str(workdir))
+
+    assert [issue["severity"] for issue in empty["issues"]] == ["error"]
+    assert [issue["severity"] for issue in bad["issues"]] == ["error"]
+    assert "validation_seconds" in bad["summary"]
+
+
+def test_files_are_validated_in_parallel_with_progress(workdir):
+    project_dir = workdir / "projects" / "p1"
+    project_dir.mkdir()
+    (project_dir / "conf.gro").write_text(GRO)
+    (project_dir / "empty.dat").write_bytes(b"")
+    (project_dir / "md.mdp").write_text("integrator = md\nnsteps = 1000\ndt = 0.002\n")
+    files = [{"filename": name, "checksum": None} for name in ("conf.gro", "empty.dat", "md.mdp")]
+
+    async def run():
+        service = ValidationService(str(workdir), workers=2)
+        results = {}
+        done = asyncio.Event()
+
+        async def on_result(project_id, project_file, result, progress):
+            results[project_file["filename"]] = (result, progress)
+            if progress["pending"] == 0:
+                done.set()
+
+        try:
+            service.submit("p1", files, None, on_result)
+            assert service.progress("p1") == {"total": 3, "done": 0, "pending": 3}
+            await asyncio.wait_for(done.wait(), 60)
+        finally:
+            await service.shutdown()
+        return results, service.progress("p1")
+
+    results, final = asyncio.run(run())
+
+    assert sorted(results) == ["conf.gro", "empty.dat", "md.mdp"]
+    assert sorted(progress["done"] for _, progress in results.values()) == [1, 2, 3]
+    assert results["conf.gro"][0]["summary"]["n_atoms"] == 2
+    assert [issue["severity"] for issue in results["empty.dat"][0]["issues"]] == ["error"]
+    assert final == {"total": 0, "done": 0, "pending": 0}
@@ -0,0 +1,167 @@
+import json
+import time
+import asyncio
+
+import msgpack
+
+from app.api import websocket as websocket_module
+from app.api.websocket import ClientConnection, ConnectionManager, ProjectStream
+
+
+class _FakeWebSocket:
+    """Records the frames sent to it; `fail` makes every send raise"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.frames = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_broadcast_reaches_only_subscribers_of_the_project():
+    async def run():
+        manager = ConnectionManager(batch_interval=0.01)
+        first, second, other = _FakeWebSocket(), _FakeWebSocket(), _FakeWebSocket()
+        await manager.connect(first, "p1")
+        await manager.connect(second, "p1")
+        await manager.connect(other, "p2")
+
+        await manager.broadcast("step 1\n", "p1")
+        await asyncio.sleep(0.05)
+        return first, second, other
+
+    first, second, other = asyncio.run(run())
+
+    assert first.frames == second.frames == ["step 1\n"]
+    assert other.frames == []
+
+
+def test_full_queue_drops_oldest_frames_and_reports_them():
+    async def run():
+        ws = _FakeWebSocket()
+        client = ClientConnection(ws, "p1", max_queue=3)
+        for i in range(5):
+            assert client.enqueue(f"line {i}\n")
+        client.sender = asyncio.create_task(client.run_sender(None))
+        await asyncio.sleep(0.01)
+        client.closed = True
+        client.sender.cancel()
+        return ws
+
+    ws = asyncio.run(run())
+
+    assert ws.frames == ["[2 messages dropped: connection too slow]\n", "line 2\n", "line 3\n", "line 4\n"]
+
+
+def test_client_stalled_past_the_timeout_is_refused(monkeypatch):
+    monkeypatch.setattr(websocket_module, "STALL_TIMEOUT", 1)
+
+    async def run():
+        client = ClientConnection(_FakeWebSocket(), "p1", max_queue=1)
+        client.enqueue("a")
+        first_drop = client.enqueue("b")
+        client.full_since = time.monotonic() - 2
+        return first_drop, client.enqueue("c")
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_failing_client_is_evicted_without_affecting_others():
+    async def run():
+        manager = ConnectionManager(batch_interval=0.01)
+        healthy, broken = _FakeWebSocket(), _FakeWebSocket(fail=True)
+        await manager.connect(healthy, "p1")
+        await manager.connect(broken, "p1")
+
+        await manager.broadcast("step 1\n", "p1")
+        await asyncio.sleep(0.05)
+        return manager, healthy, broken
+
+    manager, healthy, broken = asyncio.run(run())
+
+    assert healthy.frames == ["step 1\n"]
+    assert broken.closed_with == 1008
+    assert manager.active_connections == [healthy]
+    assert manager.subscriber_count("p1") == 1
+
+
+def test_lines_within_a_batch_interval_go_out_as_one_frame():
+    async def run():
+        manager = ConnectionManager(batch_interval=0.02)
+        text, typed = _FakeWebSocket(), _FakeWebSocket()
+        await manager.connect(text, "p1")
+        await manager.connect(typed, "p1", fmt="json")
+
+        for i in range(100):
+            await manager.broadcast(f"step {i}\n", "p1")
+        await asyncio.sleep(0.08)
+        return manager, text, typed
+
+    manager, text, typed = asyncio.run(run())
+
+    assert text.frames == ["".join(f"step {i}\n" for i in range(100))]
+    hello, logs = (json.loads(frame) for frame in typed.frames)
+    assert hello["type"] == "hello" and hello["seq"] == 0
+    assert logs == {"type": "logs", "seq": 1, "lines": [f"step {i}\n" for i in range(100)]}
+    assert manager.batches_sent == 1 and manager.lines_received == 100
+
+
+def test_reconnecting_client_receives_the_lines_it_missed():
+    async def run():
+        manager = ConnectionManager(batch_interval=0.01)
+        for i in range(10):
+            await manager.broadcast(f"step {i}\n", "p1")
+        await asyncio.sleep(0.03)
+
+        ws = _FakeWebSocket()
+        await manager.connect(ws, "p1", fmt="msgpack", since=7)
+        await asyncio.sleep(0.01)
+        return ws
+
+    ws = asyncio.run(run())
+
+    hello, logs = (msgpack.unpackb(frame) for frame in ws.frames)
+    assert hello["seq"] == 10
+    assert logs == {"type": "logs", "seq": 8, "lines": ["step 7\n", "step 8\n", "step 9\n"]}
+
+
+def test_replay_reports_lines_no_longer_held():
+    stream = ProjectStream(replay=3)
+    for i in range(10):
+        stream.append(f"step {i}\n")
+
+    assert stream.since(2) == (8, ["step 7\n", "step 8\n", "step 9\n"], 5)
+    assert stream.since(10) == (11, [], 0)
+    # A sequence number from before a server restart starts over
+    assert stream.since(50) == (8, ["step 7\n", "step 8\n", "step 9\n"], 7)
+
+
+def test_progress_is_throttled_to_the_latest_value():
+    async def run():
+        manager = ConnectionManager(progress_interval=0.05)
+        ws = _FakeWebSocket()
+        await manager.connect(ws, "p1", fmt="json")
+
+        for step in range(50):
+            manager.publish_progress("p1", {"step": step})
+        await asyncio.sleep(0.1)
+        return ws
+
+    ws = asyncio.run(run())
+
+    progress = [json.loads(frame) for frame in ws.frames if json.loads(frame)["type"] == "progress"]
+    assert len(progress) <= 2
+    assert progress[-1] == {"type": "progress", "version": 50, "progress": {"step": 49}}
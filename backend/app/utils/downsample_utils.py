@@ -0,0 +1,208 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Points (or buckets) merged into one bucket of the next pyramid level
+PYRAMID_FACTOR = 2
+
+# LTTB picks from up to this many times the requested points
+LTTB_OVERSAMPLE = 4
+
+DOWNSAMPLE_METHODS = ("minmax", "lttb")
+
+
+def _reserve(array: np.ndarray, used: int, needed: int) -> np.ndarray:
+    """`array` with room for `needed` items, keeping the first `used`"""
+    if needed <= len(array):
+        return array
+    # Grow geometrically so appends stay amortized O(new items)
+    grown = np.empty(max(needed, 2 * len(array), 1024), dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+def lttb(times: np.ndarray, values: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices of `points` samples chosen by largest-triangle-three-buckets.
+
+    The first and last samples are kept and the rest split into points - 2
+    buckets; each bucket keeps the sample forming the largest triangle with
+    the means of the neighbouring buckets. Anchoring on the previous bucket's
+    mean rather than its selected sample makes the buckets independent, so
+    the whole selection is a few vectorized passes.
+    """
+    n = len(times)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1][:max(points, 1)])
+
+    # Buckets over samples 1 .. n - 2, as [edges[i], edges[i + 1])
+    edges = np.linspace(1, n - 1, points - 1).round().astype(np.int64)
+    lengths = np.diff(edges)
+    bucket_t = np.add.reduceat(times[1:n - 1], edges[:-1] - 1) / lengths
+    bucket_v = np.add.reduceat(values[1:n - 1], edges[:-1] - 1) / lengths
+
+    prev_t = np.concatenate([times[:1], bucket_t[:-1]])
+    prev_v = np.concatenate([values[:1], bucket_v[:-1]])
+    next_t = np.concatenate([bucket_t[1:], times[-1:]])
+    next_v = np.concatenate([bucket_v[1:], values[-1:]])
+
+    # Twice the triangle area (previous anchor, sample, next anchor) of every sample
+    at, av = np.repeat(prev_t, lengths), np.repeat(prev_v, lengths)
+    ct, cv = np.repeat(next_t, lengths), np.repeat(next_v, lengths)
+    t, v = times[1:n - 1], values[1:n - 1]
+    area = np.abs((at - ct) * (v - av) - (at - t) * (cv - av))
+
+    # First sample of each bucket reaching the bucket's largest area
+    best = np.maximum.reduceat(area, edges[:-1] - 1)
+    candidates = np.flatnonzero(area == np.repeat(best, lengths))
+    buckets = np.repeat(np.arange(len(lengths)), lengths)[candidates]
+    _, first = np.unique(buckets, return_index=True)
+    return np.concatenate([[0], candidates[first] + 1, [n - 1]])
+
+
+class SeriesPyramid:
+    """
+    Min/max envelopes of a time series at successively coarser resolutions.
+
+    Level k holds, for every run of PYRAMID_FACTOR ** k consecutive samples,
+    the indices of its smallest and largest value. Levels are built from the
+    level below, only over complete buckets, and all arrays grow with spare
+    capacity, so appending samples costs amortized time proportional to the
+    new samples. A query picks the coarsest level
+    that still resolves the requested number of points over the window, and
+    so reads O(points) entries whatever the length of the series.
+    """
+
+    def __init__(self, factor: int = PYRAMID_FACTOR):
+        self.factor = factor
+        self.n = 0
+        self._times = np.empty(0, dtype=np.float64)
+        self._values = np.empty(0, dtype=np.float64)
+        # _mins[k - 1] and _maxs[k - 1] hold the _sizes[k - 1] buckets of level k
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+        self._sizes: List[int] = []
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[:self.n]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self.n]
+
+    def level(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Min and max sample indices of the buckets of level k (k >= 1)"""
+        size = self._sizes[k - 1]
+        return self._mins[k - 1][:size], self._maxs[k - 1][:size]
+
+    @property
+    def depth(self) -> int:
+        return len(self._sizes)
+
+    def extends(self, times: np.ndarray, values: np.ndarray) -> bool:
+        """Whether a series looks like this one with (possibly zero) samples appended; spot-checks its ends"""
+        n = self.n
+        if n == 0:
+            return True
+        return (len(times) >= n and times[0] == self.times[0] and times[n - 1] == self.times[-1]
+                and values[0] == self.values[0] and values[n - 1] == self.values[-1])
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> None:
+        """Append samples, which must come after the current ones"""
+        count = len(times)
+        if not count:
+            return
+        n = self.n
+        self._times = _reserve(self._times, n, n + count)
+        self._values = _reserve(self._values, n, n + count)
+        self._times[n:n + count] = times
+        self._values[n:n + count] = values
+        self.n = n + count
+
+        factor = self.factor
+        level = 1
+        while self.n // factor ** level:
+            below = self.n if level == 1 else self._sizes[level - 2]
+            if self.depth < level:
+                self._mins.append(np.empty(0, dtype=np.int64))
+                self._maxs.append(np.empty(0, dtype=np.int64))
+                self._sizes.append(0)
+            size = self._sizes[level - 1]
+            first, last = size * factor, below // factor * factor
+            if last > first:
+                if level == 1:
+                    min_candidates = max_candidates = np.arange(first, last).reshape(-1, factor)
+                else:
+                    below_mins, below_maxs = self.level(level - 1)
+                    min_candidates = below_mins[first:last].reshape(-1, factor)
+                    max_candidates = below_maxs[first:last].reshape(-1, factor)
+                rows = np.arange(len(min_candidates))
+                added = len(rows)
+                self._mins[level - 1] = _reserve(self._mins[level - 1], size, size + added)
+                self._maxs[level - 1] = _reserve(self._maxs[level - 1], size, size + added)
+                self._mins[level - 1][size:size + added] = min_candidates[rows, self.values[min_candidates].argmin(axis=1)]
+                self._maxs[level - 1][size:size + added] = max_candidates[rows, self.values[max_candidates].argmax(axis=1)]
+                self._sizes[level - 1] = size + added
+            level += 1
+
+    def _indices(self, level: int, start: int, stop: int) -> List[np.ndarray]:
+        """Sample indices representing samples [start, stop) at `level`, in order"""
+        if start >= stop:
+            return []
+        if level == 0:
+            return [np.arange(start, stop)]
+
+        size = self.factor ** level
+        mins, maxs = self.level(level)
+        first = -(-start // size)
+        last = min(stop // size, len(mins))
+        if first >= last:
+            return self._indices(level - 1, start, stop)
+
+        # Each bucket contributes its extremes in time order; the partial
+        # buckets at either end come from the finer levels
+        pairs = np.stack([np.minimum(mins[first:last], maxs[first:last]),
+                          np.maximum(mins[first:last], maxs[first:last])], axis=1).ravel()
+        return (self._indices(level - 1, start, first * size) + [pairs]
+                + self._indices(level - 1, last * size, stop))
+
+    def query(
+        self,
+        points: int,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        method: str = "minmax"
+    ) -> Dict:
+        """
+        At most `points` samples of the window [start_time, end_time] (ps):
+        the min/max envelope of the visible buckets, or an LTTB selection
+        made from a finer envelope
+        """
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Unknown downsampling method: {method}")
+
+        start = 0 if start_time is None else int(np.searchsorted(self.times, start_time, "left"))
+        stop = self.n if end_time is None else int(np.searchsorted(self.times, end_time, "right"))
+        count = max(0, stop - start)
+
+        budget = points if method == "minmax" else points * LTTB_OVERSAMPLE
+        level = 0
+        while count > budget and level < self.depth and 2 * count / self.factor ** level > budget:
+            level += 1
+
+        parts = self._indices(level, start, stop)
+        indices = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        if len(indices):
+            indices = indices[np.concatenate([[True], indices[1:] != indices[:-1]])]
+        if len(indices) > points:
+            indices = indices[lttb(self.times[indices], self.values[indices], points)]
+
+        return {
+            "time_ps": self.times[indices],
+            "values": self.values[indices],
+            "level": level,
+            "window_points": count
+        }
@@ -0,0 +1,356 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# PDB coordinates and box lengths are in Angstrom, everything else in nm
+ANGSTROM_TO_NM = 0.1
+
+# Bytes of a PDB line that carry atom fields
+PDB_LINE_WIDTH = 80
+
+ATOM_RECORDS = (b"ATOM  ", b"HETATM")
+
+# Lines gathered at a time when a file's lines differ in length
+LINE_BLOCK = 65536
+
+# Widest slice taken from a line (PDB atom fields, GRO lines with high precision)
+LINE_PADDING = 128
+
+# Widths of a GRO coordinate column: precision 1 to 10 ("%8.3f" is 8)
+GRO_COLUMN_WIDTHS = range(6, 16)
+
+
+class Structure:
+    """
+    Atoms of a PDB or GRO file as NumPy arrays.
+
+    Names, residue names, chains, insertion codes and elements are
+    fixed-width byte strings; `positions` has shape (n_atoms, 3) in nm and
+    `box` holds box lengths (nm) and angles (degrees), or is None when the
+    file has no box.
+    """
+
+    ARRAYS = ("names", "resnames", "resids", "chains", "icodes", "elements", "hetero", "positions")
+
+    def __init__(
+        self,
+        names: np.ndarray,
+        resnames: np.ndarray,
+        resids: np.ndarray,
+        chains: np.ndarray,
+        icodes: np.ndarray,
+        elements: np.ndarray,
+        hetero: np.ndarray,
+        positions: np.ndarray,
+        box: Optional[np.ndarray] = None
+    ):
+        self.names = names
+        self.resnames = resnames
+        self.resids = resids
+        self.chains = chains
+        self.icodes = icodes
+        self.elements = elements
+        self.hetero = hetero
+        self.positions = positions
+        self.box = box
+
+    @property
+    def n_atoms(self) -> int:
+        return len(self.names)
+
+    def residue_starts(self) -> np.ndarray:
+        """Index of the first atom of each residue"""
+        if self.n_atoms == 0:
+            return np.zeros(0, dtype=np.int64)
+        changed = (
+            (self.resids[1:] != self.resids[:-1])
+            | (self.resnames[1:] != self.resnames[:-1])
+            | (self.chains[1:] != self.chains[:-1])
+            | (self.icodes[1:] != self.icodes[:-1])
+        )
+        return np.concatenate(([0], np.flatnonzero(changed) + 1))
+
+    def residues(self) -> List[Dict]:
+        """Residues in file order, each with its chain, sequence number, name and atom names"""
+        starts = self.residue_starts()
+        atoms = np.split(self.names.astype(str), starts[1:]) if len(starts) else []
+        return [
+            {
+                "chain": self.chains[start].decode(),
+                "resseq": f"{self.resids[start]}{self.icodes[start].decode()}",
+                "name": self.resnames[start].decode(),
+                "atoms": names.tolist()
+            }
+            for start, names in zip(starts.tolist(), atoms)
+        ]
+
+    def summary(self) -> Dict:
+        """Counts, chains and extent used for display and box sizing"""
+        positions = self.positions.astype(np.float64)
+        lower = positions.min(axis=0) if self.n_atoms else np.zeros(3)
+        upper = positions.max(axis=0) if self.n_atoms else np.zeros(3)
+        return {
+            "n_atoms": self.n_atoms,
+            "n_residues": len(self.residue_starts()),
+            "chains": sorted({chain.decode() for chain in np.unique(self.chains)}),
+            "n_hetero_atoms": int(self.hetero.sum()),
+            "center_nm": ((lower + upper) / 2).round(4).tolist(),
+            "extent_nm": (upper - lower).round(4).tolist(),
+            "box": self.box.astype(np.float64).round(4).tolist() if self.box is not None else None
+        }
+
+    def save(self, path: str) -> None:
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        if self.box is not None:
+            arrays["box"] = self.box
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "Structure":
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in cls.ARRAYS}
+            box = data["box"] if "box" in data.files else None
+        return cls(box=box, **arrays)
+
+
+def _split_lines(data: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    File buffer as bytes, with the start offset and length (without line
+    break) of every line. The buffer is padded past the end so that any
+    line can be read LINE_PADDING bytes wide.
+    """
+    buf = np.frombuffer(data + b" " * LINE_PADDING, dtype=np.uint8)
+    breaks = np.flatnonzero(buf[:len(data)] == ord("\n"))
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(data)]))
+    # Windows line endings
+    ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == ord("\r")))
+    return buf, starts, ends - starts
+
+
+def _line_matrix(buf: np.ndarray, starts: np.ndarray, lengths: np.ndarray, width: int) -> np.ndarray:
+    """(n_lines, width) bytes of the given lines, blanked past each line's end"""
+    if width > LINE_PADDING:
+        raise ValueError(f"Lines cannot be read {width} bytes wide")
+    steps = np.diff(starts)
+    if len(starts) and (len(steps) == 0 or (steps == steps[0]).all()):
+        # Evenly spaced lines (most generated files): a view of the buffer
+        step = int(steps[0]) if len(steps) else 0
+        rows = np.lib.stride_tricks.as_strided(
+            buf[starts[0]:], shape=(len(starts), width), strides=(step, 1), writeable=False
+        )
+    else:
+        rows = np.empty((len(starts), width), dtype=np.uint8)
+        columns = np.arange(width)
+        # Gather in blocks so the index array stays small for million-atom files
+        for first in range(0, len(starts), LINE_BLOCK):
+            block = slice(first, first + LINE_BLOCK)
+            rows[block] = buf[starts[block, None] + columns]
+
+    if (lengths < width).any():
+        rows = np.where(np.arange(width) < lengths[:, None], rows, np.uint8(ord(" ")))
+    return rows
+
+
+def _field(matrix: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """Fixed-width column of a line matrix as stripped byte strings"""
+    column = np.ascontiguousarray(matrix[:, start:stop]).view(f"S{stop - start}").ravel()
+    return np.char.strip(column)
+
+
+def _hybrid36(value: bytes, width: int) -> int:
+    """
+    Decode a hybrid-36 number: decimal up to 10**width - 1, then base 36
+    with upper-case letters (A000 = 10000 for width 4), then lower-case
+    """
+    text = value.decode("ascii")
+    if not text[:1].isalpha() or not text.isalnum():
+        return int(text)
+    offset = 10 ** width - 10 * 36 ** (width - 1)
+    if text.islower():
+        offset += 26 * 36 ** (width - 1)
+    elif not text.isupper():
+        raise ValueError(f"mixed case hybrid-36 number {text!r}")
+    return int(text, 36) + offset
+
+
+def _numbers(values: np.ndarray, dtype, what: str, default: bytes = None, hybrid36: int = 0) -> np.ndarray:
+    """
+    Column of numbers; with `hybrid36` set to the column width, values past
+    the decimal range (PDB serials and residue numbers) are decoded as hybrid-36
+    """
+    if default is not None:
+        values = np.where(values == b"", default, values)
+    try:
+        return values.astype(dtype)
+    except ValueError as e:
+        if not hybrid36:
+            raise ValueError(f"Invalid {what}: {e}") from None
+    # Only large structures use hybrid-36, so decode the non-decimal values one by one
+    decimal = np.char.isdigit(np.char.lstrip(values, b"-"))
+    numbers = np.zeros(len(values), dtype=dtype)
+    try:
+        numbers[decimal] = values[decimal].astype(dtype)
+        numbers[~decimal] = [_hybrid36(value, hybrid36) for value in values[~decimal]]
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid {what}: {e}") from None
+    return numbers
+
+
+def _guess_elements(names: np.ndarray) -> np.ndarray:
+    """First letter of the atom name, after any leading digits (1HB -> H)"""
+    return np.char.lstrip(names, b"0123456789").astype("S1")
+
+
+def parse_pdb(data: bytes) -> Structure:
+    """
+    ATOM/HETATM records of the first model of a PDB file. Fields are cut
+    from fixed columns of all atom lines at once, not line by line.
+    """
+    buf, starts, lengths = _split_lines(data)
+    records = np.ascontiguousarray(_line_matrix(buf, starts, lengths, 6)).view("S6").ravel()
+
+    # Only the first model describes the topology
+    end_model = np.flatnonzero(records == b"ENDMDL")
+    if len(end_model):
+        records = records[:end_model[0]]
+    atom_lines = np.flatnonzero(np.isin(records, ATOM_RECORDS))
+    if not len(atom_lines):
+        raise ValueError("No ATOM or HETATM records")
+
+    matrix = _line_matrix(buf, starts[atom_lines], lengths[atom_lines], PDB_LINE_WIDTH)
+    names = _field(matrix, 12, 16)
+    elements = _field(matrix, 76, 78)
+    elements = np.where(elements == b"", _guess_elements(names), elements)
+    x = _numbers(_field(matrix, 30, 38), np.float64, "x coordinate")
+    y = _numbers(_field(matrix, 38, 46), np.float64, "y coordinate")
+    z = _numbers(_field(matrix, 46, 54), np.float64, "z coordinate")
+
+    box = None
+    cryst = np.flatnonzero(records == b"CRYST1")
+    if len(cryst):
+        cell = _line_matrix(buf, starts[cryst[:1]], lengths[cryst[:1]], 54)
+        lengths_nm = [_numbers(_field(cell, a, b), np.float64, "CRYST1 cell") for a, b in ((6, 15), (15, 24), (24, 33))]
+        angles = [_numbers(_field(cell, a, b), np.float64, "CRYST1 cell") for a, b in ((33, 40), (40, 47), (47, 54))]
+        box = np.concatenate([np.concatenate(lengths_nm) * ANGSTROM_TO_NM, np.concatenate(angles)]).astype(np.float32)
+
+    return Structure(
+        names=names,
+        resnames=_field(matrix, 17, 21),
+        resids=_numbers(_field(matrix, 22, 26), np.int64, "residue number", default=b"0", hybrid36=4),
+        chains=_field(matrix, 21, 22),
+        icodes=_field(matrix, 26, 27),
+        elements=elements,
+        hetero=records[atom_lines] == b"HETATM",
+        positions=(np.stack([x, y, z], axis=1) * ANGSTROM_TO_NM).astype(np.float32),
+        box=box
+    )
+
+
+def _box_from_gro(values: np.ndarray) -> np.ndarray:
+    """Lengths (nm) and angles (degrees) of a GRO box line (3 or 9 values)"""
+    vectors = np.zeros((3, 3))
+    vectors[[0, 1, 2], [0, 1, 2]] = values[:3]
+    if len(values) == 9:
+        # v1(y) v1(z) v2(x) v2(z) v3(x) v3(y)
+        vectors[0, 1], vectors[0, 2], vectors[1, 0], vectors[1, 2], vectors[2, 0], vectors[2, 1] = values[3:9]
+    lengths = np.linalg.norm(vectors, axis=1)
+
+    def angle(a, b):
+        if lengths[a] == 0 or lengths[b] == 0:
+            return 90.0
+        return np.degrees(np.arccos(np.clip(vectors[a] @ vectors[b] / (lengths[a] * lengths[b]), -1, 1)))
+
+    return np.array([*lengths, angle(1, 2), angle(0, 2), angle(0, 1)], dtype=np.float32)
+
+
+def parse_gro(data: bytes) -> Structure:
+    """
+    Atoms and box of a GRO file. Coordinate columns are as wide as the
+    distance between the decimal points of the first atom line, so files
+    written with higher precision parse too.
+    """
+    buf, starts, lengths = _split_lines(data)
+    if len(starts) < 3:
+        raise ValueError("GRO file is missing its atom count or box line")
+    count = bytes(buf[starts[1]:starts[1] + lengths[1]]).strip()
+    try:
+        n_atoms = int(count)
+    except ValueError:
+        raise ValueError(f"Invalid GRO atom count: {count[:20]!r}") from None
+    if len(starts) < n_atoms + 3 or (len(starts) == n_atoms + 3 and lengths[n_atoms + 2] == 0):
+        raise ValueError(f"GRO file is truncated: expected {n_atoms} atom lines and a box line")
+
+    first = bytes(buf[starts[2]:starts[2] + lengths[2]])
+    dots = [i for i, c in enumerate(first) if c == ord(".") and i >= 20]
+    width = dots[1] - dots[0] if len(dots) >= 2 else 8
+    if width not in GRO_COLUMN_WIDTHS:
+        raise ValueError(f"Invalid GRO coordinate columns: decimal points {width} characters apart")
+    matrix = _line_matrix(buf, starts[2:2 + n_atoms], lengths[2:2 + n_atoms], 20 + 3 * width)
+    positions = np.stack([
+        _numbers(_field(matrix, 20 + i * width, 20 + (i + 1) * width), np.float64, "coordinate")
+        for i in range(3)
+    ], axis=1)
+
+    box_line = bytes(buf[starts[n_atoms + 2]:starts[n_atoms + 2] + lengths[n_atoms + 2]]).split()
+    try:
+        box = _box_from_gro(np.array([float(value) for value in box_line]))
+    except (ValueError, IndexError):
+        raise ValueError(f"Invalid GRO box line: {b' '.join(box_line)[:80]!r}") from None
+
+    names = _field(matrix, 10, 15)
+    return Structure(
+        names=names,
+        resnames=_field(matrix, 5, 10),
+        resids=_numbers(_field(matrix, 0, 5), np.int64, "residue number"),
+        chains=np.full(n_atoms, b"", dtype="S1"),
+        icodes=np.full(n_atoms, b"", dtype="S1"),
+        elements=_guess_elements(names),
+        hetero=np.zeros(n_atoms, dtype=bool),
+        positions=positions.astype(np.float32),
+        box=box
+    )
+
+
+def read_structure(path: Path) -> Structure:
+    """Parse a .pdb or .gro file in one read"""
+    suffix = Path(path).suffix.lower()
+    parsers = {".pdb": parse_pdb, ".gro": parse_gro}
+    if suffix not in parsers:
+        raise ValueError(f"Unsupported structure format: {suffix}")
+    with open(path, "rb") as f:
+        return parsers[suffix](f.read())
+
+
+def read_pdb_residues(path: Path) -> List[Dict]:
+    """
+    Residues of the ATOM/HETATM records of a PDB file, in file order, each
+    with its chain, sequence number, name and atom names
+    """
+    return read_structure(path).residues()
+
+
+def parse_byte_range(header: str, size: int) -> Tuple[int, int]:
+    """
+    First and last byte (inclusive) of a single-range HTTP Range header
+    ("bytes=0-499", "bytes=500-", "bytes=-500") for a file of `size` bytes.
+    Raises ValueError if the header is malformed or the range unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(f"Unsupported range: {header}")
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length <= 0 or size == 0:
+            raise ValueError(f"Unsatisfiable range: {header}")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
@@ -0,0 +1,555 @@
+import os
+import re
+import time
+import struct
+import threading
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Magic numbers and version of the XDR energy file format (src/gromacs/fileio/enxio.cpp)
+ENX_NAMES_MAGIC = -55555
+ENX_FRAME_MAGIC = -7777777
+ENX_VERSION = 5
+
+# xdr_datatype enum used for energy file sub-blocks
+XDR_INT, XDR_FLOAT, XDR_DOUBLE, XDR_INT64, XDR_CHAR, XDR_STRING = range(6)
+
+# Encoded size of one item of each sub-block type (XDR pads chars to 4 bytes)
+XDR_ITEM_SIZE = {XDR_INT: 4, XDR_FLOAT: 4, XDR_DOUBLE: 8, XDR_INT64: 8, XDR_CHAR: 4}
+
+
+class IncompleteData(Exception):
+    """Raised when the buffer ends in the middle of a record"""
+
+
+class _XdrBuffer:
+    """Big-endian XDR decoding over an in-memory buffer"""
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def _need(self, size: int) -> None:
+        if self.pos + size > len(self.data):
+            raise IncompleteData()
+
+    def unpack(self, fmt: str, size: int):
+        self._need(size)
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += size
+        return value
+
+    def int(self) -> int:
+        return self.unpack(">i", 4)
+
+    def int64(self) -> int:
+        return self.unpack(">q", 8)
+
+    def double(self) -> float:
+        return self.unpack(">d", 8)
+
+    def string(self) -> str:
+        length = self.unpack(">I", 4)
+        padded = (length + 3) & ~3
+        self._need(padded)
+        value = self.data[self.pos:self.pos + length].decode("ascii", errors="replace")
+        self.pos += padded
+        return value.rstrip("\0")
+
+    def array(self, dtype: str, count: int) -> np.ndarray:
+        size = np.dtype(dtype).itemsize * count
+        self._need(size)
+        values = np.frombuffer(self.data, dtype=dtype, count=count, offset=self.pos)
+        self.pos += size
+        return values
+
+    def skip(self, size: int) -> None:
+        self._need(size)
+        self.pos += size
+
+
+class EnergyFileReader:
+    """
+    Incremental reader for GROMACS .edr energy files.
+
+    The reader remembers the byte offset of the last complete frame, so each
+    call to `update()` decodes only frames appended since the previous call
+    and is safe to use on files mdrun is still writing. Energies are kept as
+    columnar arrays, one column per energy term.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.offset = 0
+        self.file_version: Optional[int] = None
+        self.terms: List[Tuple[str, str]] = []
+        self._real: Optional[str] = None
+        self._lock = threading.Lock()
+        self._reset_columns()
+
+    def _reset_columns(self) -> None:
+        self.n_frames = 0
+        self._times = np.empty(0, dtype=np.float64)
+        self._steps = np.empty(0, dtype=np.int64)
+        self._energies = np.empty((0, len(self.terms)), dtype=np.float64)
+
+    @property
+    def term_names(self) -> List[str]:
+        return [name for name, _ in self.terms]
+
+    def update(self) -> int:
+        """Decode frames appended since the last call; returns the number of new frames"""
+        with self._lock:
+            size = os.path.getsize(self.path)
+            if size < self.offset:
+                # File was truncated or rewritten (e.g. run restarted without -append)
+                logger.info(f"Energy file {self.path} shrank, re-reading from the start")
+                self.offset = 0
+                self.terms = []
+                self._real = None
+            if size == self.offset:
+                return 0
+
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+
+            buf = _XdrBuffer(data)
+            if not self.terms:
+                try:
+                    self._read_names(buf)
+                except IncompleteData:
+                    return 0
+                self._reset_columns()
+                self.offset += buf.pos
+                data = data[buf.pos:]
+                buf = _XdrBuffer(data)
+
+            times, steps, rows = [], [], []
+            consumed = 0
+            while buf.pos < len(data):
+                try:
+                    frame = self._read_frame(buf)
+                except IncompleteData:
+                    break
+                consumed = buf.pos
+                if frame is not None:
+                    times.append(frame[0])
+                    steps.append(frame[1])
+                    rows.append(frame[2])
+
+            self.offset += consumed
+            if rows:
+                self._append(np.array(times), np.array(steps, dtype=np.int64), np.vstack(rows))
+            return len(rows)
+
+    def columns(
+        self,
+        terms: Optional[List[str]] = None,
+        since: int = 0
+    ) -> Dict[str, np.ndarray]:
+        """Time, step and the requested energy terms for frames from index `since` on"""
+        with self._lock:
+            return self._columns(terms, since)
+
+    def _columns(self, terms: Optional[List[str]], since: int) -> Dict[str, np.ndarray]:
+        names = self.term_names
+        selected = terms or names
+        unknown = [term for term in selected if term not in names]
+        if unknown:
+            raise ValueError(f"Unknown energy terms: {', '.join(unknown)}")
+
+        since = max(0, since)
+        result = {
+            "time": self._times[since:self.n_frames].copy(),
+            "step": self._steps[since:self.n_frames].copy()
+        }
+        for term in selected:
+            result[term] = self._energies[since:self.n_frames, names.index(term)].copy()
+        return result
+
+    def read_new(self, terms: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Columns for the frames appended since the last call only"""
+        start = self.n_frames
+        self.update()
+        return self.columns(terms, since=start)
+
+    def _append(self, times: np.ndarray, steps: np.ndarray, energies: np.ndarray) -> None:
+        needed = self.n_frames + len(times)
+        if needed > len(self._times):
+            # Grow geometrically so appends stay amortized O(new frames)
+            capacity = max(needed, 2 * len(self._times), 1024)
+            self._times = np.resize(self._times, capacity)
+            self._steps = np.resize(self._steps, capacity)
+            grown = np.empty((capacity, len(self.terms)), dtype=np.float64)
+            grown[:self.n_frames] = self._energies[:self.n_frames]
+            self._energies = grown
+
+        self._times[self.n_frames:needed] = times
+        self._steps[self.n_frames:needed] = steps
+        self._energies[self.n_frames:needed] = energies
+        self.n_frames = needed
+
+    def _read_names(self, buf: _XdrBuffer) -> None:
+        magic = buf.int()
+        if magic > 0:
+            raise ValueError(f"{self.path} uses the pre-GROMACS 4 energy file format, which is not supported")
+        if magic != ENX_NAMES_MAGIC:
+            raise ValueError(f"{self.path} is not a GROMACS energy file")
+
+        file_version = buf.int()
+        if file_version > ENX_VERSION:
+            raise ValueError(f"Energy file version {file_version} is newer than supported ({ENX_VERSION})")
+        nre = buf.int()
+
+        terms = []
+        for _ in range(nre):
+            name = buf.string()
+            unit = buf.string() if file_version >= 2 else "kJ/mol"
+            terms.append((name, unit))
+
+        self.file_version = file_version
+        self.terms = terms
+
+    def _detect_precision(self, buf: _XdrBuffer) -> str:
+        """Frames start with the real -2e10; its encoded width tells single from double precision"""
+        for real, size in ((">f4", 4), (">f8", 8)):
+            buf._need(size + 4)
+            first = np.frombuffer(buf.data, dtype=real, count=1, offset=buf.pos)[0]
+            magic = struct.unpack_from(">i", buf.data, buf.pos + size)[0]
+            if first < -1e10 and magic == ENX_FRAME_MAGIC:
+                return real
+        raise ValueError(f"{self.path} has an unrecognised energy frame header")
+
+    def _read_frame(self, buf: _XdrBuffer) -> Optional[Tuple[float, int, np.ndarray]]:
+        """Decode one frame; returns (time, step, energies) or None for frames without energies"""
+        if self._real is None:
+            self._real = self._detect_precision(buf)
+        real = self._real
+        real_size = np.dtype(real).itemsize
+
+        buf.skip(real_size)
+        if buf.int() != ENX_FRAME_MAGIC:
+            raise ValueError(f"Energy frame magic number mismatch in {self.path}")
+        file_version = buf.int()
+        t = buf.double()
+        step = buf.int64()
+        nsum = buf.int()
+        if file_version >= 3:
+            buf.int64()  # nsteps
+        if file_version >= 5:
+            buf.double()  # dt
+        nre = buf.int()
+        ndisre = 0
+        if file_version < 4:
+            ndisre = buf.int()
+        else:
+            buf.int()  # reserved
+        nblock = buf.int()
+
+        # Sizes of the (type, count) sub-blocks that follow the energies
+        subblocks: List[Tuple[int, int]] = []
+        if ndisre:
+            subblocks.extend([(-1, ndisre), (-1, ndisre)])
+        for _ in range(nblock):
+            if file_version < 4:
+                subblocks.append((-1, buf.int()))
+            else:
+                buf.int()  # block id
+                nsub = buf.int()
+                for _ in range(nsub):
+                    sub_type = buf.int()
+                    subblocks.append((sub_type, buf.int()))
+        buf.int()  # e_size
+        buf.int()  # reserved
+        buf.int()  # dummy
+
+        energies = None
+        if nre:
+            if nre != len(self.terms):
+                raise ValueError(f"Energy frame has {nre} terms, expected {len(self.terms)}")
+            # Each term is stored as (e) or, when averages are present, (e, eav, esum)
+            width = 3 if nsum > 0 else 1
+            values = buf.array(real, nre * width)
+            energies = values.reshape(nre, width)[:, 0].astype(np.float64)
+
+        for sub_type, count in subblocks:
+            if sub_type == -1:
+                buf.skip(real_size * count)
+            elif sub_type == XDR_STRING:
+                for _ in range(count):
+                    buf.int()
+                    buf.string()
+            else:
+                buf.skip(XDR_ITEM_SIZE[sub_type] * count)
+
+        if energies is None:
+            return None
+        return t, step, energies
+
+
+
+# Sub-sections of a residue entry in .rtp files; any other section names a residue
+RTP_SUBSECTIONS = {"atoms", "bonds", "angles", "dihedrals", "impropers", "exclusions", "cmap"}
+
+
+def iter_topology_lines(path: Path):
+    """
+    Yield (section, tokens) for a GROMACS topology-style file. A section
+    header yields (name, None); comments and preprocessor lines are skipped.
+    """
+    with open(path, "r", errors="replace") as f:
+        for raw in f:
+            line = raw.split(";", 1)[0].strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                yield line[1:-1].strip(), None
+            else:
+                yield None, line.split()
+
+
+def parse_rtp(path: Path) -> Dict[str, List[str]]:
+    """Residue building blocks of an .rtp file, mapped to their atom names"""
+    residues: Dict[str, List[str]] = {}
+    residue = None
+    in_atoms = False
+
+    for header, tokens in iter_topology_lines(path):
+        if header is not None:
+            if header.lower() in RTP_SUBSECTIONS:
+                in_atoms = header.lower() == "atoms"
+            elif header.lower() == "bondedtypes":
+                residue = None
+                in_atoms = False
+            else:
+                residue = header
+                in_atoms = False
+                residues.setdefault(residue, [])
+        elif residue is not None and in_atoms:
+            residues[residue].append(tokens[0])
+
+    return residues
+
+
+def parse_atomtypes(path: Path) -> List[str]:
+    """Atom type names from an .atp file or the [ atomtypes ] sections of an .itp file"""
+    if path.suffix == ".atp":
+        return [tokens[0] for header, tokens in iter_topology_lines(path) if tokens]
+
+    names = []
+    in_atomtypes = False
+    for header, tokens in iter_topology_lines(path):
+        if header is not None:
+            in_atomtypes = header.lower() == "atomtypes"
+        elif in_atomtypes:
+            names.append(tokens[0])
+    return names
+
+
+def parse_r2b(path: Path) -> Dict[str, List[str]]:
+    """
+    Residue-to-building-block table (.r2b): residue name mapped to its
+    main, N-terminal, C-terminal and single-residue building blocks
+    """
+    aliases = {}
+    for header, tokens in iter_topology_lines(path):
+        if tokens and len(tokens) >= 2:
+            aliases[tokens[0]] = [name for name in tokens[1:] if name != "-"]
+    return aliases
+
+
+def parse_xlateat(path: Path) -> List[Tuple[str, str, str]]:
+    """Atom renaming rules (residue or group, PDB name, force field name) from xlateat.dat"""
+    rules = []
+    for header, tokens in iter_topology_lines(path):
+        # The first line holds the rule count in older files
+        if tokens and len(tokens) >= 3:
+            rules.append((tokens[0], tokens[1], tokens[2]))
+    return rules
+
+
+def parse_watermodels(path: Path) -> List[Dict[str, str]]:
+    """Water models offered by a force field (watermodels.dat)"""
+    models = []
+    for header, tokens in iter_topology_lines(path):
+        if tokens:
+            models.append({"name": tokens[0], "description": " ".join(tokens[2:]) or tokens[0]})
+    return models
+
+
+def read_mdp(path: Path) -> Dict[str, str]:
+    """MDP parameters with option names normalized to underscores"""
+    params = {}
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            line = line.split(";", 1)[0]
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            params[key.strip().lower().replace("-", "_")] = value.strip()
+    return params
+
+
+def read_gro_header(path: Path) -> Dict:
+    """Atom count and box vectors (nm) of a .gro file, without reading the coordinates"""
+    with open(path, "rb") as f:
+        f.readline()  # title
+        atoms = int(f.readline().split()[0])
+        f.seek(max(0, os.path.getsize(path) - 1024))
+        lines = f.read().decode("utf-8", errors="replace").split("\n")
+    box_line = next(line for line in reversed(lines) if line.strip())
+    return {"atoms": atoms, "box": [float(value) for value in box_line.split()]}
+
+
+def read_log_performance(path: Path, tail_bytes: int = 16384) -> Optional[Dict[str, float]]:
+    """ns/day and hour/ns from the performance table at the end of an mdrun .log"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.path.getsize(path) - tail_bytes))
+            data = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return None
+
+    match = None
+    for match in MdrunProgressParser.PERFORMANCE_PATTERN.finditer(data):
+        pass
+    if match is None:
+        return None
+    return {"ns_per_day": float(match.group(1)), "hours_per_ns": float(match.group(2))}
+
+
+# Energy blocks of an mdrun .log start with a "Step Time" header line
+LOG_STEP_PATTERN = re.compile(r"^\s+Step\s+Time\s*\n\s+(\d+)\s", re.MULTILINE)
+
+
+def read_log_last_step(path: Path, tail_bytes: int = 16384) -> Optional[int]:
+    """Step of the last energy block written to an mdrun .log"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.path.getsize(path) - tail_bytes))
+            data = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return None
+
+    steps = LOG_STEP_PATTERN.findall(data)
+    return int(steps[-1]) if steps else None
+
+
+class MdrunProgressParser:
+    """
+    Turns mdrun output lines into step, simulated time, progress, ETA and
+    ns/day. nsteps and dt come from the phase's MDP file; the throughput is
+    a rolling rate over the last RATE_WINDOW seconds of progress lines.
+    Lines without "step" or "Performance" are rejected by a substring test
+    before any regular expression runs.
+    """
+
+    # "step 12300, will finish ..." (-v), "imb F  3% step 400, ...", the mock's
+    # "Step 400, ..." or the minimizers' "Step=   12, Dmax= ..."
+    STEP_PATTERN = re.compile(r"^\s*(?:imb F\s+\d+%\s+)?step(?:\s+|=\s*)(\d+)[,:]", re.IGNORECASE)
+    PERFORMANCE_PATTERN = re.compile(r"^Performance:\s+([\d.]+)\s+([\d.]+)", re.MULTILINE)
+
+    RATE_WINDOW = 60.0
+
+    def __init__(self, nsteps: Optional[int], dt: Optional[float], integrator: str = "md", init_step: int = 0):
+        self.nsteps = nsteps if nsteps and nsteps > 0 else None
+        # Minimizers report iterations, not time
+        self.dt = dt if integrator in ("md", "md-vv", "md-vv-avek", "sd", "bd") else None
+        self.init_step = init_step
+        self.step: Optional[int] = None
+        self.ns_per_day: Optional[float] = None
+        self._samples = deque()
+
+    @classmethod
+    def from_mdp(cls, mdp_path: Path) -> "MdrunProgressParser":
+        try:
+            params = read_mdp(mdp_path)
+        except OSError:
+            return cls(None, None)
+
+        def number(key, cast):
+            try:
+                return cast(params[key])
+            except (KeyError, ValueError):
+                return None
+
+        return cls(
+            number("nsteps", int),
+            number("dt", float) or 0.001,
+            params.get("integrator", "md").lower(),
+            number("init_step", int) or 0
+        )
+
+    def parse(self, line: str, now: Optional[float] = None) -> Optional[Dict]:
+        """Progress update for a line, or None if the line carries no progress"""
+        if "tep" not in line and "Performance" not in line:
+            return None
+
+        if line.startswith("Performance:"):
+            match = self.PERFORMANCE_PATTERN.match(line)
+            if match:
+                return self.finish(float(match.group(1)))
+            return None
+
+        match = self.STEP_PATTERN.match(line)
+        if not match:
+            return None
+
+        return self.observe_step(int(match.group(1)), now)
+
+    def observe_step(self, step: int, now: Optional[float] = None) -> Dict:
+        """Progress update for a step learned elsewhere, e.g. from the .log"""
+        self.step = step
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, self.step))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.RATE_WINDOW:
+            self._samples.popleft()
+        return self._update()
+
+    def finish(self, ns_per_day: Optional[float] = None) -> Dict:
+        """Final update once the run has ended, e.g. with ns/day from the .log"""
+        if ns_per_day is not None:
+            self.ns_per_day = ns_per_day
+        return self._update(final=True)
+
+    def steps_per_second(self) -> Optional[float]:
+        if len(self._samples) < 2:
+            return None
+        (t0, s0), (t1, s1) = self._samples[0], self._samples[-1]
+        if t1 <= t0 or s1 <= s0:
+            return None
+        return (s1 - s0) / (t1 - t0)
+
+    def _update(self, final: bool = False) -> Dict:
+        update = {"step": self.step, "nsteps": self.nsteps, "final": final}
+        done = None if self.step is None else self.step - self.init_step
+
+        if final:
+            # Minimizations usually converge before nsteps
+            update["progress"] = 100.0
+        elif self.nsteps and done is not None:
+            update["progress"] = min(100.0, 100.0 * done / self.nsteps)
+
+        if self.dt and self.step is not None:
+            update["time_ps"] = self.step * self.dt
+        if self.dt and self.nsteps:
+            update["total_time_ps"] = (self.init_step + self.nsteps) * self.dt
+
+        rate = self.steps_per_second()
+        if final:
+            update["eta_seconds"] = 0.0
+        elif rate and self.nsteps and done is not None:
+            update["eta_seconds"] = max(0.0, (self.nsteps - done) / rate)
+
+        if not final and rate and self.dt:
+            # ps simulated per wall second -> ns per day
+            self.ns_per_day = rate * self.dt * 86400 / 1000
+        update["ns_per_day"] = self.ns_per_day
+        return update
@@ -0,0 +1,239 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from MDAnalysis.lib.distances import self_capped_distance
+
+from app.utils.file_utils import Structure
+from app.utils.gromacs_utils import read_mdp
+
+# Atoms closer than this (nm) are reported as overlapping
+OVERLAP_DISTANCE = 0.05
+
+# Net charges further than this from an integer are reported
+CHARGE_TOLERANCE = 0.01
+
+# Examples listed per kind of problem
+MAX_EXAMPLES = 5
+
+# Residue names (including protonation variants) that need a full backbone
+AMINO_ACIDS = {
+    "ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+    "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL",
+    "HID", "HIE", "HIP", "HSD", "HSE", "HSP", "CYX", "ASH", "GLH", "LYN"
+}
+BACKBONE_ATOMS = (b"N", b"CA", b"C")
+
+INCLUDE_PATTERN = re.compile(r'^\s*#include\s+["<]([^">]+)[">]')
+SECTION_PATTERN = re.compile(r"^\s*\[\s*(\w+)\s*\]")
+
+
+def error(message: str) -> Dict:
+    return {"severity": "error", "message": message}
+
+
+def warning(message: str) -> Dict:
+    return {"severity": "warning", "message": message}
+
+
+def _examples(items: List[str], count: int) -> str:
+    shown = ", ".join(items[:MAX_EXAMPLES])
+    return f"{shown}, ..." if count > MAX_EXAMPLES else shown
+
+
+def check_structure(structure: Structure) -> List[Dict]:
+    """Coordinates, duplicate atom names, incomplete backbones and overlapping atoms"""
+    issues = []
+    n_atoms = structure.n_atoms
+    if not np.isfinite(structure.positions).all():
+        issues.append(error("Structure has non-numeric or infinite coordinates"))
+        return issues
+
+    starts = structure.residue_starts()
+    residue_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n_atoms)))
+
+    def label(residue: int) -> str:
+        atom = starts[residue]
+        chain = structure.chains[atom].decode()
+        name = f"{structure.resnames[atom].decode()}{structure.resids[atom]}{structure.icodes[atom].decode()}"
+        return f"{chain}:{name}" if chain else name
+
+    # Duplicate atom names within a residue break pdb2gmx
+    order = np.lexsort((structure.names, residue_of))
+    sorted_residues, sorted_names = residue_of[order], structure.names[order]
+    duplicate = (sorted_residues[1:] == sorted_residues[:-1]) & (sorted_names[1:] == sorted_names[:-1])
+    if duplicate.any():
+        residues = np.unique(sorted_residues[1:][duplicate])
+        issues.append(error(
+            f"{len(residues)} residues have duplicate atom names "
+            f"({_examples([label(r) for r in residues[:MAX_EXAMPLES]], len(residues))})"
+        ))
+
+    # Missing backbone atoms mean a broken chain or a truncated residue
+    amino = np.isin(np.char.upper(structure.resnames[starts]).astype(str), list(AMINO_ACIDS))
+    if amino.any():
+        missing = np.zeros(len(starts), dtype=bool)
+        for atom in BACKBONE_ATOMS:
+            present = np.add.reduceat((structure.names == atom).astype(np.int64), starts) > 0
+            missing |= amino & ~present
+        residues = np.flatnonzero(missing)
+        if len(residues):
+            issues.append(error(
+                f"{len(residues)} amino acid residues lack backbone atoms N, CA or C "
+                f"({_examples([label(r) for r in residues[:MAX_EXAMPLES]], len(residues))})"
+            ))
+
+    if n_atoms > 1:
+        # Grid search in Angstrom; pairs are found in O(n), not O(n^2)
+        pairs, _ = self_capped_distance(structure.positions * 10, OVERLAP_DISTANCE * 10, return_distances=True)
+        if len(pairs):
+            examples = [
+                f"{label(residue_of[i])}/{structure.names[i].decode()}-"
+                f"{label(residue_of[j])}/{structure.names[j].decode()}"
+                for i, j in pairs[:MAX_EXAMPLES]
+            ]
+            issues.append(warning(
+                f"{len(pairs)} atom pairs are closer than {OVERLAP_DISTANCE} nm ({_examples(examples, len(pairs))})"
+            ))
+    return issues
+
+
+def resolve_include(name: str, including_dir: Path, search_dirs: List[Path]) -> Optional[Path]:
+    """File an #include refers to, searched like grompp: next to the including file, then the search path"""
+    for directory in [including_dir, *search_dirs]:
+        candidate = directory / name
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _read_topology(
+    path: Path,
+    search_dirs: List[Path],
+    state: Dict,
+    seen: Set[Path]
+) -> None:
+    """Collect molecule charges, [ molecules ] counts and unresolved includes of a topology and its includes"""
+    seen.add(path.resolve())
+    with open(path, "r", errors="replace") as f:
+        for number, raw in enumerate(f, 1):
+            include = INCLUDE_PATTERN.match(raw)
+            if include:
+                target = resolve_include(include.group(1), path.parent, search_dirs)
+                if target is None:
+                    # Conditional includes (#ifdef POSRES) are often generated later
+                    missing = "optional" if state["conditional"] else "unresolved"
+                    state[missing].append(f"{include.group(1)} ({path.name}:{number})")
+                elif target.resolve() not in seen:
+                    _read_topology(target, search_dirs, state, seen)
+                continue
+
+            line = raw.split(";", 1)[0].strip()
+            if line.startswith(("#ifdef", "#ifndef")):
+                state["conditional"] += 1
+            elif line.startswith("#endif"):
+                state["conditional"] = max(0, state["conditional"] - 1)
+            if not line or line.startswith("#"):
+                continue
+            section = SECTION_PATTERN.match(line)
+            if section:
+                state["section"] = section.group(1).lower()
+                continue
+
+            fields = line.split()
+            if state["section"] == "moleculetype":
+                state["molecule"] = fields[0]
+                state["charges"][fields[0]] = 0.0
+            elif state["section"] == "atoms" and state["molecule"] is not None and len(fields) >= 7:
+                try:
+                    state["charges"][state["molecule"]] += float(fields[6])
+                except ValueError:
+                    state["bad_lines"].append(f"{path.name}:{number}")
+            elif state["section"] == "molecules" and len(fields) >= 2:
+                try:
+                    state["molecules"].append((fields[0], int(fields[1])))
+                except ValueError:
+                    state["bad_lines"].append(f"{path.name}:{number}")
+
+
+def check_topology(path: Path, search_dirs: List[Path]) -> Tuple[List[Dict], Dict]:
+    """
+    Unresolvable #include files, malformed lines and non-integer charges of
+    a .top or .itp file, with the net charge of each molecule type and, for
+    a .top, of the whole system
+    """
+    state = {
+        "section": None,
+        "molecule": None,
+        "charges": {},
+        "molecules": [],
+        "unresolved": [],
+        "optional": [],
+        "conditional": 0,
+        "bad_lines": []
+    }
+    _read_topology(path, search_dirs, state, set())
+
+    issues = []
+    if state["unresolved"]:
+        issues.append(error(
+            f"Cannot resolve #include {_examples(state['unresolved'], len(state['unresolved']))}"
+        ))
+    if state["optional"]:
+        issues.append(warning(
+            f"Conditional #include not found: {_examples(state['optional'], len(state['optional']))}"
+        ))
+    if state["bad_lines"]:
+        issues.append(error(
+            f"Malformed [ atoms ] or [ molecules ] lines at {_examples(state['bad_lines'], len(state['bad_lines']))}"
+        ))
+
+    charges = state["charges"]
+    fractional = [
+        f"{name} ({charge:+.3f})" for name, charge in charges.items()
+        if abs(charge - round(charge)) > CHARGE_TOLERANCE
+    ]
+    if fractional:
+        issues.append(warning(f"Molecule types with non-integer charge: {_examples(fractional, len(fractional))}"))
+
+    summary = {
+        "molecule_types": {name: round(charge, 4) for name, charge in charges.items()},
+        "molecules": [{"name": name, "count": count} for name, count in state["molecules"]],
+        "total_charge": None
+    }
+    if state["molecules"]:
+        unknown = sorted({name for name, _ in state["molecules"] if name not in charges})
+        if unknown:
+            issues.append(error(f"[ molecules ] lists undefined molecule types: {_examples(unknown, len(unknown))}"))
+        else:
+            total = sum(charges[name] * count for name, count in state["molecules"])
+            summary["total_charge"] = round(total, 4)
+            if abs(total - round(total)) > CHARGE_TOLERANCE:
+                issues.append(error(f"System has non-integer total charge {total:+.4f}"))
+    return issues, summary
+
+
+def check_mdp(path: Path) -> Tuple[List[Dict], Dict]:
+    """Numeric run parameters and consistent temperature-coupling groups of an .mdp file"""
+    params = read_mdp(path)
+    issues = []
+    for key, cast in (("nsteps", int), ("dt", float), ("nstxout_compressed", int), ("ref_t", float)):
+        for value in params.get(key, "").split():
+            try:
+                cast(value)
+            except ValueError:
+                issues.append(error(f"{key} = {params[key]} is not a valid number"))
+                break
+
+    try:
+        if float(params.get("dt", "1")) <= 0:
+            issues.append(error("dt must be positive"))
+    except ValueError:
+        pass  # reported above
+    tc_grps = params.get("tc_grps", "").split()
+    for key in ("tau_t", "ref_t"):
+        values = params.get(key, "").split()
+        if tc_grps and len(values) != len(tc_grps):
+            issues.append(error(f"{key} has {len(values)} values for {len(tc_grps)} tc-grps"))
+    return issues, {"integrator": params.get("integrator"), "parameters": len(params)}
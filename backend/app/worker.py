@@ -0,0 +1,160 @@
+import os
+import signal
+import socket
+import asyncio
+import threading
+import logging
+from typing import Dict, Optional
+
+from celery import Celery
+from celery.signals import celeryd_after_setup, task_postrun, task_prerun, worker_ready, worker_shutdown
+
+from app.services.analysis_service import AnalysisService
+from app.services.distributed_service import (
+    ANALYSIS_QUEUE,
+    CELERY_BROKER_URL,
+    CELERY_RESULT_BACKEND,
+    CELERY_TASK_ALWAYS_EAGER,
+    CELERY_VISIBILITY_TIMEOUT,
+    NODE_HEARTBEAT_INTERVAL,
+    REDIS_URL,
+    RMS_TASK,
+    RUN_PHASE_TASK,
+    DistributedExecutor,
+    NodeRegistry,
+    node_queue,
+    phase_stream_path
+)
+from app.services.gromacs_service import GromacsService
+
+logger = logging.getLogger(__name__)
+
+# Name, cores and concurrent phases this node advertises for routing
+WORKER_NODE_NAME = os.getenv("WORKER_NODE_NAME", socket.gethostname())
+WORKER_CORES = int(os.getenv("WORKER_CORES", str(os.cpu_count() or 1)))
+WORKER_SLOTS = int(os.getenv("WORKER_SLOTS", "1"))
+
+# One worker per node, with the shared projects directory mounted:
+#   celery -A app.worker.celery worker --concurrency=$WORKER_SLOTS
+# It consumes the shared analysis queue and the queue of its node, to which
+# the API routes phases by the cores and free slots in the node registry.
+celery = Celery("gromacs_gui", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+celery.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    task_default_queue=ANALYSIS_QUEUE,
+    task_always_eager=CELERY_TASK_ALWAYS_EAGER,
+    task_eager_propagates=True,
+    task_track_started=True,
+    # Phases run for hours: take one task at a time and acknowledge it only
+    # when done, so the phase of a lost worker is delivered again. Redis also
+    # redelivers a task unacknowledged for longer than its visibility timeout
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    broker_transport_options={"visibility_timeout": CELERY_VISIBILITY_TIMEOUT},
+    worker_prefetch_multiplier=1,
+    result_expires=7 * 86400
+)
+
+# Eager tasks run in the API process, which then is the only node
+node_registry = NodeRegistry(None if CELERY_TASK_ALWAYS_EAGER else REDIS_URL)
+
+# Used by the API to send work to the nodes
+distributed = DistributedExecutor(celery, node_registry)
+
+_gromacs_service: Optional[GromacsService] = None
+_analysis_service: Optional[AnalysisService] = None
+_heartbeat_stop = threading.Event()
+
+
+def node_info() -> Dict:
+    return {
+        "name": WORKER_NODE_NAME,
+        "queue": node_queue(WORKER_NODE_NAME),
+        "host": socket.gethostname(),
+        "cores": WORKER_CORES,
+        "slots": WORKER_SLOTS
+    }
+
+
+def _heartbeat() -> None:
+    while True:
+        try:
+            node_registry.publish(node_info(), ttl=3 * NODE_HEARTBEAT_INTERVAL)
+        except Exception as e:
+            logger.error(f"Node heartbeat failed: {e}")
+        if _heartbeat_stop.wait(NODE_HEARTBEAT_INTERVAL):
+            return
+
+
+@celeryd_after_setup.connect
+def subscribe_node_queue(sender, instance, **kwargs):
+    instance.app.amqp.queues.select_add(node_queue(WORKER_NODE_NAME))
+
+
+@worker_ready.connect
+def start_heartbeat(**kwargs):
+    threading.Thread(target=_heartbeat, name="node-heartbeat", daemon=True).start()
+    logger.info(f"Node {WORKER_NODE_NAME} ready with {WORKER_CORES} cores and {WORKER_SLOTS} slots")
+
+
+@worker_shutdown.connect
+def stop_heartbeat(**kwargs):
+    _heartbeat_stop.set()
+    node_registry.remove(WORKER_NODE_NAME)
+
+
+@task_prerun.connect
+def claim_slot(sender=None, **kwargs):
+    if sender is not None and sender.name == RUN_PHASE_TASK:
+        node_registry.adjust_busy(WORKER_NODE_NAME, 1)
+
+
+@task_postrun.connect
+def release_slot(sender=None, **kwargs):
+    if sender is not None and sender.name == RUN_PHASE_TASK:
+        node_registry.adjust_busy(WORKER_NODE_NAME, -1)
+
+
+async def _run_phase(project_dir: str, phase: str, config: Dict) -> Dict:
+    global _gromacs_service
+    if _gromacs_service is None:
+        _gromacs_service = GromacsService()
+
+    # revoke(terminate=True) sends TERM: cancel the phase so mdrun checkpoints and stops
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (RuntimeError, ValueError):
+        pass  # not the main thread (eager mode)
+
+    latest: Dict = {}
+
+    async def on_progress(update: Dict):
+        latest.update(update)
+
+    with open(phase_stream_path(project_dir, phase), "a") as stream:
+        async for line in _gromacs_service.run_simulation_phase(project_dir, phase, config, on_progress):
+            stream.write(line)
+            stream.flush()
+
+    return {"node": WORKER_NODE_NAME, "progress": latest or None}
+
+
+@celery.task(name=RUN_PHASE_TASK)
+def run_phase(project_dir: str, phase: str, config: Dict) -> Dict:
+    """Run one simulation phase on this node; its output goes to the phase's stream file"""
+    return asyncio.run(_run_phase(project_dir, phase, config))
+
+
+@celery.task(name=RMS_TASK)
+def compute_rms(project_dir: str, **params) -> Dict:
+    global _analysis_service
+    if _analysis_service is None:
+        _analysis_service = AnalysisService()
+    return AnalysisService.rms_to_dict(_analysis_service.compute_rms(project_dir, **params))
+
+
+if CELERY_TASK_ALWAYS_EAGER:
+    node_registry.publish(node_info())